@@ -1,9 +1,33 @@
-from typing import List
-from fastapi import APIRouter, HTTPException
-from fastapi.responses import StreamingResponse
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import Response, StreamingResponse
+from sqlmodel import Session
 import json
 import asyncio
 
+from app.db.session import get_session
+from app.models.influencer import (
+    Influencer,
+    InfluencerCategory,
+    InfluencerPage,
+    InfluencerReadWithPosts,
+    InfluencerSimilarity,
+    MetricHistory,
+    PostPage,
+)
+from app.services.listing_service import (
+    INFLUENCER_SORTS,
+    POST_SORTS,
+    InvalidCursor,
+    list_influencers,
+    list_posts,
+    with_latest_posts,
+)
+from app.services.lookalike_service import find_similar_influencers
+from app.services.metrics_history import as_utc, metric_history
+from app.services.read_cache import read_cache
+
 from app.services.instagram_scraper import (
     set_instagram_auth,
     set_instagram_full_auth
@@ -17,6 +41,146 @@ def ping():
     """Simple health check endpoint."""
     return {"status": "ok", "message": "Instagram Selenium Scraper API is running"}
 
+@router.get("/health/model")
+def model_health():
+    """
+    Reports whether the CLIP model is loaded in the Celery worker processes,
+    as each one published it at startup. The API itself never loads it.
+    """
+    from app.services.model_health import worker_model_health
+
+    return worker_model_health()
+
+@router.get("/tasks/metrics")
+def task_metrics():
+    """
+    Counts analysis requests coalesced onto an in-flight task at submission
+    (`coalesced`) and duplicate analysis runs skipped by workers (`duplicates`).
+    """
+    from app.services.single_flight import analysis_flight
+
+    return {"analysis": analysis_flight.counters("coalesced", "duplicates")}
+
+@router.get("/cache/metrics")
+def cache_metrics():
+    """
+    Hits, misses and invalidations of the influencer read cache in this process.
+    """
+    return {"read_cache": read_cache.stats()}
+
+@router.get("/influencers", response_model=InfluencerPage)
+def get_influencers(
+    sort: str = Query(default="followers", pattern=f"^({'|'.join(INFLUENCER_SORTS)})$"),
+    category: Optional[InfluencerCategory] = None,
+    limit: int = Query(default=20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    posts: int = Query(default=0, ge=0, le=50),
+    session: Session = Depends(get_session),
+):
+    """
+    Lists influencers by followers or engagement rate, highest first,
+    optionally of one main category, each with their latest `posts` posts.
+    Pass the returned `next_cursor` back as `cursor` to get the next page.
+    """
+    try:
+        influencers, next_cursor = list_influencers(session, sort=sort, limit=limit, cursor=cursor, category=category)
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return InfluencerPage(items=with_latest_posts(session, influencers, posts), next_cursor=next_cursor)
+
+@router.get("/influencers/{influencer_id}", response_model=InfluencerReadWithPosts)
+def get_influencer(
+    influencer_id: int,
+    posts: int = Query(default=12, ge=0, le=50),
+    session: Session = Depends(get_session),
+):
+    """
+    An influencer's profile with their latest `posts` posts, served from the
+    read cache: a cached profile does not touch the database.
+    """
+    def load():
+        influencer = session.get(Influencer, influencer_id)
+        if not influencer:
+            raise HTTPException(status_code=404, detail="Influencer not found")
+        return with_latest_posts(session, [influencer], posts)[0]
+
+    return Response(read_cache.read_through(influencer_id, f"profile:{posts}", load), media_type="application/json")
+
+@router.get("/influencers/{influencer_id}/posts", response_model=PostPage)
+def get_influencer_posts(
+    influencer_id: int,
+    sort: str = Query(default="posted_at", pattern=f"^({'|'.join(POST_SORTS)})$"),
+    category: Optional[InfluencerCategory] = None,
+    media_type: Optional[str] = Query(default=None, pattern="^(image|video|carousel)$"),
+    limit: int = Query(default=20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    session: Session = Depends(get_session),
+):
+    """
+    Lists an influencer's posts, latest or most liked first, optionally only
+    those categorized into `category` or of one media type. Paginated with
+    `cursor` like `/influencers`. Pages are served from the read cache.
+    """
+    def load():
+        if not session.get(Influencer, influencer_id):
+            raise HTTPException(status_code=404, detail="Influencer not found")
+        try:
+            items, next_cursor = list_posts(
+                session, influencer_id, sort=sort, limit=limit, cursor=cursor, category=category, media_type=media_type
+            )
+        except InvalidCursor as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        return PostPage(items=items, next_cursor=next_cursor)
+
+    category_value = category.value if category else ""
+    field = f"posts:{sort}:{category_value}:{media_type or ''}:{limit}:{cursor or ''}"
+    return Response(read_cache.read_through(influencer_id, field, load), media_type="application/json")
+
+@router.get("/influencers/{influencer_id}/similar", response_model=List[InfluencerSimilarity])
+def get_similar_influencers(
+    influencer_id: int,
+    k: int = Query(default=10, ge=1, le=100),
+    session: Session = Depends(get_session),
+):
+    """
+    Finds the influencers whose posts look most like this influencer's,
+    by cosine similarity of their aggregate CLIP embeddings.
+    """
+    influencer = session.get(Influencer, influencer_id)
+    if not influencer:
+        raise HTTPException(status_code=404, detail="Influencer not found")
+    if influencer.embedding is None:
+        raise HTTPException(status_code=404, detail="Influencer has not been analyzed yet")
+
+    return [
+        InfluencerSimilarity(influencer=match, similarity=similarity)
+        for match, similarity in find_similar_influencers(session, influencer, k=k)
+    ]
+
+@router.get("/influencers/{influencer_id}/history", response_model=MetricHistory)
+def get_influencer_history(
+    influencer_id: int,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    resolution: Optional[str] = Query(default=None, pattern="^(raw|day|week)$"),
+    session: Session = Depends(get_session),
+):
+    """
+    Follower and engagement history of an influencer between `start` and
+    `end` (the last 90 days by default), read from the daily or weekly
+    rollups depending on the range length, or from the raw snapshots with
+    `resolution=raw`.
+    """
+    if not session.get(Influencer, influencer_id):
+        raise HTTPException(status_code=404, detail="Influencer not found")
+    end = as_utc(end) if end else datetime.now(timezone.utc)
+    start = as_utc(start) if start else end - timedelta(days=90)
+    if start >= end:
+        raise HTTPException(status_code=422, detail="start must be before end")
+
+    resolution, points = metric_history(session, influencer_id, start, end, resolution)
+    return MetricHistory(influencer_id=influencer_id, resolution=resolution, points=points)
+
 @router.post("/instagram/auth")
 def set_instagram_authentication(sessionid: str, csrftoken: str, ds_user_id: str):
     """
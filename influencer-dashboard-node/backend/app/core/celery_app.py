@@ -1,13 +1,70 @@
 from celery import Celery
+from celery.schedules import crontab
+from celery.signals import worker_process_init, worker_process_shutdown
+from kombu import Queue
 from app.core.config import settings
 
 celery_app = Celery(
     "worker",
     broker=settings.CELERY_BROKER_URL,
     backend=settings.CELERY_RESULT_BACKEND,
-    include=["app.tasks.analysis"]
+    include=["app.tasks.analysis", "app.tasks.metrics"]
 )
 
 celery_app.conf.update(
     task_track_started=True,
-) 
\ No newline at end of file
+    # Analysis tasks are long: hand them out one at a time so a bulk run
+    # spreads over every worker instead of queueing behind a busy one, and
+    # re-deliver them if a worker dies mid-task (re-analysis is incremental)
+    worker_prefetch_multiplier=1,
+    task_acks_late=True,
+    # One queue per kind of work, so each can get its own worker pool:
+    # threads for the I/O-bound queues, prefork with the model preloaded
+    # for inference (see docker-compose.yml)
+    task_default_queue="default",
+    task_queues=[Queue(name) for name in ("default", "fetch", "media", "inference", "persist")],
+    task_routes={
+        "app.tasks.analysis.fetch_profiles": {"queue": "fetch"},
+        "app.tasks.analysis.fetch_post_media": {"queue": "media"},
+        "app.tasks.analysis.categorize_influencer_posts": {"queue": "inference"},
+        "app.tasks.analysis.rescore_stale_posts": {"queue": "inference"},
+        "app.tasks.analysis.persist_post_analyses": {"queue": "persist"},
+    },
+    # Metric history rollups and retention, run by `celery beat`
+    beat_schedule={
+        "rollup-daily-metrics": {"task": "app.tasks.metrics.rollup_daily_metrics", "schedule": crontab(minute=5)},
+        "rollup-weekly-metrics": {"task": "app.tasks.metrics.rollup_weekly_metrics", "schedule": crontab(hour=0, minute=20)},
+        "prune-metric-history": {"task": "app.tasks.metrics.prune_metric_history", "schedule": crontab(hour=1, minute=0)},
+    },
+    timezone="UTC",
+    # Prefork children load the model before taking tasks, which takes far
+    # longer than the default 4 s allowed for a child to come up
+    worker_proc_alive_timeout=settings.CELERY_WORKER_PROC_ALIVE_TIMEOUT,
+)
+
+@worker_process_init.connect
+def warm_up_models(**kwargs):
+    """
+    Loads the CLIP model when a worker process starts, so the first task
+    does not pay for it, and publishes the outcome for `/health/model`.
+    Workers that only serve the I/O queues turn this off with
+    CLIP_WARM_UP_ON_WORKER_START=false.
+    """
+    if not settings.CLIP_WARM_UP_ON_WORKER_START:
+        return
+    from app.services.ai_service import clip_model, warm_up
+    from app.services.model_health import publish_model_health
+
+    try:
+        publish_model_health(warm_up())
+    except Exception as e:
+        publish_model_health(clip_model.health(), error=str(e))
+        raise
+
+@worker_process_shutdown.connect
+def withdraw_model_health(**kwargs):
+    if not settings.CLIP_WARM_UP_ON_WORKER_START:
+        return
+    from app.services.model_health import withdraw_model_health
+
+    withdraw_model_health()
@@ -1,4 +1,5 @@
 import os
+from typing import Optional
 from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
@@ -9,8 +10,88 @@ class Settings(BaseSettings):
     CELERY_BROKER_URL: str
     CELERY_RESULT_BACKEND: str
 
+    # AI / CLIP inference
+    CLIP_MODEL_NAME: str = "ViT-B/32"
+    CLIP_BATCH_SIZE: int = 32
+    CLIP_BACKEND: str = "torch"  # torch | int8 | onnx
+    CLIP_NUM_THREADS: int = 0  # 0 keeps the torch / onnxruntime default
+    ONNX_MODEL_DIR: str = "cache/onnx"
+    # Shared inference server, e.g. unix:///tmp/clip.sock or http://127.0.0.1:8765
+    INFERENCE_SERVER_URL: Optional[str] = None
+    INFERENCE_SERVER_BIND: Optional[str] = None  # address the server listens on, defaults to the URL
+    INFERENCE_SERVER_TIMEOUT: float = 60.0
+    INFERENCE_SERVER_MAX_BATCH: int = 64
+    INFERENCE_SERVER_MAX_WAIT_MS: int = 10
+    INFERENCE_SERVER_RETRY_SECONDS: float = 30.0  # in-process fallback after a failed request
+    INFERENCE_SERVER_CONNECT_ATTEMPTS: int = 6  # at startup, before loading CLIP in-process
+    INFERENCE_SERVER_CONNECT_BACKOFF: float = 2.0  # seconds before the first retry, doubled each time
+    CLIP_WARM_UP_ON_WORKER_START: bool = True
+    # Seconds a prefork child may take to start, model warm-up included
+    CELERY_WORKER_PROC_ALIVE_TIMEOUT: float = 300.0
+    # Workers publish their model health here; defaults to the broker when it is Redis
+    MODEL_HEALTH_REDIS_URL: Optional[str] = None
+    PIPELINE_FETCH_WORKERS: int = 8
+    PIPELINE_DECODE_WORKERS: int = 4
+    PIPELINE_QUEUE_SIZE: int = 64
+    DECODE_MAX_PIXELS: int = 40_000_000  # after draft-mode reduction
+    VIDEO_KEYFRAMES: int = 4
+    VIDEO_MAX_BYTES: int = 200 * 1024 * 1024
+    DEDUP_ENABLED: bool = True
+    DEDUP_HAMMING_THRESHOLD: int = 5  # bits out of a 64-bit dHash
+    EMBEDDING_CACHE_ENABLED: bool = True
+    EMBEDDING_CACHE_DIR: str = "cache/embeddings"
+
+    # Media fetching: pooled HTTP session and on-disk cache of downloaded media
+    HTTP_CONNECT_TIMEOUT: float = 5.0
+    HTTP_READ_TIMEOUT: float = 20.0
+    HTTP_POOL_SIZE: int = 32
+    MEDIA_MAX_BYTES: int = 20 * 1024 * 1024
+    MEDIA_CACHE_ENABLED: bool = True
+    MEDIA_CACHE_DIR: str = "cache/media"
+    MEDIA_CACHE_TTL_SECONDS: int = 24 * 3600  # when the server sends no max-age
+    MEDIA_CACHE_MAX_BYTES: int = 2 * 1024 * 1024 * 1024
+
+    # Bulk analysis: influencers per subtask
+    BULK_ANALYSIS_CHUNK_SIZE: int = 25
+    # Single-flight analysis locks; Redis defaults to the broker when it is Redis
+    SINGLE_FLIGHT_REDIS_URL: Optional[str] = None
+    # Each analysis stage claims its influencers again, so this has to cover
+    # the longest a stage task waits in its queue plus runs
+    SINGLE_FLIGHT_TTL_SECONDS: int = 1800
+
+    # Read-through cache of the influencer read models; Redis defaults to the broker when it is Redis
+    READ_CACHE_ENABLED: bool = True
+    READ_CACHE_REDIS_URL: Optional[str] = None
+    READ_CACHE_TTL_SECONDS: int = 300
+    READ_CACHE_MEMORY_ENTRIES: int = 10000  # influencers kept by the in-process fallback
+    # The in-process fallback misses the workers' invalidations: its entries
+    # can be stale for this long, so it is kept short
+    READ_CACHE_MEMORY_TTL_SECONDS: int = 30
+
+    # Caption fast path: posts whose caption is this confident skip image inference
+    CAPTION_FAST_PATH_ENABLED: bool = True
+    CAPTION_CONFIDENCE_THRESHOLD: float = 0.6
+    CAPTION_USE_CLIP_TEXT: bool = False
+
+    # Prompt registry: JSON file with {"version", "groups"}, built-in prompts when unset
+    PROMPT_REGISTRY_PATH: Optional[str] = None
+    PROMPT_REGISTRY_CHECK_SECONDS: float = 30.0
+    PROMPT_EMBEDDING_DIR: str = "cache/prompts"
+
+    # Metric history: raw snapshots are rolled up into days and weeks, then pruned
+    METRICS_RAW_RETENTION_DAYS: int = 35
+    METRICS_DAILY_RETENTION_DAYS: int = 400
+    METRICS_WEEKLY_RETENTION_DAYS: int = 5 * 365
+    METRICS_DAILY_RESOLUTION_MAX_DAYS: int = 180  # longer ranges are served weekly
+
+    # Lookalike search
+    SIMILARITY_INDEX_MODE: str = "auto"  # auto | exact | ivf
+    SIMILARITY_IVF_MIN_SIZE: int = 20000
+    SIMILARITY_IVF_PROBES: int = 8
+    SIMILARITY_INDEX_REFRESH_SECONDS: int = 300
+
     class Config:
         case_sensitive = True
         env_file = ".env"
 
-settings = Settings() 
\ No newline at end of file
+settings = Settings()
@@ -0,0 +1,171 @@
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Type
+
+from sqlalchemy import func, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlmodel import Session, SQLModel, select
+
+from app.models.influencer import Influencer, Post
+from app.services.read_cache import invalidate_on_commit
+
+# Rows per INSERT statement
+UPSERT_BATCH_SIZE = 500
+# Bound parameters per statement allowed by SQLite builds older than 3.32
+SQLITE_MAX_PARAMETERS = 999
+
+
+def bulk_upsert(
+    session: Session,
+    model: Type[SQLModel],
+    rows: Sequence[Dict[str, Any]],
+    conflict_columns: Sequence[str],
+    update_columns: Optional[Sequence[str]] = None,
+    batch_size: int = UPSERT_BATCH_SIZE,
+) -> int:
+    """
+    Inserts `rows` into the table of `model`, updating the rows that collide
+    on `conflict_columns` (a unique index) instead.
+
+    Rows are dicts of column values, all with the same keys. They are sent as
+    multi-row `INSERT ... ON CONFLICT DO UPDATE` statements of `batch_size`
+    rows: Postgres and SQLite (3.24+) share the syntax. On a conflict, the
+    `update_columns` are overwritten, every inserted column but the conflict
+    ones by default. When several rows share a conflict key, the last one wins.
+
+    Returns the number of rows sent. Does not commit.
+    """
+    if not rows:
+        return 0
+
+    dialect = session.get_bind().dialect.name
+    if dialect == "postgresql":
+        insert = postgresql.insert
+    elif dialect == "sqlite":
+        insert = sqlite.insert
+        batch_size = max(1, min(batch_size, SQLITE_MAX_PARAMETERS // len(rows[0])))
+    else:
+        raise ValueError(f"Bulk upsert is not supported on {dialect}")
+
+    # Postgres refuses to update the same row twice in one statement
+    unique_rows: List[Dict[str, Any]] = list({
+        tuple(row[column] for column in conflict_columns): row for row in rows
+    }.values())
+    columns = list(unique_rows[0])
+    if update_columns is None:
+        update_columns = columns
+    update_columns = [column for column in update_columns if column not in conflict_columns]
+
+    table = model.__table__
+    for start in range(0, len(unique_rows), batch_size):
+        statement = insert(table).values(unique_rows[start:start + batch_size])
+        if update_columns:
+            statement = statement.on_conflict_do_update(
+                index_elements=list(conflict_columns),
+                set_={column: statement.excluded[column] for column in update_columns},
+            )
+        else:
+            statement = statement.on_conflict_do_nothing(index_elements=list(conflict_columns))
+        session.execute(statement)
+    return len(unique_rows)
+
+def upsert_influencers(session: Session, rows: Sequence[Dict[str, Any]], update_columns: Optional[Sequence[str]] = None) -> int:
+    """
+    Bulk upsert of influencers, by username. A new follower count refreshes
+    the engagement aggregates of the influencers it touches. Their cached
+    read models are invalidated when the session commits.
+    """
+    count = bulk_upsert(session, Influencer, rows, ["username"], update_columns)
+    if not rows:
+        return count
+    influencer_ids = session.exec(
+        select(Influencer.id).where(Influencer.username.in_([row["username"] for row in rows]))
+    ).all()
+    if "followers_count" in rows[0] and (update_columns is None or "followers_count" in update_columns):
+        refresh_engagement(session, influencer_ids)
+    invalidate_on_commit(session, influencer_ids)
+    return count
+
+def upsert_posts(session: Session, rows: Sequence[Dict[str, Any]], update_columns: Optional[Sequence[str]] = None) -> int:
+    """
+    Bulk upsert of posts, by external id, followed by a refresh of the
+    engagement aggregates of the influencers the posts belong to. Their
+    cached read models are invalidated when the session commits.
+    """
+    count = bulk_upsert(session, Post, rows, ["external_id"], update_columns)
+    influencer_ids = {row["influencer_id"] for row in rows}
+    refresh_engagement(session, influencer_ids)
+    invalidate_on_commit(session, influencer_ids)
+    return count
+
+def _median_likes(session: Session, influencer_ids: List[int]) -> Dict[int, float]:
+    """
+    Median likes per influencer, for databases without `percentile_cont`:
+    the middle post (or two) of each influencer's posts ranked by likes.
+    """
+    ranked = (
+        select(
+            Post.influencer_id.label("influencer_id"),
+            Post.likes_count.label("likes"),
+            func.row_number().over(partition_by=Post.influencer_id, order_by=Post.likes_count).label("position"),
+            func.count().over(partition_by=Post.influencer_id).label("total"),
+        )
+        .where(Post.influencer_id.in_(influencer_ids), Post.likes_count.is_not(None))
+        .subquery()
+    )
+    return dict(session.exec(
+        select(ranked.c.influencer_id, func.avg(ranked.c.likes))
+        .where(ranked.c.position.in_([(ranked.c.total + 1) // 2, (ranked.c.total + 2) // 2]))
+        .group_by(ranked.c.influencer_id)
+    ).all())
+
+def refresh_engagement(session: Session, influencer_ids: Iterable[int]) -> None:
+    """
+    Recomputes the engagement aggregates of `influencer_ids` (post count,
+    mean and median likes, mean comments, engagement rate) from their stored
+    posts. The aggregates are computed by the database, grouped by
+    influencer, so only one row per influencer comes back and only those
+    influencers are written: the cost of an upsert depends on what it
+    touched, not on the size of the tables.
+    """
+    influencer_ids = sorted(set(influencer_ids))
+    if not influencer_ids:
+        return
+
+    postgres = session.get_bind().dialect.name == "postgresql"
+    columns = [
+        Influencer.id,
+        Influencer.followers_count,
+        func.count(Post.id),
+        func.avg(Post.likes_count),
+        func.avg(Post.comments_count),
+    ]
+    if postgres:
+        columns.append(func.percentile_cont(0.5).within_group(Post.likes_count))
+    rows = session.exec(
+        select(*columns)
+        .select_from(Influencer)
+        .outerjoin(Post, Post.influencer_id == Influencer.id)
+        .where(Influencer.id.in_(influencer_ids))
+        .group_by(Influencer.id, Influencer.followers_count)
+    ).all()
+    medians = None if postgres else _median_likes(session, influencer_ids)
+
+    updates = []
+    for influencer_id, followers, post_count, mean_likes, mean_comments, *median in rows:
+        # Postgres averages integers into Decimals
+        mean_likes = float(mean_likes) if mean_likes is not None else None
+        mean_comments = float(mean_comments) if mean_comments is not None else None
+        median_likes = median[0] if postgres else medians.get(influencer_id)
+        engagement_rate = None
+        if followers and (mean_likes is not None or mean_comments is not None):
+            engagement_rate = ((mean_likes or 0.0) + (mean_comments or 0.0)) / followers
+        updates.append({
+            "id": influencer_id,
+            "post_count": post_count,
+            "mean_likes": mean_likes,
+            "median_likes": float(median_likes) if median_likes is not None else None,
+            "mean_comments": mean_comments,
+            "engagement_rate": engagement_rate,
+        })
+    if updates:
+        # ORM bulk UPDATE by primary key: one executemany
+        session.execute(update(Influencer), updates)
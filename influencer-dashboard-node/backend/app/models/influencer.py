@@ -1,6 +1,7 @@
 import enum
+from datetime import datetime
 from typing import List, Optional
-from sqlmodel import Field, Relationship, SQLModel, JSON, Column
+from sqlmodel import Field, Relationship, SQLModel, JSON, Column, Index, LargeBinary, UniqueConstraint
 
 class InfluencerCategory(str, enum.Enum):
     """
@@ -21,14 +22,27 @@ class PostBase(SQLModel):
     external_id: str = Field(index=True, unique=True)
     caption: Optional[str]
     image_url: str
+    # Typed engagement figures, indexed for sorting and filtering
+    likes_count: Optional[int] = Field(default=None, index=True)
+    comments_count: Optional[int] = Field(default=None, index=True)
+    view_count: Optional[int] = Field(default=None, index=True)
+    media_type: Optional[str] = Field(default=None, index=True)  # image | video | carousel
+    posted_at: Optional[datetime] = Field(default=None, index=True)
+    # Any other figure the source reports, as fetched
     metrics: Optional[dict] = Field(default={}, sa_column=Column(JSON))
     
 class Post(PostBase, table=True):
     """
     Database model for a post.
     """
+    # Keyset pagination of an influencer's posts, per sort key
+    __table_args__ = (
+        Index("ix_post_influencer_posted_at_id", "influencer_id", "posted_at", "id"),
+        Index("ix_post_influencer_likes_id", "influencer_id", "likes_count", "id"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
-    influencer_id: int = Field(foreign_key="influencer.id")
+    influencer_id: int = Field(foreign_key="influencer.id", index=True)
     influencer: "Influencer" = Relationship(back_populates="posts")
 
 class InfluencerBase(SQLModel):
@@ -45,6 +59,13 @@ class Influencer(InfluencerBase, table=True):
     """
     Database model for an influencer.
     """
+    # Keyset pagination of the influencer listing, per sort key
+    __table_args__ = (
+        Index("ix_influencer_followers_id", "followers_count", "id"),
+        Index("ix_influencer_engagement_id", "engagement_rate", "id"),
+        Index("ix_influencer_category_followers_id", "main_category", "followers_count", "id"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     
     # AI-generated fields
@@ -52,17 +73,177 @@ class Influencer(InfluencerBase, table=True):
     strengths: Optional[List[str]] = Field(default=[], sa_column=Column(JSON))
     weaknesses: Optional[List[str]] = Field(default=[], sa_column=Column(JSON))
     predominant_style: Optional[str]
+    # Version of the prompt bank the AI fields were scored with
+    prompt_version: Optional[str] = None
+
+    # Normalized mean of the post image embeddings, used for lookalike search
+    embedding: Optional[bytes] = Field(default=None, sa_column=Column(LargeBinary))
+    embedding_model: Optional[str] = None
+    embedding_updated_at: Optional[datetime] = Field(default=None, index=True)
+
+    # Engagement aggregates over the stored posts, refreshed on every post upsert
+    post_count: int = Field(default=0, index=True)
+    mean_likes: Optional[float] = Field(default=None, index=True)
+    median_likes: Optional[float] = None
+    mean_comments: Optional[float] = None
+    # Mean likes plus comments per post, over followers
+    engagement_rate: Optional[float] = None
 
     posts: List["Post"] = Relationship(back_populates="influencer")
 
+class PostAnalysis(SQLModel, table=True):
+    """
+    Database model for the stored categorization of one post, with the model
+    and prompt version that produced it.
+    """
+    id: Optional[int] = Field(default=None, primary_key=True)
+    external_id: str = Field(index=True, unique=True)
+    influencer_id: int = Field(foreign_key="influencer.id", index=True)
+    # Hash of the caption and image URL the analysis was computed from
+    input_hash: str
+    source: str  # caption | image | video
+    model_key: str = Field(index=True)
+    prompt_version: str = Field(index=True)
+    category: InfluencerCategory
+    label: Optional[str] = None
+    score: float = 0.0
+    attributes: Optional[dict] = Field(default={}, sa_column=Column(JSON))
+    embedding: Optional[bytes] = Field(default=None, sa_column=Column(LargeBinary))
+    analyzed_at: Optional[datetime] = None
+
+class MetricSnapshot(SQLModel, table=True):
+    """
+    Database model for the profile and engagement figures of an influencer
+    at one capture time. Append-only: one row per fetch of the profile.
+    """
+    __table_args__ = (Index("ix_metricsnapshot_influencer_captured", "influencer_id", "captured_at"),)
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    influencer_id: int = Field(foreign_key="influencer.id")
+    captured_at: datetime = Field(index=True)
+    followers_count: Optional[int] = None
+    post_count: int = 0
+    mean_likes: Optional[float] = None
+    mean_comments: Optional[float] = None
+    engagement_rate: Optional[float] = None
+
+class PostMetricSnapshot(SQLModel, table=True):
+    """
+    Database model for the engagement figures of a post at one capture time.
+    Append-only: one row per fetch that returned the post.
+    """
+    __table_args__ = (Index("ix_postmetricsnapshot_post_captured", "post_id", "captured_at"),)
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    post_id: int = Field(foreign_key="post.id")
+    influencer_id: int = Field(foreign_key="influencer.id", index=True)
+    captured_at: datetime = Field(index=True)
+    likes_count: Optional[int] = None
+    comments_count: Optional[int] = None
+    view_count: Optional[int] = None
+
+class MetricRollup(SQLModel, table=True):
+    """
+    Database model for the snapshots of an influencer over one day or week.
+    Figures are the last value seen for counts, and means weighted by the
+    number of snapshots for the engagement figures.
+    """
+    __table_args__ = (UniqueConstraint("influencer_id", "period", "period_start"),)
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    influencer_id: int = Field(foreign_key="influencer.id", index=True)
+    period: str = Field(index=True)  # day | week
+    period_start: datetime = Field(index=True)
+    samples: int = 0
+    followers_count: Optional[int] = None
+    followers_min: Optional[int] = None
+    followers_max: Optional[int] = None
+    post_count: int = 0
+    mean_likes: Optional[float] = None
+    mean_comments: Optional[float] = None
+    engagement_rate: Optional[float] = None
+
+class PostMetricRollup(SQLModel, table=True):
+    """
+    Database model for the snapshots of a post over one day or week: the
+    last figures seen in the period.
+    """
+    __table_args__ = (UniqueConstraint("post_id", "period", "period_start"),)
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    post_id: int = Field(foreign_key="post.id")
+    influencer_id: int = Field(foreign_key="influencer.id", index=True)
+    period: str = Field(index=True)  # day | week
+    period_start: datetime = Field(index=True)
+    samples: int = 0
+    likes_count: Optional[int] = None
+    comments_count: Optional[int] = None
+    view_count: Optional[int] = None
+
 class InfluencerRead(InfluencerBase):
     """
     Read model for an influencer.
     """
     id: int
+    main_category: Optional[InfluencerCategory] = None
+    post_count: int = 0
+    mean_likes: Optional[float] = None
+    median_likes: Optional[float] = None
+    engagement_rate: Optional[float] = None
+
+class PostRead(PostBase):
+    """
+    Read model for a post.
+    """
+    id: int
+    influencer_id: int
+
+class PostPage(SQLModel):
+    """
+    One page of an influencer's posts.
+    """
+    items: List[PostRead] = []
+    next_cursor: Optional[str] = None
 
 class InfluencerReadWithPosts(InfluencerRead):
     """
-    Read model for an influencer with their posts.
+    Read model for an influencer with their latest posts.
+    """
+    posts: List[PostRead] = []
+
+class InfluencerPage(SQLModel):
+    """
+    One page of the influencer listing. `next_cursor` fetches the next page,
+    and is None on the last one. `posts` is only filled when requested.
+    """
+    items: List[InfluencerReadWithPosts] = []
+    next_cursor: Optional[str] = None
+
+class MetricPoint(SQLModel):
+    """
+    Read model for one point of an influencer's metric history.
+    """
+    start: datetime
+    samples: int = 1
+    followers_count: Optional[int] = None
+    followers_min: Optional[int] = None
+    followers_max: Optional[int] = None
+    post_count: int = 0
+    mean_likes: Optional[float] = None
+    mean_comments: Optional[float] = None
+    engagement_rate: Optional[float] = None
+
+class MetricHistory(SQLModel):
+    """
+    Read model for an influencer's metric history over a time range.
+    """
+    influencer_id: int
+    resolution: str  # raw | day | week
+    points: List[MetricPoint] = []
+
+class InfluencerSimilarity(SQLModel):
+    """
+    Read model for a lookalike search result.
     """
-    posts: List[Post] = [] 
\ No newline at end of file
+    influencer: InfluencerRead
+    similarity: float
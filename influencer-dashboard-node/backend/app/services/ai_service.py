@@ -1,53 +1,493 @@
-import clip
-import torch
-from PIL import Image
+import os
+import re
+import threading
+import time
+import numpy as np
 import requests
-from io import BytesIO
+from PIL import Image
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple, Union
 
+from app.core.config import settings
 from app.models.influencer import InfluencerCategory
+from app.services import image_pipeline
+from app.services.embedding_cache import EmbeddingStore
+from app.services.image_pipeline import PipelineStats, decode_image, fetch_image_bytes, get_media_fetcher
+from app.services.prompt_bank import CATEGORY_GROUP, PromptBank, PromptRegistry, category_for
+from app.services.vector_index import normalized_mean
+from app.services.video_frames import sample_keyframes
+
+# Every zero-shot prompt (categories, styles, quality attributes), hot-reloaded
+# from the registry file when it changes
+prompt_registry = PromptRegistry(settings.PROMPT_REGISTRY_PATH, settings.PROMPT_REGISTRY_CHECK_SECONDS)
+
+
+class ClipModel:
+    """
+    Lazily initialised holder for the CLIP model and the encoded prompt bank.
+
+    The prompt text features are computed once per prompt bank content and
+    model, and cached on disk; a changed registry is encoded on first use.
+
+    Nothing is loaded (not even torch or clip) until the first call to `load()`,
+    so importing this module is cheap for processes that never categorize.
+
+    With a `server_url`, encoding is delegated to the shared inference server
+    (see `inference_server`) and no weights are loaded in this process, unless
+    the server cannot be reached.
+    """
+
+    def __init__(self, model_name: str, server_url: Optional[str] = None):
+        self.model_name = model_name
+        self.server_url = server_url
+        self.device: Optional[str] = None
+        self.backend = None
+        self.model_key = model_name
+        self.preprocess = None
+        self.input_resolution: Optional[int] = None
+        # (prompt bank, its normalized text features), swapped as one value
+        self.prompts: Optional[Tuple[PromptBank, np.ndarray]] = None
+        self.embedding_store: Optional[EmbeddingStore] = None
+        self.load_seconds: Optional[float] = None
+        self._lock = threading.Lock()
+
+    @property
+    def is_loaded(self) -> bool:
+        return self.prompts is not None
+
+    @property
+    def prompt_version(self) -> Optional[str]:
+        return self.prompts[0].version if self.prompts else None
+
+    def _load_local(self, backend_name: Optional[str] = None):
+        """
+        Loads the weights in this process and wraps them in `backend_name`,
+        the configured backend by default.
+        """
+        import clip
+        import torch
+        from app.services.clip_backends import create_backend, backend_model_key
+
+        backend_name = backend_name or settings.CLIP_BACKEND
+        # Only the eager backend can use a GPU; ONNX Runtime and int8 run on CPU
+        device = "cuda" if backend_name == "torch" and torch.cuda.is_available() else "cpu"
+        if settings.CLIP_NUM_THREADS:
+            torch.set_num_threads(settings.CLIP_NUM_THREADS)
+        model, preprocess = clip.load(self.model_name, device=device)
+
+        # The model is only held by the backend, so a fallback copy is freed with it
+        self.input_resolution = model.visual.input_resolution
+        return preprocess, create_backend(backend_name, model, device, self.model_name), backend_model_key(self.model_name, backend_name)
+
+    def _connect_remote(self):
+        """
+        Connects to the inference server; returns None when it is unreachable.
+
+        The server only answers once its model is loaded, so a worker started
+        alongside it retries INFERENCE_SERVER_CONNECT_ATTEMPTS times, doubling
+        the wait each time, before loading CLIP itself.
+        """
+        # The package only re-exports available_models, load and tokenize
+        from clip.clip import _transform
+        from app.services.inference_server import InferenceClient, RemoteBackend
+
+        client = InferenceClient(self.server_url, timeout=settings.INFERENCE_SERVER_TIMEOUT)
+        delay = settings.INFERENCE_SERVER_CONNECT_BACKOFF
+        for attempt in range(1, settings.INFERENCE_SERVER_CONNECT_ATTEMPTS + 1):
+            info = client.health()
+            if info is not None or attempt == settings.INFERENCE_SERVER_CONNECT_ATTEMPTS:
+                break
+            print(f"Inference server at {self.server_url} is not up yet, retrying in {delay:g}s")
+            time.sleep(delay)
+            delay *= 2
+        if info is None:
+            print(f"Inference server at {self.server_url} is unreachable, loading CLIP in-process")
+            return None
+
+        # The fallback runs the server's backend kind, not CLIP_BACKEND, so its
+        # embeddings belong under the server's model key like the server's own
+        def fallback():
+            _, local_backend, local_key = self._load_local(info["backend"])
+            if local_key != info["model_key"]:
+                raise RuntimeError(f"In-process CLIP would produce {local_key} embeddings, not {info['model_key']}")
+            return local_backend
+
+        backend = RemoteBackend(client, fallback=fallback, retry_seconds=settings.INFERENCE_SERVER_RETRY_SECONDS)
+        self.input_resolution = info["input_resolution"]
+        return _transform(info["input_resolution"]), backend, info["model_key"]
+
+    def _encode_prompts(self, backend, model_key: str, bank: PromptBank) -> np.ndarray:
+        """
+        Normalized text features of a prompt bank, read from the on-disk cache
+        when this model has already encoded these exact prompts. The cache is
+        keyed by the bank's content digest, not its declared version, so an
+        edit that keeps the version cannot reuse rows of other prompts.
+        """
+        import clip
+
+        stem = re.sub(r"[^A-Za-z0-9._-]+", "_", f"{model_key}-{bank.version}-{bank.digest}")
+        path = os.path.join(settings.PROMPT_EMBEDDING_DIR, f"{stem}.npy")
+        try:
+            cached = np.load(path, allow_pickle=False)
+            if cached.shape[0] == len(bank.prompts):
+                return cached
+        except (OSError, ValueError):
+            pass
+
+        text_embeddings = backend.encode_text(clip.tokenize(bank.prompts))
+        text_embeddings /= np.linalg.norm(text_embeddings, axis=-1, keepdims=True)
 
-# Ensure the model is loaded only once
-device = "cuda" if torch.cuda.is_available() else "cpu"
-model, preprocess = clip.load("ViT-B/32", device=device)
+        os.makedirs(settings.PROMPT_EMBEDDING_DIR, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as tmp_file:
+            np.save(tmp_file, text_embeddings, allow_pickle=False)
+        os.replace(tmp_path, path)
+        return text_embeddings
 
-# Pre-compute text features for categories
-categories = [f"a photo of a person related to {category.value}" for category in InfluencerCategory]
-text_features = clip.tokenize(categories).to(device)
-encoded_text = model.encode_text(text_features)
-encoded_text /= encoded_text.norm(dim=-1, keepdim=True)
+    def load(self) -> "ClipModel":
+        """
+        Loads the model and pre-computes the prompt bank text features, once.
+        """
+        if self.is_loaded:
+            return self
+
+        with self._lock:
+            if self.is_loaded:
+                return self
+
+            started = time.perf_counter()
+            loaded = self._connect_remote() if self.server_url else None
+            if loaded is None:
+                loaded = self._load_local()
+            preprocess, backend, model_key = loaded
+
+            # Pre-compute text features for every prompt in the bank
+            bank = prompt_registry.current()
+            text_embeddings = self._encode_prompts(backend, model_key, bank)
+
+            self.device = backend.device
+            self.backend = backend
+            self.preprocess = preprocess
+            self.model_key = model_key
+            if settings.EMBEDDING_CACHE_ENABLED:
+                self.embedding_store = EmbeddingStore(
+                    settings.EMBEDDING_CACHE_DIR, self.model_key, text_embeddings.shape[-1]
+                )
+            self.prompts = (bank, text_embeddings)
+            self.load_seconds = time.perf_counter() - started
+            print(f"Loaded CLIP {self.model_key} ({backend.name} backend) on {self.device} in {self.load_seconds:.2f}s")
+
+        return self
+
+    def current_prompts(self) -> Tuple[PromptBank, np.ndarray]:
+        """
+        The current prompt bank and its text features, re-encoding them if
+        the registry's prompts have changed since the last call.
+        """
+        self.load()
+        bank = prompt_registry.current()
+        if bank.digest != self.prompts[0].digest:
+            with self._lock:
+                if bank.digest != self.prompts[0].digest:
+                    self.prompts = (bank, self._encode_prompts(self.backend, self.model_key, bank))
+        return self.prompts
+
+    def health(self) -> Dict[str, Any]:
+        """
+        Reports whether the model is loaded, and where.
+        """
+        return {
+            "model_name": self.model_name,
+            "model_key": self.model_key,
+            "loaded": self.is_loaded,
+            "backend": self.backend.name if self.backend else settings.CLIP_BACKEND,
+            "device": self.device,
+            "server_url": self.server_url,
+            "load_seconds": self.load_seconds,
+            "prompt_version": self.prompt_version,
+        }
+
+
+clip_model = ClipModel(settings.CLIP_MODEL_NAME, server_url=settings.INFERENCE_SERVER_URL)
+
+
+def warm_up() -> Dict[str, Any]:
+    """
+    Loads the CLIP model ahead of the first categorization.
+    Meant to be called once at worker startup.
+    """
+    clip_model.load()
+    return clip_model.health()
+
+def is_model_loaded() -> bool:
+    """
+    Health flag: whether the CLIP model is loaded in this process.
+    """
+    return clip_model.is_loaded
+
+
+@dataclass
+class CategoryPrediction:
+    """
+    Result of categorizing a single image.
+
+    `attributes` holds the probabilities of every other prompt bank group
+    (style, lighting, ...), by group and label.
+    """
+    category: InfluencerCategory
+    score: float
+    scores: Dict[InfluencerCategory, float] = field(default_factory=dict)
+    attributes: Dict[str, Dict[str, float]] = field(default_factory=dict)
+    label: Optional[str] = None
+    model_key: Optional[str] = None
+    prompt_version: Optional[str] = None
+    embedding: Optional[np.ndarray] = field(default=None, repr=False)
 
 
 def get_image_from_url(url: str) -> Image:
     """
     Downloads an image from a URL and returns a PIL Image object.
     """
-    try:
-        response = requests.get(url)
-        response.raise_for_status()
-        image = Image.open(BytesIO(response.content))
-        return image
-    except requests.exceptions.RequestException as e:
-        print(f"Error downloading image: {e}")
+    data = fetch_image_bytes(url)
+    if data is None:
         return None
+    return decode_image(data, target_size=clip_model.input_resolution, max_pixels=settings.DECODE_MAX_PIXELS)
 
-def categorize_image(image_url: str) -> InfluencerCategory:
+def _encode_batch(image_tensors: List) -> np.ndarray:
     """
-    Categorizes an image from a URL using CLIP.
+    Runs a single forward pass of CLIP over a batch of preprocessed images and
+    returns their normalized embeddings.
     """
-    image = get_image_from_url(image_url)
-    if not image:
-        return InfluencerCategory.OTHER
+    import torch
 
-    image_input = preprocess(image).unsqueeze(0).to(device)
+    image_features = clip_model.load().backend.encode_image(torch.stack(image_tensors))
 
-    with torch.no_grad():
-        image_features = model.encode_image(image_input)
-    
     # Normalize the image features
-    image_features /= image_features.norm(dim=-1, keepdim=True)
-    
-    # Find the similarity
-    similarity = (100.0 * image_features @ encoded_text.T).softmax(dim=-1)
-    best_match_idx = similarity.cpu().numpy().argmax()
-    
-    return list(InfluencerCategory)[best_match_idx] 
\ No newline at end of file
+    return image_features / np.linalg.norm(image_features, axis=-1, keepdims=True)
+
+def _score_embeddings(embeddings: np.ndarray) -> List[CategoryPrediction]:
+    """
+    Scores normalized image embeddings against the whole prompt bank at once:
+    categories, styles and quality attributes come out of one matrix multiply.
+    """
+    bank, text_embeddings = clip_model.current_prompts()
+    probabilities = bank.score(embeddings, text_embeddings)
+    similarity = probabilities[CATEGORY_GROUP]
+    labels = bank.labels[CATEGORY_GROUP]
+
+    predictions = []
+    for row_idx, row in enumerate(similarity):
+        best_match_idx = int(row.argmax())
+        scores: Dict[InfluencerCategory, float] = {}
+        for label, score in zip(labels, row):
+            category = category_for(label)
+            scores[category] = scores.get(category, 0.0) + float(score)
+        predictions.append(CategoryPrediction(
+            category=category_for(labels[best_match_idx]),
+            score=float(row[best_match_idx]),
+            scores=scores,
+            label=labels[best_match_idx],
+            model_key=clip_model.model_key,
+            prompt_version=bank.version,
+            attributes={
+                group: {label: float(score) for label, score in zip(bank.labels[group], group_scores[row_idx])}
+                for group, group_scores in probabilities.items() if group != CATEGORY_GROUP
+            },
+        ))
+    return predictions
+
+def categorize_texts(texts: Sequence[str]) -> List[CategoryPrediction]:
+    """
+    Categorizes short texts, such as post captions, with the CLIP text encoder
+    against the same category prompts used for images.
+    """
+    import clip
+
+    loaded = clip_model.load()
+    text_features = loaded.backend.encode_text(clip.tokenize(list(texts), truncate=True))
+    predictions = _score_embeddings(text_features / np.linalg.norm(text_features, axis=-1, keepdims=True))
+    # Visual attributes (lighting, sharpness, ...) mean nothing for a caption
+    for prediction in predictions:
+        prediction.attributes = {}
+    return predictions
+
+def stream_embeddings(
+    urls_or_images: Sequence[Union[str, Image.Image]],
+    batch_size: Optional[int] = None,
+    stats: Optional[PipelineStats] = None,
+    cache: bool = True,
+) -> Iterator[Tuple[int, Optional[np.ndarray]]]:
+    """
+    Yields `(index, embedding)` for each image as soon as it is ready.
+
+    Downloads, decoding and inference overlap (see `image_pipeline`).
+    Embeddings are looked up by content hash in the embedding store first,
+    and near-duplicate images within the call share one embedding, so only
+    genuinely new images go through `encode_image`. With `cache=False` the
+    store is neither read nor written.
+    """
+    loaded = clip_model.load()
+    return image_pipeline.stream_embeddings(
+        urls_or_images,
+        preprocess=loaded.preprocess,
+        encode=_encode_batch,
+        store=loaded.embedding_store if cache else None,
+        batch_size=batch_size or settings.CLIP_BATCH_SIZE,
+        fetch_workers=settings.PIPELINE_FETCH_WORKERS,
+        decode_workers=settings.PIPELINE_DECODE_WORKERS,
+        queue_size=settings.PIPELINE_QUEUE_SIZE,
+        dedup_threshold=settings.DEDUP_HAMMING_THRESHOLD if settings.DEDUP_ENABLED else None,
+        decode_size=loaded.input_resolution,
+        max_pixels=settings.DECODE_MAX_PIXELS,
+        stats=stats,
+    )
+
+def embed_images(
+    urls_or_images: Sequence[Union[str, Image.Image]],
+    batch_size: Optional[int] = None,
+    stats: Optional[PipelineStats] = None,
+    cache: bool = True,
+) -> List[Optional[np.ndarray]]:
+    """
+    Returns the normalized CLIP embedding of each image, in input order, or
+    None when it cannot be loaded.
+    """
+    embeddings: List[Optional[np.ndarray]] = [None] * len(urls_or_images)
+    for index, embedding in stream_embeddings(urls_or_images, batch_size=batch_size, stats=stats, cache=cache):
+        embeddings[index] = embedding
+    return embeddings
+
+def stream_categorizations(
+    urls_or_images: Sequence[Union[str, Image.Image]],
+    batch_size: Optional[int] = None,
+    stats: Optional[PipelineStats] = None,
+) -> Iterator[Tuple[int, CategoryPrediction]]:
+    """
+    Yields `(index, prediction)` for each image as soon as it is categorized.
+    """
+    for index, embedding in stream_embeddings(urls_or_images, batch_size=batch_size, stats=stats):
+        if embedding is None:
+            yield index, CategoryPrediction(category=InfluencerCategory.OTHER, score=0.0)
+        else:
+            prediction = _score_embeddings(embedding[np.newaxis])[0]
+            prediction.embedding = embedding
+            yield index, prediction
+
+def categorize_images(
+    urls_or_images: Sequence[Union[str, Image.Image]],
+    batch_size: Optional[int] = None,
+    stats: Optional[PipelineStats] = None,
+) -> List[CategoryPrediction]:
+    """
+    Categorizes several images using CLIP, batching the forward passes.
+
+    Accepts image URLs or PIL images and returns one prediction per input, in
+    the same order. Images that cannot be loaded are reported as OTHER with a
+    score of 0.
+    """
+    embeddings = embed_images(urls_or_images, batch_size=batch_size, stats=stats)
+    predictions: List[CategoryPrediction] = [
+        CategoryPrediction(category=InfluencerCategory.OTHER, score=0.0) for _ in embeddings
+    ]
+
+    found = [index for index, embedding in enumerate(embeddings) if embedding is not None]
+    if found:
+        scored = _score_embeddings(np.stack([embeddings[index] for index in found]))
+        for index, prediction in zip(found, scored):
+            prediction.embedding = embeddings[index]
+            predictions[index] = prediction
+
+    return predictions
+
+def embed_videos(urls: Sequence[str], stats: Optional[PipelineStats] = None) -> List[Optional[np.ndarray]]:
+    """
+    Returns the pooled CLIP embedding of each video, in input order, or None
+    when it cannot be loaded.
+
+    Only VIDEO_KEYFRAMES keyframes per video are decoded (see
+    `video_frames.sample_keyframes`); they go through the batched image
+    pipeline together, and each video's embedding is the normalized mean of
+    its frames. Pooled embeddings are cached by video content hash, so a
+    repeated video is neither decoded nor encoded again.
+    """
+    loaded = clip_model.load()
+    store = loaded.embedding_store
+    stats = stats if stats is not None else PipelineStats()
+    stats.videos += len(urls)
+
+    def sample(url: str):
+        # Streamed to disk and decoded from there: a video is never held in memory whole
+        try:
+            with get_media_fetcher().open(url, max_bytes=settings.VIDEO_MAX_BYTES) as media:
+                cached = store.get(media.sha256) if store is not None else None
+                if cached is not None:
+                    stats.cache_hits += 1
+                    return media.sha256, cached
+                return media.sha256, sample_keyframes(media.file, settings.VIDEO_KEYFRAMES, target_size=loaded.input_resolution)
+        except (requests.exceptions.RequestException, OSError) as e:
+            print(f"Error downloading video: {e}")
+            return None, None
+
+    with ThreadPoolExecutor(max_workers=settings.PIPELINE_FETCH_WORKERS, thread_name_prefix="video-fetch") as pool:
+        sampled = list(pool.map(sample, urls))
+
+    embeddings: List[Optional[np.ndarray]] = [None] * len(urls)
+    frames, owners = [], []
+    for index, (_, result) in enumerate(sampled):
+        if isinstance(result, np.ndarray):
+            embeddings[index] = result
+        elif result:
+            frames.extend(result)
+            owners.extend([index] * len(result))
+
+    # Frames are counted as keyframes of their videos, not as images or
+    # failures, and kept out of the store: only the pooled embedding is looked up
+    frame_stats = PipelineStats()
+    frame_embeddings: Dict[int, List[np.ndarray]] = {}
+    for owner, embedding in zip(owners, embed_images(frames, stats=frame_stats, cache=False)):
+        if embedding is not None:
+            frame_embeddings.setdefault(owner, []).append(embedding)
+    stats.keyframes += frame_stats.images
+    stats.inferences += frame_stats.inferences
+    stats.duplicates += frame_stats.duplicates
+
+    pooled = []
+    for index, vectors in frame_embeddings.items():
+        embeddings[index] = normalized_mean(vectors)
+        pooled.append((sampled[index][0], embeddings[index]))
+    if store is not None and pooled:
+        store.add_many(pooled)
+
+    stats.failures += sum(embedding is None for embedding in embeddings)
+    return embeddings
+
+def categorize_videos(urls: Sequence[str], stats: Optional[PipelineStats] = None) -> List[CategoryPrediction]:
+    """
+    Categorizes videos from a few keyframes each. Videos that cannot be
+    loaded are reported as OTHER with a score of 0.
+    """
+    embeddings = embed_videos(urls, stats=stats)
+    predictions = [CategoryPrediction(category=InfluencerCategory.OTHER, score=0.0) for _ in embeddings]
+
+    found = [index for index, embedding in enumerate(embeddings) if embedding is not None]
+    if found:
+        for index, prediction in zip(found, categorize_embeddings(np.stack([embeddings[index] for index in found]))):
+            predictions[index] = prediction
+    return predictions
+
+def categorize_embeddings(embeddings: np.ndarray) -> List[CategoryPrediction]:
+    """
+    Categorizes already computed, normalized image embeddings against the
+    current prompt bank, without loading any image.
+    """
+    predictions = _score_embeddings(embeddings)
+    for prediction, embedding in zip(predictions, embeddings):
+        prediction.embedding = embedding
+    return predictions
+
+def categorize_image(image_url: str) -> InfluencerCategory:
+    """
+    Categorizes an image from a URL using CLIP.
+    """
+    return categorize_images([image_url])[0].category
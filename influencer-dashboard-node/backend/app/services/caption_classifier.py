@@ -0,0 +1,119 @@
+import hashlib
+import json
+import re
+from typing import Dict, List, Optional, Sequence, Set
+
+from app.core.config import settings
+from app.models.influencer import InfluencerCategory
+from app.services.ai_service import CategoryPrediction
+
+# Hashtags and keywords that give a post's category away, per category
+CATEGORY_LEXICON: Dict[InfluencerCategory, Set[str]] = {
+    InfluencerCategory.FASHION: {
+        "fashion", "style", "outfit", "ootd", "streetstyle", "fashionista", "fashionblogger",
+        "instafashion", "lookbook", "outfitoftheday", "dress", "moda", "estilo",
+    },
+    InfluencerCategory.FITNESS: {
+        "fitness", "gym", "workout", "fitfam", "training", "bodybuilding", "crossfit",
+        "fitnessmotivation", "running", "yoga", "cardio", "gains", "entrenamiento",
+    },
+    InfluencerCategory.FOOD: {
+        "food", "foodie", "foodporn", "instafood", "recipe", "recipes", "cooking", "chef",
+        "yummy", "delicious", "pasta", "brunch", "dinner", "comida", "receta",
+    },
+    InfluencerCategory.TRAVEL: {
+        "travel", "adventure", "wanderlust", "travelgram", "instatravel", "trip", "vacation",
+        "explore", "backpacking", "roadtrip", "mountains", "beach", "viaje", "viajes",
+    },
+    InfluencerCategory.BEAUTY: {
+        "beauty", "makeup", "skincare", "mua", "cosmetics", "lipstick", "nails", "hairstyle",
+        "makeupartist", "beautyblogger", "glow", "maquillaje", "belleza",
+    },
+    InfluencerCategory.TECHNOLOGY: {
+        "tech", "technology", "gadgets", "coding", "programming", "developer", "ai",
+        "iphone", "android", "setup", "gaming", "software", "tecnologia",
+    },
+}
+
+HASHTAG_WEIGHT = 1.0
+KEYWORD_WEIGHT = 0.5
+# Evidence needed before a caption can be trusted: a lone keyword is not enough
+EVIDENCE_PRIOR = 1.0
+
+# Identifies lexicon-based predictions in stored analyses; the version changes
+# whenever the lexicon does, so those analyses are recomputed
+LEXICON_MODEL_KEY = "caption-lexicon"
+LEXICON_VERSION = "sha-" + hashlib.sha256(
+    json.dumps({
+        "lexicon": {category.value: sorted(words) for category, words in CATEGORY_LEXICON.items()},
+        "weights": [HASHTAG_WEIGHT, KEYWORD_WEIGHT, EVIDENCE_PRIOR],
+    }, sort_keys=True).encode()
+).hexdigest()[:12]
+
+_HASHTAG_RE = re.compile(r"#(\w+)")
+_WORD_RE = re.compile(r"\b(\w+)\b")
+
+
+def score_caption(caption: Optional[str]) -> Optional[CategoryPrediction]:
+    """
+    Scores a caption against the category lexicon.
+
+    Hashtags count double compared with plain words. The confidence is the
+    winning category's share of the evidence, with a prior that keeps captions
+    with little evidence below the threshold. Returns None when nothing in the
+    caption matches.
+    """
+    if not caption:
+        return None
+
+    text = caption.lower()
+    hashtags = _HASHTAG_RE.findall(text)
+    words = _WORD_RE.findall(_HASHTAG_RE.sub(" ", text))
+
+    scores = {category: 0.0 for category in CATEGORY_LEXICON}
+    for category, lexicon in CATEGORY_LEXICON.items():
+        scores[category] += HASHTAG_WEIGHT * sum(tag in lexicon for tag in hashtags)
+        scores[category] += KEYWORD_WEIGHT * sum(word in lexicon for word in words)
+
+    total = sum(scores.values())
+    if total == 0:
+        return None
+
+    best = max(scores, key=scores.get)
+    return CategoryPrediction(
+        category=best,
+        score=scores[best] / (total + EVIDENCE_PRIOR),
+        scores={category: score / total for category, score in scores.items()},
+        label=best.value,
+        model_key=LEXICON_MODEL_KEY,
+        prompt_version=LEXICON_VERSION,
+    )
+
+def classify_captions(captions: Sequence[Optional[str]], use_clip_text: Optional[bool] = None) -> List[Optional[CategoryPrediction]]:
+    """
+    Cheap first pass over post captions, before any image is downloaded.
+
+    Uses the hashtag/keyword lexicon and, with `use_clip_text`, also CLIP
+    text-encoder similarity for captions the lexicon is unsure about. The
+    more confident of the two wins. Returns None for captions with no signal.
+    """
+    if use_clip_text is None:
+        use_clip_text = settings.CAPTION_USE_CLIP_TEXT
+
+    predictions = [score_caption(caption) for caption in captions]
+    if not use_clip_text:
+        return predictions
+
+    from app.services.ai_service import categorize_texts
+
+    threshold = settings.CAPTION_CONFIDENCE_THRESHOLD
+    unsure = [
+        index for index, (caption, prediction) in enumerate(zip(captions, predictions))
+        if caption and (prediction is None or prediction.score < threshold)
+    ]
+    if unsure:
+        for index, text_prediction in zip(unsure, categorize_texts([captions[index] for index in unsure])):
+            current = predictions[index]
+            if current is None or text_prediction.score > current.score:
+                predictions[index] = text_prediction
+    return predictions
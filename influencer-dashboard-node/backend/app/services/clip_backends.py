@@ -0,0 +1,163 @@
+import os
+import re
+from typing import Dict, Type
+
+import numpy as np
+import torch
+
+
+class ClipBackend:
+    """
+    Runs the CLIP image and text encoders.
+
+    Backends take the preprocessed image batch / tokenized prompts produced by
+    `clip` and return raw (unnormalized) float32 features as NumPy arrays.
+    """
+    name = "base"
+
+    def __init__(self, model, device: str, model_name: str):
+        self.model = model
+        self.device = device
+        self.model_name = model_name
+
+    def encode_image(self, image_input: torch.Tensor) -> np.ndarray:
+        raise NotImplementedError
+
+    def encode_text(self, tokens: torch.Tensor) -> np.ndarray:
+        raise NotImplementedError
+
+
+class TorchBackend(ClipBackend):
+    """
+    Eager PyTorch inference, the reference implementation.
+    """
+    name = "torch"
+
+    def encode_image(self, image_input: torch.Tensor) -> np.ndarray:
+        with torch.no_grad():
+            features = self.model.encode_image(image_input.to(self.device))
+        return features.float().cpu().numpy()
+
+    def encode_text(self, tokens: torch.Tensor) -> np.ndarray:
+        with torch.no_grad():
+            features = self.model.encode_text(tokens.to(self.device))
+        return features.float().cpu().numpy()
+
+
+class QuantizedTorchBackend(TorchBackend):
+    """
+    Eager PyTorch with the Linear layers dynamically quantized to int8.
+    CPU only.
+    """
+    name = "int8"
+
+    def __init__(self, model, device: str, model_name: str):
+        if device != "cpu":
+            raise ValueError("The int8 CLIP backend only runs on CPU")
+        quantized = torch.quantization.quantize_dynamic(model.float(), {torch.nn.Linear}, dtype=torch.qint8)
+        super().__init__(quantized, device, model_name)
+
+
+class _ImageEncoder(torch.nn.Module):
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, image):
+        return self.model.encode_image(image)
+
+
+class _TextEncoder(torch.nn.Module):
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, tokens):
+        return self.model.encode_text(tokens)
+
+
+class OnnxBackend(ClipBackend):
+    """
+    ONNX Runtime inference on CPU.
+
+    The encoders are exported once per model into `ONNX_MODEL_DIR` and reused
+    by every later process.
+    """
+    name = "onnx"
+
+    def __init__(self, model, device: str, model_name: str):
+        import onnxruntime
+        from app.core.config import settings
+
+        super().__init__(model, device, model_name)
+        os.makedirs(settings.ONNX_MODEL_DIR, exist_ok=True)
+        stem = re.sub(r"[^A-Za-z0-9._-]+", "_", model_name)
+        image_path = os.path.join(settings.ONNX_MODEL_DIR, f"{stem}-image.onnx")
+        text_path = os.path.join(settings.ONNX_MODEL_DIR, f"{stem}-text.onnx")
+
+        model = model.float().cpu().eval()
+        resolution = model.visual.input_resolution
+        if not os.path.exists(image_path):
+            self._export(_ImageEncoder(model), torch.randn(1, 3, resolution, resolution), "image", image_path)
+        if not os.path.exists(text_path):
+            import clip
+            self._export(_TextEncoder(model), clip.tokenize(["a photo"]), "tokens", text_path)
+
+        options = onnxruntime.SessionOptions()
+        if settings.CLIP_NUM_THREADS:
+            options.intra_op_num_threads = settings.CLIP_NUM_THREADS
+        providers = ["CPUExecutionProvider"]
+        self.image_session = onnxruntime.InferenceSession(image_path, options, providers=providers)
+        self.text_session = onnxruntime.InferenceSession(text_path, options, providers=providers)
+
+    @staticmethod
+    def _export(module: torch.nn.Module, example: torch.Tensor, input_name: str, path: str):
+        """
+        Exports an encoder with a dynamic batch dimension, atomically.
+        """
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        module.eval()
+        with torch.no_grad():
+            torch.onnx.export(
+                module,
+                example,
+                tmp_path,
+                input_names=[input_name],
+                output_names=["features"],
+                dynamic_axes={input_name: {0: "batch"}, "features": {0: "batch"}},
+                opset_version=14,
+            )
+        os.replace(tmp_path, path)
+
+    def encode_image(self, image_input: torch.Tensor) -> np.ndarray:
+        (features,) = self.image_session.run(None, {"image": image_input.float().cpu().numpy()})
+        return features.astype(np.float32)
+
+    def encode_text(self, tokens: torch.Tensor) -> np.ndarray:
+        (features,) = self.text_session.run(None, {"tokens": tokens.cpu().numpy().astype(np.int64)})
+        return features.astype(np.float32)
+
+
+BACKENDS: Dict[str, Type[ClipBackend]] = {
+    TorchBackend.name: TorchBackend,
+    QuantizedTorchBackend.name: QuantizedTorchBackend,
+    OnnxBackend.name: OnnxBackend,
+}
+
+
+def backend_model_key(model_name: str, backend_name: str) -> str:
+    """
+    Identifies the embeddings a backend produces. They differ slightly between
+    backends, so e.g. cached embeddings are kept apart per backend.
+    """
+    return model_name if backend_name == TorchBackend.name else f"{model_name}+{backend_name}"
+
+def create_backend(name: str, model, device: str, model_name: str) -> ClipBackend:
+    """
+    Builds the CLIP backend configured by name ("torch", "int8" or "onnx").
+    """
+    try:
+        backend_class = BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Unknown CLIP backend '{name}', expected one of {sorted(BACKENDS)}")
+    return backend_class(model, device, model_name)
@@ -0,0 +1,150 @@
+import fcntl
+import hashlib
+import os
+import re
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+EMBEDDING_DTYPE = np.float16
+
+
+def content_hash(data: bytes) -> str:
+    """
+    Content address of an image: the SHA-256 of its encoded bytes.
+    """
+    return hashlib.sha256(data).hexdigest()
+
+
+class EmbeddingStore:
+    """
+    Append-only, content-addressed store of image embeddings for one model.
+
+    Embeddings are rows of a float16 matrix file (`<model>.f16`) that is read
+    through a memory map. `<model>.index` maps content hashes to rows, one
+    `<hash>\\t<row>` line per embedding. Rows are written before their index
+    line, so a reader never sees an index entry without its data. Several
+    processes may share a store; appends are serialised with a file lock and
+    readers pick up new rows on the next lookup.
+    """
+
+    def __init__(self, directory: str, model_name: str, dim: int):
+        self.directory = directory
+        self.model_name = model_name
+        self.dim = dim
+
+        os.makedirs(directory, exist_ok=True)
+        stem = re.sub(r"[^A-Za-z0-9._-]+", "_", model_name)
+        self.matrix_path = os.path.join(directory, f"{stem}.f16")
+        self.index_path = os.path.join(directory, f"{stem}.index")
+        self.lock_path = os.path.join(directory, f"{stem}.lock")
+
+        self._rows: Dict[str, int] = {}
+        self._index_offset = 0
+        # One past the highest row seen in the index, i.e. the mapped size
+        self._next_row = 0
+        self._matrix: Optional[np.memmap] = None
+        self._thread_lock = threading.Lock()
+
+        for path in (self.matrix_path, self.index_path):
+            open(path, "ab").close()
+
+    def __len__(self) -> int:
+        with self._thread_lock:
+            self._refresh()
+            return len(self._rows)
+
+    def __contains__(self, digest: str) -> bool:
+        with self._thread_lock:
+            self._refresh()
+            return digest in self._rows
+
+    @contextmanager
+    def _file_lock(self):
+        with open(self.lock_path, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _refresh(self):
+        """
+        Reads index lines appended since the last refresh and remaps the
+        matrix if it grew.
+        """
+        with open(self.index_path, "rb") as index_file:
+            index_file.seek(self._index_offset)
+            chunk = index_file.read()
+
+        # Only consume complete lines; a concurrent writer may be mid-line.
+        complete = chunk[:chunk.rfind(b"\n") + 1]
+        for line in complete.decode().splitlines():
+            digest, row = line.split("\t")
+            self._rows[digest] = int(row)
+            self._next_row = max(self._next_row, int(row) + 1)
+        self._index_offset += len(complete)
+
+        if self._next_row and (self._matrix is None or self._matrix.shape[0] < self._next_row):
+            self._matrix = np.memmap(self.matrix_path, dtype=EMBEDDING_DTYPE, mode="r", shape=(self._next_row, self.dim))
+
+    def get(self, digest: str) -> Optional[np.ndarray]:
+        """
+        Returns the stored embedding for a content hash, or None.
+        """
+        return self.get_many([digest]).get(digest)
+
+    def get_many(self, digests: Iterable[str]) -> Dict[str, np.ndarray]:
+        """
+        Returns the stored embeddings (as float32) for the known content hashes.
+        """
+        with self._thread_lock:
+            self._refresh()
+            found = {digest: self._rows[digest] for digest in digests if digest in self._rows}
+            return {digest: np.asarray(self._matrix[row], dtype=np.float32) for digest, row in found.items()}
+
+    def add(self, digest: str, embedding: np.ndarray):
+        """
+        Stores the embedding for a content hash, unless it is already present.
+        """
+        self.add_many([(digest, embedding)])
+
+    def add_many(self, items: Iterable[Tuple[str, np.ndarray]]):
+        """
+        Appends embeddings for content hashes that are not stored yet.
+        """
+        with self._thread_lock, self._file_lock():
+            self._refresh()
+
+            new_items: List[Tuple[str, np.ndarray]] = []
+            seen = set()
+            for digest, embedding in items:
+                if digest in self._rows or digest in seen:
+                    continue
+                seen.add(digest)
+                new_items.append((digest, embedding))
+            if not new_items:
+                return
+
+            matrix = np.stack([np.asarray(embedding, dtype=EMBEDDING_DTYPE).reshape(self.dim) for _, embedding in new_items])
+            row_bytes = self.dim * np.dtype(EMBEDDING_DTYPE).itemsize
+            first_row = os.path.getsize(self.matrix_path) // row_bytes
+
+            with open(self.matrix_path, "r+b") as matrix_file:
+                # Truncate any partial row left behind by an interrupted writer
+                matrix_file.truncate(first_row * row_bytes)
+                matrix_file.seek(first_row * row_bytes)
+                matrix_file.write(matrix.tobytes())
+                matrix_file.flush()
+                os.fsync(matrix_file.fileno())
+
+            lines = "".join(f"{digest}\t{first_row + offset}\n" for offset, (digest, _) in enumerate(new_items))
+            with open(self.index_path, "r+b") as index_file:
+                # Same for a partial index line; everything before it has been read
+                index_file.truncate(self._index_offset)
+                index_file.seek(self._index_offset)
+                index_file.write(lines.encode())
+
+            self._refresh()
@@ -0,0 +1,117 @@
+import threading
+from io import BytesIO
+from typing import List, NamedTuple, Optional, Tuple, Union
+
+from PIL import Image, ImageStat
+
+HASH_SIZE = 8
+# Side of the grayscale copy the texture is measured on
+TEXTURE_SIZE = 32
+# Mean difference between neighbouring pixels (0-255) under which an image
+# is too flat to hash: plain backgrounds and text cards all hash to ~0
+MIN_TEXTURE = 2.0
+# Largest difference of any mean RGB channel between two near-duplicates
+COLOR_TOLERANCE = 16
+
+
+class ImageHash(NamedTuple):
+    """
+    Perceptual signature of an image: its dHash bits and its mean colour,
+    which confirms dHash matches (dHash ignores colour entirely).
+    """
+    bits: int
+    mean_color: Tuple[int, ...]
+
+
+def dhash(image: Image.Image, hash_size: int = HASH_SIZE) -> int:
+    """
+    Difference hash: compares neighbouring pixels of a tiny grayscale copy of
+    the image. Near-identical images (recompressed, resized, slightly cropped
+    carousel frames) end up a few bits apart.
+    """
+    small = image.convert("L").resize((hash_size + 1, hash_size), Image.BILINEAR)
+    pixels = small.tobytes()
+    bits = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            bits = (bits << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return bits
+
+def texture(image: Image.Image, size: int = TEXTURE_SIZE) -> float:
+    """
+    Mean absolute difference between horizontally neighbouring pixels of a
+    small grayscale copy of the image.
+    """
+    small = image.convert("L").resize((size + 1, size), Image.BILINEAR)
+    pixels = small.tobytes()
+    total = sum(
+        abs(pixels[row * (size + 1) + col] - pixels[row * (size + 1) + col + 1])
+        for row in range(size) for col in range(size)
+    )
+    return total / (size * size)
+
+def perceptual_hash(payload: Union[bytes, Image.Image], hash_size: int = HASH_SIZE) -> Optional[ImageHash]:
+    """
+    Perceptual signature of encoded image bytes or a PIL image, or None when
+    the image cannot be decoded or is too flat (see MIN_TEXTURE) for its
+    hash to tell it apart from other flat images.
+
+    Encoded JPEGs are decoded in draft mode, straight at a fraction of their
+    size, since the hash only needs a handful of pixels.
+    """
+    try:
+        if isinstance(payload, Image.Image):
+            image = payload
+        else:
+            image = Image.open(BytesIO(payload))
+            image.draft("RGB", (TEXTURE_SIZE * 2, TEXTURE_SIZE * 2))
+        # Every measure works on the same small copy
+        small = image.convert("RGB").resize((TEXTURE_SIZE + 1, TEXTURE_SIZE), Image.BILINEAR)
+        if texture(small) < MIN_TEXTURE:
+            return None
+        mean_color = tuple(round(channel) for channel in ImageStat.Stat(small).mean)
+        return ImageHash(dhash(small, hash_size), mean_color)
+    except (OSError, Image.DecompressionBombError):
+        return None
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+def is_near_duplicate(a: ImageHash, b: ImageHash, threshold: int, color_tolerance: int = COLOR_TOLERANCE) -> bool:
+    return (
+        hamming_distance(a.bits, b.bits) <= threshold
+        and max(abs(x - y) for x, y in zip(a.mean_color, b.mean_color)) <= color_tolerance
+    )
+
+
+class NearDuplicateIndex:
+    """
+    Groups images whose dHashes are within `threshold` bits of each other and
+    whose mean colours match. The first image of a group is its representative.
+    """
+
+    def __init__(self, threshold: int):
+        self.threshold = threshold
+        self._representatives: List[Tuple[ImageHash, int]] = []
+        self._lock = threading.Lock()
+
+    def find_or_add(self, image_hash: ImageHash, key: int) -> Optional[int]:
+        """
+        Returns the key of the representative `image_hash` is a near-duplicate
+        of, or registers it as a new representative and returns None.
+        """
+        with self._lock:
+            for representative_hash, representative_key in self._representatives:
+                if is_near_duplicate(image_hash, representative_hash, self.threshold):
+                    return representative_key
+            self._representatives.append((image_hash, key))
+            return None
+
+    def remove(self, key: int):
+        """
+        Withdraws a representative, e.g. one that failed to decode, so later
+        images stop matching it.
+        """
+        with self._lock:
+            self._representatives = [entry for entry in self._representatives if entry[1] != key]
@@ -0,0 +1,330 @@
+import queue
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from io import BytesIO
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import requests
+from PIL import Image
+
+from app.core.config import settings
+from app.services.embedding_cache import EmbeddingStore, content_hash
+from app.services.image_dedup import NearDuplicateIndex, perceptual_hash
+from app.services.media_fetch import MediaFetcher
+
+ImageSource = Union[str, Image.Image]
+
+# Items flowing from the fetch/decode stages into the inference stage
+_DONE = "done"      # (_DONE, index, embedding or None, outcome): nothing left to compute
+_READY = "ready"    # (_READY, index, digest, preprocessed tensor): needs inference
+
+
+@dataclass
+class PipelineStats:
+    """
+    Counters for one pipeline run.
+    """
+    images: int = 0
+    videos: int = 0
+    # Frames sampled from the videos; not counted as images
+    keyframes: int = 0
+    inferences: int = 0
+    cache_hits: int = 0
+    duplicates: int = 0
+    failures: int = 0
+
+    @property
+    def skipped_inferences(self) -> int:
+        return self.cache_hits + self.duplicates
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {**asdict(self), "skipped_inferences": self.skipped_inferences}
+
+
+_media_fetcher: Optional[MediaFetcher] = None
+_media_fetcher_lock = threading.Lock()
+
+
+def get_media_fetcher() -> MediaFetcher:
+    """
+    The process-wide pooled fetcher, created on first use from settings.
+    """
+    global _media_fetcher
+    with _media_fetcher_lock:
+        if _media_fetcher is None:
+            _media_fetcher = MediaFetcher(
+                cache_dir=settings.MEDIA_CACHE_DIR if settings.MEDIA_CACHE_ENABLED else None,
+                connect_timeout=settings.HTTP_CONNECT_TIMEOUT,
+                read_timeout=settings.HTTP_READ_TIMEOUT,
+                max_bytes=settings.MEDIA_MAX_BYTES,
+                pool_size=settings.HTTP_POOL_SIZE,
+                default_ttl=settings.MEDIA_CACHE_TTL_SECONDS,
+                max_cache_bytes=settings.MEDIA_CACHE_MAX_BYTES,
+            )
+        return _media_fetcher
+
+def fetch_image_bytes(url: str) -> Optional[bytes]:
+    """
+    Downloads an image from a URL and returns its encoded bytes.
+    Repeated URLs are served from the media cache.
+    """
+    try:
+        return get_media_fetcher().fetch(url).content
+    except requests.exceptions.RequestException as e:
+        print(f"Error downloading image: {e}")
+        return None
+
+def prefetch_media(urls: Sequence[str], max_bytes: Optional[int] = None, workers: Optional[int] = None) -> Dict[str, int]:
+    """
+    Downloads media into the on-disk media cache without decoding it, so a
+    later fetch of the same URLs, in any process sharing the cache
+    directory, is served from disk. Returns how many URLs were downloaded,
+    already cached, or failed.
+    """
+    counts = {"downloaded": 0, "cached": 0, "failed": 0}
+    if not urls or not settings.MEDIA_CACHE_ENABLED:
+        return counts
+    fetcher = get_media_fetcher()
+
+    def fetch(url: str) -> str:
+        try:
+            return "cached" if fetcher.fetch(url, max_bytes=max_bytes).from_cache else "downloaded"
+        except requests.exceptions.RequestException as e:
+            print(f"Error prefetching media: {e}")
+            return "failed"
+
+    with ThreadPoolExecutor(max_workers=workers or settings.PIPELINE_FETCH_WORKERS, thread_name_prefix="media-prefetch") as pool:
+        for outcome in pool.map(fetch, dict.fromkeys(urls)):
+            counts[outcome] += 1
+    return counts
+
+def decode_image(
+    data: bytes,
+    target_size: Optional[int] = None,
+    max_pixels: Optional[int] = None,
+    reducing_gap: float = 2.0,
+) -> Optional[Image.Image]:
+    """
+    Decodes encoded image bytes into an RGB PIL Image object.
+
+    With a `target_size` (the model's input resolution), the image is decoded
+    close to that size instead of at full resolution: JPEGs decode straight
+    at a reduced DCT scale (draft mode), other formats are shrunk with a
+    cheap `reduce` right after decoding. The shorter side is kept at least
+    `reducing_gap` times `target_size`, so the final resize still has pixels
+    to interpolate from.
+
+    Images that would still decode to more than `max_pixels` are rejected.
+    """
+    try:
+        image = Image.open(BytesIO(data))
+        if target_size:
+            wanted = int(target_size * reducing_gap)
+            # Only changes the decoder setup: nothing has been decoded yet
+            image.draft("RGB", (wanted, wanted))
+        if max_pixels and image.size[0] * image.size[1] > max_pixels:
+            print(f"Error decoding image: {image.size[0]}x{image.size[1]} is over the {max_pixels} pixel limit")
+            return None
+        image.load()
+
+        if target_size:
+            factor = min(image.size) // int(target_size * reducing_gap)
+            if factor > 1:
+                image = image.reduce(factor)
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+        return image
+    except (OSError, Image.DecompressionBombError) as e:
+        print(f"Error decoding image: {e}")
+        return None
+
+def image_digest(image: Image.Image) -> str:
+    """
+    Content address of an in-memory image, computed from its pixels.
+    """
+    header = f"{image.mode}:{image.size[0]}x{image.size[1]}:".encode()
+    return content_hash(header + image.tobytes())
+
+
+def stream_embeddings(
+    sources: Sequence[ImageSource],
+    preprocess: Callable,
+    encode: Callable[[List], np.ndarray],
+    store: Optional[EmbeddingStore] = None,
+    batch_size: int = 32,
+    fetch_workers: int = 8,
+    decode_workers: int = 4,
+    queue_size: int = 64,
+    batch_wait: float = 0.02,
+    dedup_threshold: Optional[int] = None,
+    decode_size: Optional[int] = None,
+    max_pixels: Optional[int] = None,
+    stats: Optional[PipelineStats] = None,
+) -> Iterator[Tuple[int, Optional[np.ndarray]]]:
+    """
+    Streams `(index, embedding)` pairs for the given image URLs or PIL images,
+    in completion order. The embedding is None when the image could not be
+    fetched or decoded.
+
+    The work is split into overlapping stages:
+
+    1. a pool of fetchers downloads each image and looks its content hash up
+       in the embedding store (cache hits are emitted right away). With a
+       `dedup_threshold`, images whose perceptual hash is within that many
+       bits of an earlier image reuse its embedding instead of being encoded;
+    2. a pool of decoders decodes the bytes, near `decode_size` and within
+       `max_pixels` (see `decode_image`), and runs `preprocess`;
+    3. the calling thread drains a bounded queue of preprocessed tensors into
+       batches of up to `batch_size` and runs `encode` on each batch.
+
+    A partial batch is flushed once no new tensor arrives within `batch_wait`
+    seconds, so a slow upstream stage never stalls inference.
+
+    Counts of inferences, cache hits, near-duplicates and failures are
+    accumulated into `stats` when given.
+    """
+    total = len(sources)
+    stats = stats if stats is not None else PipelineStats()
+    stats.images += total
+    if not total:
+        return
+
+    deduper = NearDuplicateIndex(dedup_threshold) if dedup_threshold is not None else None
+    # Near-duplicates waiting on their representative (with what they need to
+    # be decoded on their own), and finished representatives
+    followers: Dict[int, List[Tuple[int, str, Union[bytes, Image.Image]]]] = defaultdict(list)
+    finished: Dict[int, Optional[np.ndarray]] = {}
+    dedup_lock = threading.Lock()
+
+    ready: queue.Queue = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+
+    def put(item):
+        # Block on the bounded queue, but give up once the consumer has gone away
+        while not stop.is_set():
+            try:
+                ready.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    fetch_pool = ThreadPoolExecutor(max_workers=fetch_workers, thread_name_prefix="image-fetch")
+    decode_pool = ThreadPoolExecutor(max_workers=decode_workers, thread_name_prefix="image-decode")
+
+    def decode_stage(index: int, digest: str, payload: Union[bytes, Image.Image]):
+        try:
+            if isinstance(payload, Image.Image):
+                image = payload
+            else:
+                image = decode_image(payload, target_size=decode_size, max_pixels=max_pixels)
+            if image is None:
+                put((_DONE, index, None, "failed"))
+                return
+            put((_READY, index, digest, preprocess(image)))
+        except Exception as e:
+            print(f"Error preprocessing image {index}: {e}")
+            put((_DONE, index, None, "failed"))
+
+    def follow(index: int, representative: int, digest: str, payload: Union[bytes, Image.Image]):
+        with dedup_lock:
+            if representative not in finished:
+                followers[representative].append((index, digest, payload))
+                return
+            embedding = finished[representative]
+        if embedding is None:
+            decode_pool.submit(decode_stage, index, digest, payload)
+        else:
+            put((_DONE, index, embedding, "duplicate"))
+
+    def fetch_stage(index: int, source: ImageSource):
+        try:
+            if isinstance(source, Image.Image):
+                digest, payload = image_digest(source), source
+            else:
+                data = fetch_image_bytes(source)
+                if data is None:
+                    put((_DONE, index, None, "failed"))
+                    return
+                digest, payload = content_hash(data), data
+
+            cached = store.get(digest) if store is not None else None
+            if cached is not None:
+                put((_DONE, index, cached, "cache"))
+                return
+
+            if deduper is not None:
+                image_hash = perceptual_hash(payload)
+                representative = deduper.find_or_add(image_hash, index) if image_hash is not None else None
+                if representative is not None:
+                    follow(index, representative, digest, payload)
+                    return
+            decode_pool.submit(decode_stage, index, digest, payload)
+        except Exception as e:
+            print(f"Error fetching image {index}: {e}")
+            put((_DONE, index, None, "failed"))
+
+    def run_batch(batch):
+        features = encode([tensor for _, _, tensor in batch])
+        stats.inferences += len(batch)
+        if store is not None:
+            store.add_many([(digest, embedding) for (_, digest, _), embedding in zip(batch, features)])
+        return [(index, embedding) for (index, _, _), embedding in zip(batch, features)]
+
+    def with_followers(index: int, embedding: Optional[np.ndarray]):
+        # A finished image hands its embedding to the near-duplicates waiting
+        # on it. If it failed, they are decoded on their own instead
+        if deduper is None:
+            return [(index, embedding)]
+        with dedup_lock:
+            finished[index] = embedding
+            waiting = followers.pop(index, [])
+        if embedding is None:
+            deduper.remove(index)
+            for follower in waiting:
+                decode_pool.submit(decode_stage, *follower)
+            return [(index, embedding)]
+        stats.duplicates += len(waiting)
+        return [(index, embedding)] + [(follower, embedding) for follower, _, _ in waiting]
+
+    try:
+        for index, source in enumerate(sources):
+            fetch_pool.submit(fetch_stage, index, source)
+
+        completed = 0
+        batch = []
+        while completed < total:
+            try:
+                item = ready.get(timeout=batch_wait) if batch else ready.get()
+            except queue.Empty:
+                item = None
+
+            if item is not None:
+                if item[0] == _DONE:
+                    _, index, embedding, outcome = item
+                    if outcome == "cache":
+                        stats.cache_hits += 1
+                    elif outcome == "duplicate":
+                        stats.duplicates += 1
+                    elif outcome == "failed":
+                        stats.failures += 1
+                    for result in with_followers(index, embedding):
+                        completed += 1
+                        yield result
+                    continue
+                batch.append(item[1:])
+                if len(batch) < batch_size:
+                    continue
+
+            # The batch is full, or nothing else arrived in time: run inference now
+            for index, embedding in run_batch(batch):
+                for result in with_followers(index, embedding):
+                    completed += 1
+                    yield result
+            batch = []
+    finally:
+        stop.set()
+        fetch_pool.shutdown(wait=False, cancel_futures=True)
+        decode_pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,306 @@
+"""
+Local CLIP inference server shared by all Celery worker processes on a node.
+
+The server owns the only copy of the model and batches image-encoding
+requests from concurrent callers into single forward passes. Workers reach it
+through `InferenceClient` over a Unix socket or localhost HTTP; arrays travel
+as `.npy` payloads.
+
+Run it with:
+
+    INFERENCE_SERVER_URL=unix:///tmp/clip.sock python -m app.services.inference_server
+"""
+import http.client
+import json
+import os
+import queue
+import socket
+import socketserver
+import threading
+import time
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+import numpy as np
+
+from app.core.config import settings
+from app.services.clip_backends import ClipBackend
+
+
+def _dump_array(array: np.ndarray) -> bytes:
+    buffer = BytesIO()
+    np.save(buffer, array, allow_pickle=False)
+    return buffer.getvalue()
+
+def _load_array(data: bytes) -> np.ndarray:
+    return np.load(BytesIO(data), allow_pickle=False)
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, socket_path: str, timeout: float):
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+
+class InferenceClient:
+    """
+    Client for the inference server, over `unix:///path` or `http://host:port`.
+    """
+
+    def __init__(self, url: str, timeout: float = 60.0):
+        self.url = url
+        self.timeout = timeout
+        self._parsed = urlparse(url)
+
+    def _connection(self) -> http.client.HTTPConnection:
+        if self._parsed.scheme == "unix":
+            return _UnixHTTPConnection(self._parsed.path, self.timeout)
+        return http.client.HTTPConnection(self._parsed.hostname, self._parsed.port or 80, timeout=self.timeout)
+
+    def _request(self, method: str, path: str, body: Optional[bytes] = None) -> bytes:
+        connection = self._connection()
+        try:
+            connection.request(method, path, body=body, headers={"Content-Type": "application/octet-stream"})
+            response = connection.getresponse()
+            payload = response.read()
+            if response.status != 200:
+                raise http.client.HTTPException(f"Inference server returned {response.status}: {payload[:200]!r}")
+            return payload
+        finally:
+            connection.close()
+
+    def health(self) -> Optional[Dict[str, Any]]:
+        """
+        Returns the server's health report, or None if it cannot be reached.
+        """
+        try:
+            return json.loads(self._request("GET", "/health"))
+        except (OSError, http.client.HTTPException, ValueError):
+            return None
+
+    def encode_image(self, images: np.ndarray) -> np.ndarray:
+        return _load_array(self._request("POST", "/encode_image", _dump_array(images)))
+
+    def encode_text(self, tokens: np.ndarray) -> np.ndarray:
+        return _load_array(self._request("POST", "/encode_text", _dump_array(tokens)))
+
+
+class RemoteBackend(ClipBackend):
+    """
+    CLIP backend that forwards encoding to the inference server.
+
+    When a request to the server fails, that request and those of the next
+    `retry_seconds` run on a model loaded in-process through `fallback`, which
+    must produce the same embeddings as the server (same model and backend
+    kind). The in-process copy is dropped again once the server answers.
+    """
+    name = "remote"
+
+    def __init__(self, client: InferenceClient, fallback: Callable[[], ClipBackend], retry_seconds: float = 30.0):
+        super().__init__(model=None, device="remote", model_name=None)
+        self.client = client
+        self.retry_seconds = retry_seconds
+        self._fallback = fallback
+        self._local: Optional[ClipBackend] = None
+        self._retry_at = 0.0
+        self._fallback_lock = threading.Lock()
+
+    def _local_backend(self) -> ClipBackend:
+        with self._fallback_lock:
+            if self._local is None:
+                self._local = self._fallback()
+            return self._local
+
+    def _encode(self, operation: str, remote_input: np.ndarray, local_input) -> np.ndarray:
+        if time.monotonic() >= self._retry_at:
+            try:
+                result = getattr(self.client, operation)(remote_input)
+            except (OSError, http.client.HTTPException) as e:
+                print(
+                    f"Inference server request failed ({e}), using in-process CLIP "
+                    f"for the next {self.retry_seconds:.0f}s"
+                )
+                self._retry_at = time.monotonic() + self.retry_seconds
+            else:
+                if self._local is not None:
+                    print("Inference server is back, releasing the in-process CLIP")
+                    with self._fallback_lock:
+                        self._local = None
+                return result
+        return getattr(self._local_backend(), operation)(local_input)
+
+    def encode_image(self, image_input) -> np.ndarray:
+        # float16 halves the payload; the encoders run in float32 anyway
+        return self._encode("encode_image", image_input.cpu().numpy().astype(np.float16), image_input)
+
+    def encode_text(self, tokens) -> np.ndarray:
+        return self._encode("encode_text", tokens.cpu().numpy().astype(np.int64), tokens)
+
+
+class DynamicBatcher:
+    """
+    Merges image-encoding requests from concurrent callers into batches.
+
+    A batch closes once it holds `max_batch` images or `max_wait` seconds have
+    passed since its first request, whichever comes first.
+    """
+
+    def __init__(self, backend: ClipBackend, max_batch: int, max_wait: float):
+        self.backend = backend
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.requests = 0
+        self.batches = 0
+        self.images = 0
+        self._queue: "queue.Queue[Tuple[np.ndarray, Future]]" = queue.Queue()
+        threading.Thread(target=self._run, name="clip-batcher", daemon=True).start()
+
+    def encode_image(self, images: np.ndarray) -> np.ndarray:
+        future: Future = Future()
+        self._queue.put((images, future))
+        return future.result()
+
+    def _collect(self) -> List[Tuple[np.ndarray, Future]]:
+        pending = [self._queue.get()]
+        count = len(pending[0][0])
+        deadline = time.monotonic() + self.max_wait
+        while count < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            pending.append(item)
+            count += len(item[0])
+        return pending
+
+    def _run(self):
+        import torch
+
+        while True:
+            pending = self._collect()
+            sizes = [len(images) for images, _ in pending]
+            try:
+                stacked = torch.from_numpy(np.concatenate([images for images, _ in pending])).float()
+                features = self.backend.encode_image(stacked)
+            except Exception as e:
+                for _, future in pending:
+                    future.set_exception(e)
+                continue
+
+            self.requests += len(pending)
+            self.batches += 1
+            self.images += sum(sizes)
+            for (_, future), part in zip(pending, np.split(features, np.cumsum(sizes)[:-1])):
+                future.set_result(part)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = "ClipInference/1.0"
+
+    def address_string(self) -> str:
+        # Unix socket peers have no address
+        return str(self.client_address[0]) if self.client_address else "unix"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, body: bytes, content_type: str):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path != "/health":
+            self._send(404, b"Not found", "text/plain")
+            return
+        self._send(200, json.dumps(self.server.health()).encode(), "application/json")
+
+    def do_POST(self):
+        try:
+            payload = _load_array(self.rfile.read(int(self.headers["Content-Length"])))
+            if self.path == "/encode_image":
+                result = self.server.batcher.encode_image(payload)
+            elif self.path == "/encode_text":
+                import torch
+                result = self.server.clip_model.backend.encode_text(torch.from_numpy(payload))
+            else:
+                self._send(404, b"Not found", "text/plain")
+                return
+        except Exception as e:
+            self._send(500, str(e).encode(), "text/plain")
+            return
+        self._send(200, _dump_array(result.astype(np.float32)), "application/octet-stream")
+
+
+class _ServerMixin:
+    clip_model = None
+    batcher: DynamicBatcher = None
+
+    def health(self) -> Dict[str, Any]:
+        report = self.clip_model.health()
+        report.update(
+            input_resolution=self.clip_model.input_resolution,
+            requests=self.batcher.requests,
+            batches=self.batcher.batches,
+            images=self.batcher.images,
+            mean_batch_size=self.batcher.images / self.batcher.batches if self.batcher.batches else 0.0,
+        )
+        return report
+
+
+class _TCPServer(_ServerMixin, ThreadingHTTPServer):
+    pass
+
+
+class _UnixServer(_ServerMixin, socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def create_server(url: str):
+    """
+    Loads the model and binds the server to a `unix://` or `http://` address.
+    """
+    from app.services.ai_service import ClipModel
+
+    # The server always runs the model itself, never through another server
+    clip_model = ClipModel(settings.CLIP_MODEL_NAME).load()
+
+    parsed = urlparse(url)
+    if parsed.scheme == "unix":
+        if os.path.exists(parsed.path):
+            os.unlink(parsed.path)
+        server = _UnixServer(parsed.path, _Handler)
+    else:
+        server = _TCPServer((parsed.hostname or "127.0.0.1", parsed.port or 8765), _Handler)
+
+    server.clip_model = clip_model
+    server.batcher = DynamicBatcher(
+        clip_model.backend,
+        max_batch=settings.INFERENCE_SERVER_MAX_BATCH,
+        max_wait=settings.INFERENCE_SERVER_MAX_WAIT_MS / 1000,
+    )
+    return server
+
+
+def serve():
+    url = settings.INFERENCE_SERVER_BIND or settings.INFERENCE_SERVER_URL or "http://127.0.0.1:8765"
+    server = create_server(url)
+    print(f"CLIP inference server listening on {url}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    serve()
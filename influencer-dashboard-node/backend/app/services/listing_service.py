@@ -0,0 +1,186 @@
+import base64
+import json
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import func, tuple_
+from sqlmodel import Session, select
+
+from app.models.influencer import (
+    Influencer,
+    InfluencerCategory,
+    InfluencerRead,
+    InfluencerReadWithPosts,
+    Post,
+    PostAnalysis,
+    PostRead,
+)
+
+# Sort keys of each listing, all descending, with the id as tiebreaker. Each
+# one is backed by an index on (sort column, id), so a page is one index
+# range scan wherever it starts.
+INFLUENCER_SORTS = {
+    "followers": Influencer.followers_count,
+    "engagement": Influencer.engagement_rate,
+}
+POST_SORTS = {
+    "posted_at": Post.posted_at,
+    "likes": Post.likes_count,
+}
+
+
+class InvalidCursor(ValueError):
+    """
+    A pagination cursor that cannot be decoded, or was issued for another sort.
+    """
+
+
+def encode_cursor(sort: str, value: Any, row_id: int) -> str:
+    """
+    Opaque cursor pointing right after the row with sort `value` and `row_id`.
+    """
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    payload = json.dumps([sort, value, row_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str, sort: str) -> Tuple[Any, int]:
+    """
+    Inverse of `encode_cursor`: the `(value, id)` the cursor points after.
+    """
+    try:
+        cursor_sort, value, row_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if sort == "posted_at" and value is not None:
+            value = datetime.fromisoformat(value)
+        elif value is not None and (isinstance(value, bool) or not isinstance(value, (int, float))):
+            raise ValueError(f"{value!r} is not a number")
+        row_id = int(row_id)
+    except (TypeError, ValueError) as e:
+        raise InvalidCursor(f"Invalid cursor: {e}")
+    if cursor_sort != sort:
+        raise InvalidCursor(f"Cursor was issued for sort '{cursor_sort}', not '{sort}'")
+    return value, row_id
+
+
+def keyset_page(session: Session, statement, sort_column, id_column, limit: int, after: Optional[Tuple[Any, int]] = None) -> Tuple[List[Any], bool]:
+    """
+    Runs `statement` for the `limit` rows following `after`, in descending
+    `(sort_column, id_column)` order, rows without a sort value last.
+    Returns the rows and whether more follow.
+
+    Rows are selected with a row-value comparison, `(sort, id) < (value, id)`,
+    rather than an OFFSET, so deep pages cost the same as the first. Rows
+    with a NULL sort value are read by a second range scan, by id, once the
+    others run out.
+    """
+    rows: List[Any] = []
+    if after is None or after[0] is not None:
+        query = statement.where(sort_column.is_not(None))
+        if after is not None:
+            query = query.where(tuple_(sort_column, id_column) < tuple_(*after))
+        rows = list(session.exec(query.order_by(sort_column.desc(), id_column.desc()).limit(limit + 1)).all())
+    if len(rows) <= limit:
+        query = statement.where(sort_column.is_(None))
+        if after is not None and after[0] is None:
+            query = query.where(id_column < after[1])
+        rows += session.exec(query.order_by(id_column.desc()).limit(limit + 1 - len(rows))).all()
+    return rows[:limit], len(rows) > limit
+
+def _next_cursor(rows: List[Any], has_more: bool, sort: str, sort_attribute: str) -> Optional[str]:
+    if not has_more:
+        return None
+    last = rows[-1]
+    return encode_cursor(sort, getattr(last, sort_attribute), last.id)
+
+
+def list_influencers(
+    session: Session,
+    sort: str = "followers",
+    limit: int = 20,
+    cursor: Optional[str] = None,
+    category: Optional[InfluencerCategory] = None,
+) -> Tuple[List[Influencer], Optional[str]]:
+    """
+    One page of influencers, optionally of a single main category, and the
+    cursor of the next page.
+    """
+    sort_column = INFLUENCER_SORTS[sort]
+    statement = select(Influencer)
+    if category is not None:
+        statement = statement.where(Influencer.main_category == category)
+    after = decode_cursor(cursor, sort) if cursor else None
+    rows, has_more = keyset_page(session, statement, sort_column, Influencer.id, limit, after)
+    return rows, _next_cursor(rows, has_more, sort, sort_column.key)
+
+def list_posts(
+    session: Session,
+    influencer_id: int,
+    sort: str = "posted_at",
+    limit: int = 20,
+    cursor: Optional[str] = None,
+    category: Optional[InfluencerCategory] = None,
+    media_type: Optional[str] = None,
+) -> Tuple[List[Post], Optional[str]]:
+    """
+    One page of an influencer's posts, optionally only those analyzed into
+    `category` or of one media type, and the cursor of the next page.
+    """
+    sort_column = POST_SORTS[sort]
+    statement = select(Post).where(Post.influencer_id == influencer_id)
+    if category is not None:
+        statement = statement.join(PostAnalysis, PostAnalysis.external_id == Post.external_id).where(
+            PostAnalysis.category == category
+        )
+    if media_type is not None:
+        statement = statement.where(Post.media_type == media_type)
+    after = decode_cursor(cursor, sort) if cursor else None
+    rows, has_more = keyset_page(session, statement, sort_column, Post.id, limit, after)
+    return rows, _next_cursor(rows, has_more, sort, sort_column.key)
+
+
+def latest_posts(session: Session, influencer_ids: Sequence[int], per_influencer: int) -> Dict[int, List[Post]]:
+    """
+    The latest `per_influencer` posts of each influencer, by influencer id,
+    from one query: posts are ranked per influencer with a window function
+    and only the top of each ranking is read.
+    """
+    if not influencer_ids or per_influencer <= 0:
+        return {}
+    ranked = (
+        select(
+            Post.id.label("post_id"),
+            func.row_number().over(
+                partition_by=Post.influencer_id,
+                order_by=(Post.posted_at.desc().nulls_last(), Post.id.desc()),
+            ).label("position"),
+        )
+        .where(Post.influencer_id.in_(list(influencer_ids)))
+        .subquery()
+    )
+    posts = session.exec(
+        select(Post)
+        .join(ranked, ranked.c.post_id == Post.id)
+        .where(ranked.c.position <= per_influencer)
+        .order_by(Post.influencer_id, ranked.c.position)
+    ).all()
+
+    by_influencer: Dict[int, List[Post]] = defaultdict(list)
+    for post in posts:
+        by_influencer[post.influencer_id].append(post)
+    return by_influencer
+
+def with_latest_posts(session: Session, influencers: Sequence[Influencer], per_influencer: int) -> List[InfluencerReadWithPosts]:
+    """
+    Read models of `influencers` with their latest posts, loaded for all of
+    them at once by `latest_posts` rather than through the lazy
+    `Influencer.posts` relationship, which costs one query per influencer.
+    """
+    posts = latest_posts(session, [influencer.id for influencer in influencers], per_influencer)
+    return [
+        InfluencerReadWithPosts(
+            **InfluencerRead.model_validate(influencer).model_dump(),
+            posts=[PostRead.model_validate(post) for post in posts.get(influencer.id, [])],
+        )
+        for influencer in influencers
+    ]
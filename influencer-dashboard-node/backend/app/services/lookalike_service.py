@@ -0,0 +1,123 @@
+import logging
+import threading
+import time
+from typing import Dict, List, Tuple
+
+import numpy as np
+from sqlalchemy.engine import Engine
+from sqlmodel import Session, func, select
+
+from app.core.config import settings
+from app.models.influencer import Influencer
+from app.services.vector_index import VectorIndex, vector_from_bytes
+
+log = logging.getLogger(__name__)
+
+# One index per embedding model: (catalogue state, checked at, index)
+_indexes: Dict[str, Tuple[tuple, float, VectorIndex]] = {}
+# Background rebuilds in progress, by model
+_rebuilds: Dict[str, threading.Thread] = {}
+# Serialises the first build of each model's index
+_first_builds: Dict[str, threading.Lock] = {}
+# Guards the three dicts above; never held while an index is built
+_lock = threading.Lock()
+
+
+def _index_mode(size: int) -> str:
+    mode = settings.SIMILARITY_INDEX_MODE
+    if mode == "auto":
+        return "ivf" if size >= settings.SIMILARITY_IVF_MIN_SIZE else "exact"
+    return mode
+
+def _catalogue_state(session: Session, model_key: str) -> tuple:
+    return tuple(session.exec(
+        select(func.count(Influencer.id), func.max(Influencer.embedding_updated_at))
+        .where(Influencer.embedding_model == model_key)
+    ).one())
+
+def _build(bind: Engine, model_key: str) -> Tuple[tuple, VectorIndex]:
+    """
+    Reads every embedding of `model_key` in a session of its own and builds
+    the index over them, with the catalogue state it was read at.
+    """
+    started = time.perf_counter()
+    with Session(bind) as session:
+        state = _catalogue_state(session, model_key)
+        rows = session.exec(
+            select(Influencer.id, Influencer.embedding)
+            .where(Influencer.embedding_model == model_key, Influencer.embedding.is_not(None))
+        ).all()
+    ids = [row[0] for row in rows]
+    vectors = np.stack([vector_from_bytes(row[1]) for row in rows]) if rows else np.empty((0, 0))
+    index = VectorIndex(ids, vectors, mode=_index_mode(len(ids)), n_probe=settings.SIMILARITY_IVF_PROBES)
+    log.info(
+        "Built %s lookalike index for %s with %d influencers in %.2fs",
+        index.mode, model_key, len(index), time.perf_counter() - started,
+    )
+    return state, index
+
+def _rebuild(bind: Engine, model_key: str):
+    try:
+        state, index = _build(bind, model_key)
+        with _lock:
+            _indexes[model_key] = (state, time.monotonic(), index)
+    except Exception:
+        log.exception("Rebuilding the lookalike index for %s failed, keeping the previous one", model_key)
+    finally:
+        with _lock:
+            _rebuilds.pop(model_key, None)
+
+def get_index(session: Session, model_key: str) -> VectorIndex:
+    """
+    Returns the in-memory index of influencer embeddings for a model.
+
+    The catalogue (influencer count and latest embedding update) is checked
+    at most once every SIMILARITY_INDEX_REFRESH_SECONDS. When it changed, the
+    index is rebuilt on a background thread and the previous index keeps
+    serving until the new one replaces it, so only the very first request
+    for a model waits for a build.
+    """
+    with _lock:
+        cached = _indexes.get(model_key)
+        if cached and time.monotonic() - cached[1] < settings.SIMILARITY_INDEX_REFRESH_SECONDS:
+            return cached[2]
+        first_build = _first_builds.setdefault(model_key, threading.Lock())
+
+    if cached is None:
+        with first_build:
+            with _lock:
+                cached = _indexes.get(model_key)
+            if cached is None:
+                state, index = _build(session.get_bind(), model_key)
+                with _lock:
+                    _indexes[model_key] = (state, time.monotonic(), index)
+                return index
+
+    state = _catalogue_state(session, model_key)
+    with _lock:
+        # Either way, the catalogue is not checked again for a while
+        _indexes[model_key] = (cached[0], time.monotonic(), cached[2])
+        if state != cached[0] and model_key not in _rebuilds:
+            thread = threading.Thread(
+                target=_rebuild, args=(session.get_bind(), model_key), name=f"lookalike-index-{model_key}", daemon=True
+            )
+            _rebuilds[model_key] = thread
+            thread.start()
+    return cached[2]
+
+def find_similar_influencers(session: Session, influencer: Influencer, k: int = 10) -> List[Tuple[Influencer, float]]:
+    """
+    Returns the `k` influencers whose aggregate embedding is closest to the
+    given influencer's, most similar first.
+    """
+    if influencer.embedding is None:
+        return []
+
+    index = get_index(session, influencer.embedding_model)
+    matches = index.search(vector_from_bytes(influencer.embedding), k=k, exclude=[influencer.id])
+    if not matches:
+        return []
+
+    found = session.exec(select(Influencer).where(Influencer.id.in_([match_id for match_id, _ in matches]))).all()
+    by_id = {match.id: match for match in found}
+    return [(by_id[match_id], similarity) for match_id, similarity in matches if match_id in by_id]
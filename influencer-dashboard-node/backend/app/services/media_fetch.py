@@ -0,0 +1,393 @@
+"""
+Shared HTTP fetch layer for images and videos.
+
+One pooled `requests.Session` with keep-alive, connect/read timeouts, retries
+on transient errors, a maximum download size, and an optional on-disk cache
+that serves repeated URLs from disk and revalidates expired entries with
+ETag/Last-Modified.
+
+This module only depends on `requests`, so influencer-scrapper loads it
+from here by path rather than keeping a copy.
+"""
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+_MAX_AGE_RE = re.compile(r"max-age=(\d+)")
+# Pruning frees the cache down to this fraction of its limit, so that the
+# next few writes do not trigger it again
+_PRUNE_TO = 0.9
+
+
+class MediaTooLarge(requests.exceptions.RequestException):
+    """
+    The response exceeds the maximum download size.
+    """
+
+
+@dataclass
+class FetchResult:
+    content: bytes
+    content_type: str
+    from_cache: bool = False
+
+
+@dataclass
+class MediaFile:
+    """
+    A downloaded body on disk, open for reading, and its SHA-256.
+    """
+    file: BinaryIO
+    content_type: str
+    sha256: str
+    from_cache: bool = False
+
+
+class MediaFetcher:
+    """
+    Fetches media over a shared, pooled session, thread-safe.
+
+    With a `cache_dir`, bodies are kept on disk by URL. An entry is served
+    without any request while fresh (Cache-Control max-age, or `default_ttl`
+    seconds), and revalidated with a conditional GET afterwards. The cache is
+    trimmed to `max_cache_bytes`, oldest entries first.
+
+    The cache size is scanned from disk once, then kept up to date with the
+    bodies this fetcher writes; the directory is only walked again to prune,
+    which also picks up what other processes sharing it wrote.
+    """
+
+    def __init__(
+        self,
+        cache_dir: Optional[str] = None,
+        connect_timeout: float = 5.0,
+        read_timeout: float = 20.0,
+        max_bytes: int = 20 * 1024 * 1024,
+        pool_size: int = 32,
+        retries: int = 2,
+        default_ttl: float = 24 * 3600,
+        max_cache_bytes: Optional[int] = None,
+        headers: Optional[Dict[str, str]] = None,
+    ):
+        self.cache_dir = cache_dir
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self.max_cache_bytes = max_cache_bytes
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+        self._cache_bytes = 0
+        self._pruning = False
+        self._lock = threading.Lock()
+
+        retry = Retry(
+            total=retries,
+            backoff_factor=0.3,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset(["GET"]),
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        if headers:
+            self.session.headers.update(headers)
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+            if max_cache_bytes is not None:
+                self._cache_bytes = self._scan()[1]
+
+    def _paths(self, url: str):
+        key = hashlib.sha256(url.encode()).hexdigest()
+        base = os.path.join(self.cache_dir, key[:2], key)
+        return f"{base}.body", f"{base}.json"
+
+    def _read_cached(self, url: str):
+        body_path, meta_path = self._paths(url)
+        try:
+            with open(meta_path) as meta_file:
+                meta = json.load(meta_file)
+            with open(body_path, "rb") as body_file:
+                return meta, body_file.read()
+        except (OSError, ValueError):
+            return None, None
+
+    def _write_atomic(self, path: str, data: bytes):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as tmp_file:
+            tmp_file.write(data)
+        os.replace(tmp_path, path)
+
+    def _expires_at(self, response: requests.Response) -> Optional[float]:
+        """
+        When a response stops being fresh, or None when it must not be
+        stored. `no-cache` responses are stored already stale, so every use
+        revalidates them.
+        """
+        cache_control = response.headers.get("Cache-Control", "").lower()
+        if "no-store" in cache_control:
+            return None
+        if "no-cache" in cache_control:
+            return time.time()
+        match = _MAX_AGE_RE.search(cache_control)
+        ttl = int(match.group(1)) if match else self.default_ttl
+        return time.time() + ttl
+
+    def _store(self, url: str, response: requests.Response, content: bytes, meta: Optional[dict] = None):
+        expires_at = self._expires_at(response)
+        if expires_at is None:
+            return
+        if response.status_code != 304:
+            body_path = self._paths(url)[0]
+            replaced = self._body_size(body_path)
+            self._write_atomic(body_path, content)
+            self._grew(len(content) - replaced)
+        self._store_meta(url, response, expires_at, meta)
+
+    def _store_meta(self, url: str, response: requests.Response, expires_at: float, meta: Optional[dict] = None):
+        meta = dict(meta or {})
+        meta.update(
+            url=url,
+            expires_at=expires_at,
+            etag=response.headers.get("ETag", meta.get("etag")),
+            last_modified=response.headers.get("Last-Modified", meta.get("last_modified")),
+            content_type=response.headers.get("Content-Type", meta.get("content_type", "")),
+        )
+        self._write_atomic(self._paths(url)[1], json.dumps(meta).encode())
+
+    def _body_size(self, body_path: str) -> int:
+        try:
+            return os.path.getsize(body_path)
+        except OSError:
+            return 0
+
+    def _grew(self, size: int):
+        """
+        Counts `size` more bytes of cached bodies, and prunes once the cache
+        is over `max_cache_bytes` (one thread at a time).
+        """
+        if self.max_cache_bytes is None:
+            return
+        with self._lock:
+            self._cache_bytes += size
+            prune = self._cache_bytes > self.max_cache_bytes and not self._pruning
+            self._pruning = self._pruning or prune
+        if prune:
+            try:
+                self.prune()
+            finally:
+                with self._lock:
+                    self._pruning = False
+
+    def _check_length(self, response: requests.Response, url: str, max_bytes: int):
+        length = response.headers.get("Content-Length")
+        if length and length.isdigit() and int(length) > max_bytes:
+            raise MediaTooLarge(f"{url} is {length} bytes, over the {max_bytes} byte limit")
+
+    def _read_body(self, response: requests.Response, url: str, max_bytes: int) -> bytes:
+        self._check_length(response, url, max_bytes)
+        chunks, size = [], 0
+        for chunk in response.iter_content(chunk_size=64 * 1024):
+            size += len(chunk)
+            if size > max_bytes:
+                raise MediaTooLarge(f"{url} exceeds the {max_bytes} byte limit")
+            chunks.append(chunk)
+        return b"".join(chunks)
+
+    def _write_body(self, response: requests.Response, url: str, max_bytes: int, out: BinaryIO) -> str:
+        """
+        Streams the body into `out` chunk by chunk; returns its SHA-256.
+        """
+        self._check_length(response, url, max_bytes)
+        digest, size = hashlib.sha256(), 0
+        for chunk in response.iter_content(chunk_size=64 * 1024):
+            size += len(chunk)
+            if size > max_bytes:
+                raise MediaTooLarge(f"{url} exceeds the {max_bytes} byte limit")
+            digest.update(chunk)
+            out.write(chunk)
+        return digest.hexdigest()
+
+    def fetch(self, url: str, headers: Optional[Dict[str, str]] = None, max_bytes: Optional[int] = None) -> FetchResult:
+        """
+        Returns the body of `url`, from the disk cache when possible.
+        `max_bytes` overrides the fetcher's size limit for this request.
+
+        Raises `requests.exceptions.RequestException` (including
+        `MediaTooLarge`) on failure.
+        """
+        meta, cached = self._read_cached(url) if self.cache_dir else (None, None)
+        if cached is not None and meta.get("expires_at", 0) > time.time():
+            self.hits += 1
+            return FetchResult(cached, meta.get("content_type", ""), from_cache=True)
+
+        request_headers = dict(headers or {})
+        if cached is not None:
+            if meta.get("etag"):
+                request_headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                request_headers["If-Modified-Since"] = meta["last_modified"]
+
+        with self.session.get(url, headers=request_headers, timeout=self.timeout, stream=True) as response:
+            if response.status_code == 304 and cached is not None:
+                self.revalidated += 1
+                self._store(url, response, cached, meta)
+                return FetchResult(cached, meta.get("content_type", ""), from_cache=True)
+
+            response.raise_for_status()
+            content = self._read_body(response, url, max_bytes or self.max_bytes)
+            self.misses += 1
+            if self.cache_dir:
+                self._store(url, response, content)
+            return FetchResult(content, response.headers.get("Content-Type", ""))
+
+    def _open_cached(self, url: str):
+        """
+        The cache entry of `url`: its metadata and its body, open for reading.
+        """
+        body_path, meta_path = self._paths(url)
+        try:
+            with open(meta_path) as meta_file:
+                meta = json.load(meta_file)
+            return meta, open(body_path, "rb")
+        except (OSError, ValueError):
+            return None, None
+
+    def _media_file(self, meta: dict, body_file: BinaryIO) -> MediaFile:
+        sha256 = meta.get("sha256")
+        if sha256 is None:
+            # Entries stored by `fetch` carry no digest
+            digest = hashlib.sha256()
+            for chunk in iter(lambda: body_file.read(1024 * 1024), b""):
+                digest.update(chunk)
+            sha256 = digest.hexdigest()
+            body_file.seek(0)
+        return MediaFile(body_file, meta.get("content_type", ""), sha256, from_cache=True)
+
+    def _download(self, url: str, request_headers: Dict[str, str], max_bytes: int, meta: Optional[dict]) -> Tuple[Optional[MediaFile], Optional[str]]:
+        """
+        Streams `url` to disk: into the cache when the response allows it,
+        else into a temporary file. Returns the downloaded file (None when
+        the server answers that the cached entry of `meta` is still valid)
+        and the path of the temporary file to remove, if any.
+        """
+        with self.session.get(url, headers=request_headers, timeout=self.timeout, stream=True) as response:
+            if response.status_code == 304 and meta is not None:
+                self.revalidated += 1
+                expires_at = self._expires_at(response)
+                if expires_at is not None:
+                    self._store_meta(url, response, expires_at, meta)
+                return None, None
+
+            response.raise_for_status()
+            expires_at = self._expires_at(response) if self.cache_dir else None
+            if expires_at is not None:
+                body_path = self._paths(url)[0]
+                os.makedirs(os.path.dirname(body_path), exist_ok=True)
+                tmp_path = f"{body_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+                out = open(tmp_path, "w+b")
+            else:
+                fd, tmp_path = tempfile.mkstemp(prefix="media-")
+                out = os.fdopen(fd, "w+b")
+            try:
+                sha256 = self._write_body(response, url, max_bytes, out)
+            except BaseException:
+                out.close()
+                os.remove(tmp_path)
+                raise
+            self.misses += 1
+            content_type = response.headers.get("Content-Type", "")
+            if expires_at is not None:
+                # The open handle keeps reading the body even if it is pruned
+                replaced = self._body_size(body_path)
+                os.replace(tmp_path, body_path)
+                self._store_meta(url, response, expires_at, {"sha256": sha256})
+                self._grew(out.tell() - replaced)
+
+        out.seek(0)
+        return MediaFile(out, content_type, sha256), (tmp_path if expires_at is None else None)
+
+    @contextmanager
+    def open(self, url: str, headers: Optional[Dict[str, str]] = None, max_bytes: Optional[int] = None) -> Iterator[MediaFile]:
+        """
+        Like `fetch`, but the body is streamed to disk rather than held in
+        memory, for large media such as videos. Yields a `MediaFile` open on
+        the cached body, or on a temporary file removed on exit when the
+        response cannot be cached.
+        """
+        meta, cached = self._open_cached(url) if self.cache_dir else (None, None)
+        media, tmp_path = None, None
+        try:
+            if cached is not None and meta.get("expires_at", 0) > time.time():
+                self.hits += 1
+            else:
+                request_headers = dict(headers or {})
+                if cached is not None:
+                    if meta.get("etag"):
+                        request_headers["If-None-Match"] = meta["etag"]
+                    if meta.get("last_modified"):
+                        request_headers["If-Modified-Since"] = meta["last_modified"]
+                media, tmp_path = self._download(url, request_headers, max_bytes or self.max_bytes, meta if cached is not None else None)
+            yield media or self._media_file(meta, cached)
+        finally:
+            if cached is not None:
+                cached.close()
+            if media is not None:
+                media.file.close()
+            if tmp_path is not None:
+                os.remove(tmp_path)
+
+    def _scan(self) -> Tuple[List[Tuple[float, int, str]], int]:
+        """
+        Every cached body as `(mtime, size, path)`, and their total size.
+        """
+        entries, total = [], 0
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if not name.endswith(".body"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+        return entries, total
+
+    def prune(self):
+        """
+        Deletes the least recently written cache entries until the cache fits
+        in `max_cache_bytes`, with some room to spare.
+        """
+        if not self.cache_dir or self.max_cache_bytes is None:
+            return
+        entries, total = self._scan()
+        for _, size, path in sorted(entries):
+            if total <= self.max_cache_bytes * _PRUNE_TO:
+                break
+            for stale in (path, path[:-len(".body")] + ".json"):
+                try:
+                    os.remove(stale)
+                except OSError:
+                    pass
+            total -= size
+
+        with self._lock:
+            self._cache_bytes = total
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "revalidated": self.revalidated, "misses": self.misses}
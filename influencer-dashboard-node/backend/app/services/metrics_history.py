@@ -0,0 +1,312 @@
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import delete, insert, literal
+from sqlmodel import Session, select
+
+from app.core.config import settings
+from app.db.upsert import bulk_upsert
+from app.models.influencer import (
+    Influencer,
+    MetricPoint,
+    MetricRollup,
+    MetricSnapshot,
+    Post,
+    PostMetricRollup,
+    PostMetricSnapshot,
+)
+
+DAY = "day"
+WEEK = "week"
+RAW = "raw"
+RESOLUTIONS = (RAW, DAY, WEEK)
+# Figures of the per-post snapshots and rollups
+POST_FIGURES = ("likes_count", "comments_count", "view_count")
+
+# Rows read at a time while rolling up
+ROLLUP_FETCH_SIZE = 5000
+
+
+def as_utc(value: datetime) -> datetime:
+    """
+    `value` as an aware datetime, naive ones being taken as UTC (SQLite and
+    TIMESTAMP WITHOUT TIME ZONE columns give naive datetimes back).
+    """
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+def period_start(value: datetime, period: str) -> datetime:
+    """
+    Start of the UTC day, or of the ISO week (Monday), containing `value`.
+    """
+    value = as_utc(value).astimezone(timezone.utc)
+    start = datetime(value.year, value.month, value.day, tzinfo=timezone.utc)
+    return start - timedelta(days=start.weekday()) if period == WEEK else start
+
+
+def record_snapshots(session: Session, influencer_ids: Sequence[int], captured_at: Optional[datetime] = None) -> None:
+    """
+    Appends a snapshot of the current profile and engagement figures of
+    `influencer_ids`, copied from their rows in one INSERT ... SELECT.
+    Does not commit.
+    """
+    if not influencer_ids:
+        return
+    captured_at = captured_at or datetime.now(timezone.utc)
+    columns = ["influencer_id", "captured_at", "followers_count", "post_count", "mean_likes", "mean_comments", "engagement_rate"]
+    source = select(
+        Influencer.id,
+        literal(captured_at, type_=MetricSnapshot.__table__.c.captured_at.type),
+        Influencer.followers_count,
+        Influencer.post_count,
+        Influencer.mean_likes,
+        Influencer.mean_comments,
+        Influencer.engagement_rate,
+    ).where(Influencer.id.in_(list(influencer_ids)))
+    session.execute(insert(MetricSnapshot).from_select(columns, source))
+
+def record_post_snapshots(session: Session, external_ids: Sequence[str], captured_at: Optional[datetime] = None) -> None:
+    """
+    Appends a snapshot of the likes, comments and views of the posts with
+    `external_ids`, the ones a fetch just refreshed: posts the fetch did not
+    return keep their last snapshot instead of being copied again.
+    Does not commit.
+    """
+    if not external_ids:
+        return
+    captured_at = captured_at or datetime.now(timezone.utc)
+    columns = ["post_id", "influencer_id", "captured_at", *POST_FIGURES]
+    source = select(
+        Post.id,
+        Post.influencer_id,
+        literal(captured_at, type_=PostMetricSnapshot.__table__.c.captured_at.type),
+        Post.likes_count,
+        Post.comments_count,
+        Post.view_count,
+    ).where(Post.external_id.in_(list(external_ids)))
+    session.execute(insert(PostMetricSnapshot).from_select(columns, source))
+
+
+@dataclass
+class _Bucket:
+    """
+    Running aggregate of the points of one influencer over one period.
+    """
+    samples: int = 0
+    followers_count: Optional[int] = None
+    followers_min: Optional[int] = None
+    followers_max: Optional[int] = None
+    post_count: int = 0
+    # Weighted sum and weight of each mean figure
+    sums: Dict[str, Tuple[float, int]] = field(default_factory=dict)
+
+    def add(self, point, samples: int, followers_min: Optional[int], followers_max: Optional[int]):
+        # Points arrive in time order: the last count seen wins
+        self.samples += samples
+        if point.followers_count is not None:
+            self.followers_count = point.followers_count
+        if followers_min is not None:
+            self.followers_min = followers_min if self.followers_min is None else min(self.followers_min, followers_min)
+        if followers_max is not None:
+            self.followers_max = followers_max if self.followers_max is None else max(self.followers_max, followers_max)
+        self.post_count = point.post_count
+        for name in ("mean_likes", "mean_comments", "engagement_rate"):
+            value = getattr(point, name)
+            if value is not None:
+                total, weight = self.sums.get(name, (0.0, 0))
+                self.sums[name] = (total + value * samples, weight + samples)
+
+    def row(self, influencer_id: int, period: str, start: datetime) -> dict:
+        means = {name: total / weight for name, (total, weight) in self.sums.items() if weight}
+        return {
+            "influencer_id": influencer_id,
+            "period": period,
+            "period_start": start,
+            "samples": self.samples,
+            "followers_count": self.followers_count,
+            "followers_min": self.followers_min,
+            "followers_max": self.followers_max,
+            "post_count": self.post_count,
+            "mean_likes": means.get("mean_likes"),
+            "mean_comments": means.get("mean_comments"),
+            "engagement_rate": means.get("engagement_rate"),
+        }
+
+def _store_buckets(session: Session, period: str, buckets: Dict[Tuple[int, datetime], _Bucket]) -> int:
+    rows = [bucket.row(influencer_id, period, start) for (influencer_id, start), bucket in buckets.items()]
+    return bulk_upsert(session, MetricRollup, rows, ["influencer_id", "period", "period_start"])
+
+def _rollup_posts(session: Session, period: str, points: Iterable[Tuple[datetime, int, object]]) -> int:
+    """
+    Folds time-ordered `(time, samples, point)` post snapshots or rollups
+    into one row per post and period: the last figures seen, and the number
+    of snapshots behind them.
+    """
+    buckets: Dict[Tuple[int, datetime], dict] = {}
+    for moment, samples, point in points:
+        start = period_start(moment, period)
+        row = buckets.setdefault((point.post_id, start), {
+            "post_id": point.post_id,
+            "influencer_id": point.influencer_id,
+            "period": period,
+            "period_start": start,
+            "samples": 0,
+            **{name: None for name in POST_FIGURES},
+        })
+        row["samples"] += samples
+        for name in POST_FIGURES:
+            value = getattr(point, name)
+            if value is not None:
+                row[name] = value
+    return bulk_upsert(session, PostMetricRollup, list(buckets.values()), ["post_id", "period", "period_start"])
+
+def rollup_days(session: Session, start: datetime, end: datetime) -> int:
+    """
+    Rolls the raw profile and post snapshots captured in `[start, end)` up
+    into daily points. Days are recomputed whole, so the range is widened to
+    full days and the rollup can be re-run as often as needed. Returns the
+    number of points written. Does not commit.
+    """
+    start, end = period_start(start, DAY), period_start(end, DAY) + timedelta(days=1)
+    snapshots = session.exec(
+        select(MetricSnapshot)
+        .where(MetricSnapshot.captured_at >= start, MetricSnapshot.captured_at < end)
+        .order_by(MetricSnapshot.captured_at)
+        .execution_options(yield_per=ROLLUP_FETCH_SIZE)
+    )
+    buckets: Dict[Tuple[int, datetime], _Bucket] = {}
+    for snapshot in snapshots:
+        key = (snapshot.influencer_id, period_start(snapshot.captured_at, DAY))
+        buckets.setdefault(key, _Bucket()).add(snapshot, 1, snapshot.followers_count, snapshot.followers_count)
+    rows = _store_buckets(session, DAY, buckets)
+
+    post_snapshots = session.exec(
+        select(PostMetricSnapshot)
+        .where(PostMetricSnapshot.captured_at >= start, PostMetricSnapshot.captured_at < end)
+        .order_by(PostMetricSnapshot.captured_at)
+        .execution_options(yield_per=ROLLUP_FETCH_SIZE)
+    )
+    return rows + _rollup_posts(session, DAY, ((snapshot.captured_at, 1, snapshot) for snapshot in post_snapshots))
+
+def rollup_weeks(session: Session, start: datetime, end: datetime) -> int:
+    """
+    Rolls the daily profile and post points of the weeks overlapping
+    `[start, end)` up into weekly points. Returns the number of points
+    written. Does not commit.
+    """
+    start, end = period_start(start, WEEK), period_start(end, WEEK) + timedelta(weeks=1)
+    days = session.exec(
+        select(MetricRollup)
+        .where(MetricRollup.period == DAY, MetricRollup.period_start >= start, MetricRollup.period_start < end)
+        .order_by(MetricRollup.period_start)
+        .execution_options(yield_per=ROLLUP_FETCH_SIZE)
+    )
+    buckets: Dict[Tuple[int, datetime], _Bucket] = {}
+    for day in days:
+        key = (day.influencer_id, period_start(day.period_start, WEEK))
+        buckets.setdefault(key, _Bucket()).add(day, day.samples, day.followers_min, day.followers_max)
+    rows = _store_buckets(session, WEEK, buckets)
+
+    post_days = session.exec(
+        select(PostMetricRollup)
+        .where(PostMetricRollup.period == DAY, PostMetricRollup.period_start >= start, PostMetricRollup.period_start < end)
+        .order_by(PostMetricRollup.period_start)
+        .execution_options(yield_per=ROLLUP_FETCH_SIZE)
+    )
+    return rows + _rollup_posts(session, WEEK, ((day.period_start, day.samples, day) for day in post_days))
+
+def prune_metrics(session: Session, now: Optional[datetime] = None) -> Dict[str, int]:
+    """
+    Deletes the points older than their tier's retention: raw profile and
+    post snapshots after METRICS_RAW_RETENTION_DAYS (by then they live on as
+    daily points), daily points after METRICS_DAILY_RETENTION_DAYS, weekly
+    points after METRICS_WEEKLY_RETENTION_DAYS. Returns the number of
+    profile and post points deleted per tier. Does not commit.
+    """
+    now = now or datetime.now(timezone.utc)
+    raw_cutoff = period_start(now - timedelta(days=settings.METRICS_RAW_RETENTION_DAYS), DAY)
+    deleted = {
+        RAW: session.execute(delete(MetricSnapshot).where(MetricSnapshot.captured_at < raw_cutoff)).rowcount
+        + session.execute(delete(PostMetricSnapshot).where(PostMetricSnapshot.captured_at < raw_cutoff)).rowcount,
+    }
+    for period, days in ((DAY, settings.METRICS_DAILY_RETENTION_DAYS), (WEEK, settings.METRICS_WEEKLY_RETENTION_DAYS)):
+        cutoff = period_start(now - timedelta(days=days), period)
+        deleted[period] = sum(
+            session.execute(delete(model).where(model.period == period, model.period_start < cutoff)).rowcount
+            for model in (MetricRollup, PostMetricRollup)
+        )
+    return deleted
+
+
+def history_resolution(start: datetime, end: datetime, resolution: Optional[str] = None) -> str:
+    """
+    The tier a range query is served from: daily points up to
+    METRICS_DAILY_RESOLUTION_MAX_DAYS, weekly points for longer ranges.
+    Raw snapshots are only read when asked for.
+    """
+    if resolution:
+        if resolution not in RESOLUTIONS:
+            raise ValueError(f"Unknown resolution '{resolution}', expected one of {', '.join(RESOLUTIONS)}")
+        return resolution
+    return DAY if end - start <= timedelta(days=settings.METRICS_DAILY_RESOLUTION_MAX_DAYS) else WEEK
+
+def metric_history(
+    session: Session,
+    influencer_id: int,
+    start: datetime,
+    end: datetime,
+    resolution: Optional[str] = None,
+) -> Tuple[str, List[MetricPoint]]:
+    """
+    The metric points of an influencer in `[start, end)`, oldest first, and
+    the resolution they were read at.
+    """
+    resolution = history_resolution(start, end, resolution)
+    if resolution == RAW:
+        snapshots = session.exec(
+            select(MetricSnapshot)
+            .where(
+                MetricSnapshot.influencer_id == influencer_id,
+                MetricSnapshot.captured_at >= start,
+                MetricSnapshot.captured_at < end,
+            )
+            .order_by(MetricSnapshot.captured_at)
+        ).all()
+        return resolution, [
+            MetricPoint(
+                start=as_utc(snapshot.captured_at),
+                followers_count=snapshot.followers_count,
+                followers_min=snapshot.followers_count,
+                followers_max=snapshot.followers_count,
+                post_count=snapshot.post_count,
+                mean_likes=snapshot.mean_likes,
+                mean_comments=snapshot.mean_comments,
+                engagement_rate=snapshot.engagement_rate,
+            )
+            for snapshot in snapshots
+        ]
+
+    rollups = session.exec(
+        select(MetricRollup)
+        .where(
+            MetricRollup.influencer_id == influencer_id,
+            MetricRollup.period == resolution,
+            MetricRollup.period_start >= period_start(start, resolution),
+            MetricRollup.period_start < end,
+        )
+        .order_by(MetricRollup.period_start)
+    ).all()
+    return resolution, [
+        MetricPoint(
+            start=as_utc(rollup.period_start),
+            samples=rollup.samples,
+            followers_count=rollup.followers_count,
+            followers_min=rollup.followers_min,
+            followers_max=rollup.followers_max,
+            post_count=rollup.post_count,
+            mean_likes=rollup.mean_likes,
+            mean_comments=rollup.mean_comments,
+            engagement_rate=rollup.engagement_rate,
+        )
+        for rollup in rollups
+    ]
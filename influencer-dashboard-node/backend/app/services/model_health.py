@@ -0,0 +1,84 @@
+import json
+import os
+import socket
+import threading
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+from app.core.config import settings
+from app.services.redis_fallback import RedisWithFallback, default_redis_url
+
+_HEALTH_KEY = "model-health:workers"
+
+
+class _LocalStore:
+    """
+    In-process stand-in for Redis: only reports this process's own state.
+    """
+
+    def __init__(self):
+        self._reports: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def publish(self, key: str, field: str, value: str):
+        with self._lock:
+            self._reports[field] = value
+
+    def remove(self, key: str, field: str):
+        with self._lock:
+            self._reports.pop(field, None)
+
+    def read(self, key: str) -> Dict[str, str]:
+        with self._lock:
+            return dict(self._reports)
+
+
+class _RedisStore:
+    def __init__(self, url: str):
+        import redis
+
+        self.client = redis.Redis.from_url(url, socket_timeout=2, socket_connect_timeout=2, decode_responses=True)
+
+    def publish(self, key: str, field: str, value: str):
+        self.client.hset(key, field, value)
+
+    def remove(self, key: str, field: str):
+        self.client.hdel(key, field)
+
+    def read(self, key: str) -> Dict[str, str]:
+        return self.client.hgetall(key)
+
+
+_store = RedisWithFallback(
+    default_redis_url(settings.MODEL_HEALTH_REDIS_URL), _RedisStore, _LocalStore(), "Model health store"
+)
+
+
+def process_name() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+def publish_model_health(report: Dict[str, Any], error: Optional[str] = None):
+    """
+    Publishes the CLIP health report of this worker process, so the API,
+    which never loads the model, can tell whether the workers did.
+    """
+    report = dict(report, error=error, reported_at=datetime.now(timezone.utc).isoformat())
+    _store.call("publish", _HEALTH_KEY, process_name(), json.dumps(report))
+
+def withdraw_model_health():
+    """
+    Removes this process's report, when it shuts down.
+    """
+    _store.call("remove", _HEALTH_KEY, process_name())
+
+def worker_model_health() -> Dict[str, Any]:
+    """
+    The last report of every worker process that loaded (or tried to load)
+    the model, by `host:pid`. A process killed without shutting down keeps
+    its last report.
+    """
+    workers = {name: json.loads(report) for name, report in sorted(_store.call("read", _HEALTH_KEY).items())}
+    return {
+        "loaded": bool(workers) and all(report["loaded"] for report in workers.values()),
+        "workers": workers,
+    }
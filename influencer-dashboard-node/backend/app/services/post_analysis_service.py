@@ -0,0 +1,279 @@
+import base64
+import hashlib
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+from sqlmodel import Session, and_, or_, select
+
+from app.core.config import settings
+from app.models.influencer import Influencer, InfluencerCategory, PostAnalysis
+from app.services.ai_service import (
+    CategoryPrediction,
+    categorize_embeddings,
+    categorize_images,
+    categorize_videos,
+    clip_model,
+    prompt_registry,
+)
+from app.services.caption_classifier import LEXICON_MODEL_KEY, LEXICON_VERSION, classify_captions
+from app.services.image_pipeline import PipelineStats
+from app.services.prompt_bank import aggregate_attributes
+from app.services.read_cache import invalidate_on_commit
+from app.services.vector_index import normalized_mean, vector_from_bytes, vector_to_bytes
+from app.services.video_frames import is_video_post, video_url
+
+# Analyses computed from the post media, which carry an embedding
+MEDIA_SOURCES = ("image", "video")
+
+
+def post_input_hash(post: dict) -> str:
+    """
+    Fingerprint of the post content an analysis depends on.
+    """
+    content = f"{post.get('caption') or ''}\0{post.get('display_url') or ''}"
+    if is_video_post(post):
+        content += f"\0{video_url(post)}"
+    return hashlib.sha256(content.encode()).hexdigest()[:16]
+
+def current_versions() -> Tuple[str, str]:
+    """
+    The `(model_key, prompt_version)` new image analyses are produced with.
+    """
+    bank, _ = clip_model.current_prompts()
+    return clip_model.model_key, bank.version
+
+def expected_versions() -> Tuple[Optional[str], str]:
+    """
+    `current_versions` for processes that do not load the model: the model
+    key is None until this process has loaded it, and the prompt version is
+    read from the registry.
+    """
+    return (clip_model.model_key if clip_model.is_loaded else None), prompt_registry.current().version
+
+def is_stale(analysis: Optional[PostAnalysis], input_hash: str, model_key: Optional[str], prompt_version: str) -> bool:
+    """
+    Whether a post needs to be analyzed again: it is new, its content changed,
+    its image could not be loaded last time, or the model or prompts that
+    produced the stored analysis are no longer current. A `model_key` of None
+    skips the model check.
+    """
+    if analysis is None or analysis.input_hash != input_hash:
+        return True
+    if analysis.model_key == LEXICON_MODEL_KEY:
+        return analysis.prompt_version != LEXICON_VERSION
+    if analysis.source in MEDIA_SOURCES and analysis.embedding is None:
+        return True
+    return (model_key is not None and analysis.model_key != model_key) or analysis.prompt_version != prompt_version
+
+
+def _confident_captions(posts: Sequence[dict], use_clip_text: Optional[bool] = None) -> List[Tuple[int, CategoryPrediction]]:
+    if not settings.CAPTION_FAST_PATH_ENABLED:
+        return []
+    return [
+        (index, prediction)
+        for index, prediction in enumerate(classify_captions([post.get("caption") for post in posts], use_clip_text=use_clip_text))
+        if prediction is not None and prediction.score >= settings.CAPTION_CONFIDENCE_THRESHOLD
+    ]
+
+def media_to_fetch(posts: Sequence[dict]) -> Tuple[List[str], List[str]]:
+    """
+    The image and video URLs `categorize_posts` will download for `posts`,
+    leaving out posts settled by the caption lexicon. Captions are only
+    checked against the lexicon here, so no model is needed.
+    """
+    settled = {index for index, _ in _confident_captions(posts, use_clip_text=False)}
+    images, videos = [], []
+    for index, post in enumerate(posts):
+        if index in settled:
+            continue
+        if is_video_post(post):
+            videos.append(video_url(post))
+        elif post.get("display_url"):
+            images.append(post["display_url"])
+    return images, videos
+
+def categorize_posts(posts: Sequence[dict], stats: Optional[PipelineStats] = None) -> Tuple[List[CategoryPrediction], List[str]]:
+    """
+    Categorizes posts, captions first: posts whose caption is confident enough
+    never download their media. Video posts are categorized from a few
+    keyframes, falling back to their thumbnail when the video cannot be
+    decoded. Returns one prediction per post and the source (`caption`,
+    `video` or `image`) of each.
+    """
+    predictions: List[Optional[CategoryPrediction]] = [None] * len(posts)
+    sources = ["image"] * len(posts)
+    for index, prediction in _confident_captions(posts):
+        predictions[index] = prediction
+        sources[index] = "caption"
+
+    videos = [index for index, prediction in enumerate(predictions) if prediction is None and is_video_post(posts[index])]
+    if videos:
+        for index, prediction in zip(videos, categorize_videos([video_url(posts[index]) for index in videos], stats=stats)):
+            if prediction.embedding is not None:
+                predictions[index] = prediction
+                sources[index] = "video"
+
+    pending = [
+        index for index, prediction in enumerate(predictions)
+        if prediction is None and posts[index].get("display_url")
+    ]
+    if pending:
+        image_predictions = categorize_images([posts[index]["display_url"] for index in pending], stats=stats)
+        for index, prediction in zip(pending, image_predictions):
+            predictions[index] = prediction
+    for index, prediction in enumerate(predictions):
+        if prediction is None:
+            predictions[index] = CategoryPrediction(category=InfluencerCategory.OTHER, score=0.0)
+    return predictions, sources
+
+def save_analyses(
+    session: Session,
+    influencer_id: int,
+    posts: Sequence[dict],
+    predictions: Sequence[CategoryPrediction],
+    sources: Sequence[str],
+    existing: Dict[str, PostAnalysis],
+) -> None:
+    """
+    Writes the analysis of each post, replacing any stored one.
+    """
+    now = datetime.now(timezone.utc)
+    model_key, prompt_version = clip_model.model_key, clip_model.prompt_version
+    for post, prediction, source in zip(posts, predictions, sources):
+        analysis = existing.get(post["id"]) or PostAnalysis(external_id=post["id"], influencer_id=influencer_id)
+        analysis.influencer_id = influencer_id
+        analysis.input_hash = post_input_hash(post)
+        analysis.source = source
+        analysis.model_key = prediction.model_key or model_key
+        analysis.prompt_version = prediction.prompt_version or prompt_version
+        analysis.category = prediction.category
+        analysis.label = prediction.label
+        analysis.score = prediction.score
+        analysis.attributes = prediction.attributes
+        analysis.embedding = vector_to_bytes(prediction.embedding) if prediction.embedding is not None else None
+        analysis.analyzed_at = now
+        session.add(analysis)
+
+def prediction_to_dict(prediction: CategoryPrediction) -> dict:
+    """
+    JSON-friendly form of a prediction, to hand it from one task to another.
+    """
+    return {
+        "category": prediction.category.value,
+        "score": prediction.score,
+        "attributes": prediction.attributes,
+        "label": prediction.label,
+        "model_key": prediction.model_key,
+        "prompt_version": prediction.prompt_version,
+        "embedding": (
+            base64.b64encode(vector_to_bytes(prediction.embedding)).decode()
+            if prediction.embedding is not None else None
+        ),
+    }
+
+def prediction_from_dict(data: dict) -> CategoryPrediction:
+    """
+    Inverse of `prediction_to_dict`.
+    """
+    return CategoryPrediction(
+        category=InfluencerCategory(data["category"]),
+        score=data["score"],
+        attributes=data.get("attributes") or {},
+        label=data.get("label"),
+        model_key=data.get("model_key"),
+        prompt_version=data.get("prompt_version"),
+        embedding=vector_from_bytes(base64.b64decode(data["embedding"])) if data.get("embedding") else None,
+    )
+
+def aggregate_influencer(session: Session, influencer: Influencer, model_key: Optional[str] = None) -> None:
+    """
+    Recomputes the influencer's AI fields from all of its stored post analyses.
+    The embedding is averaged over the analyses of `model_key`, by default the
+    model loaded in this process. The influencer's cached read models are
+    invalidated when the session commits.
+    """
+    model_key = model_key or clip_model.model_key
+    invalidate_on_commit(session, [influencer.id])
+    analyses = session.exec(select(PostAnalysis).where(PostAnalysis.influencer_id == influencer.id)).all()
+    if not analyses:
+        return
+
+    influencer.main_category = Counter(analysis.category for analysis in analyses).most_common(1)[0][0]
+
+    image_analyses = [
+        analysis for analysis in analyses
+        if analysis.source in MEDIA_SOURCES and analysis.model_key == model_key
+    ]
+    embeddings = [vector_from_bytes(analysis.embedding) for analysis in image_analyses if analysis.embedding is not None]
+    if embeddings:
+        influencer.embedding = vector_to_bytes(normalized_mean(embeddings))
+        influencer.embedding_model = model_key
+        influencer.embedding_updated_at = datetime.now(timezone.utc)
+
+    # Attribute labels differ between prompt versions: aggregate the prevailing one
+    scored = [analysis for analysis in image_analyses if analysis.attributes]
+    if scored:
+        prompt_version = Counter(analysis.prompt_version for analysis in scored).most_common(1)[0][0]
+        attribute_scores = [analysis.attributes for analysis in scored if analysis.prompt_version == prompt_version]
+        influencer.predominant_style, influencer.strengths, influencer.weaknesses = aggregate_attributes(attribute_scores)
+        influencer.prompt_version = prompt_version
+    session.add(influencer)
+
+
+def rescore_stale_analyses(session: Session, limit: int = 1000) -> Tuple[int, Set[int]]:
+    """
+    Re-scores up to `limit` image and video analyses whose prompt version is
+    stale but whose model is current, from their stored embeddings: no media
+    is downloaded and no image encoder runs.
+
+    Returns the number of analyses re-scored and the ids of the influencers
+    with stale analyses that cannot be re-scored this way (the model or the
+    caption lexicon changed, or there is no stored embedding). Those have to
+    go through a regular, incremental re-analysis.
+    """
+    model_key, prompt_version = current_versions()
+
+    analyses = session.exec(
+        select(PostAnalysis)
+        .where(
+            PostAnalysis.source.in_(MEDIA_SOURCES),
+            PostAnalysis.model_key == model_key,
+            PostAnalysis.prompt_version != prompt_version,
+            PostAnalysis.embedding.is_not(None),
+        )
+        .limit(limit)
+    ).all()
+    if analyses:
+        embeddings = np.stack([vector_from_bytes(analysis.embedding) for analysis in analyses])
+        now = datetime.now(timezone.utc)
+        for analysis, prediction in zip(analyses, categorize_embeddings(embeddings)):
+            analysis.prompt_version = prediction.prompt_version
+            analysis.category = prediction.category
+            analysis.label = prediction.label
+            analysis.score = prediction.score
+            analysis.attributes = prediction.attributes
+            analysis.analyzed_at = now
+            session.add(analysis)
+
+        for influencer_id in {analysis.influencer_id for analysis in analyses}:
+            influencer = session.get(Influencer, influencer_id)
+            if influencer:
+                aggregate_influencer(session, influencer)
+        session.commit()
+
+    needs_reanalysis = set(session.exec(
+        select(PostAnalysis.influencer_id)
+        .where(or_(
+            and_(PostAnalysis.model_key != model_key, PostAnalysis.model_key != LEXICON_MODEL_KEY),
+            and_(PostAnalysis.model_key == LEXICON_MODEL_KEY, PostAnalysis.prompt_version != LEXICON_VERSION),
+            and_(
+                PostAnalysis.model_key == model_key,
+                PostAnalysis.prompt_version != prompt_version,
+                PostAnalysis.embedding.is_(None),
+            ),
+        ))
+        .distinct()
+    ).all())
+    return len(analyses), needs_reanalysis
@@ -0,0 +1,79 @@
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Sequence
+
+from app.services.video_frames import is_video_post
+
+# Keys of each typed figure in the fetched post data: the Graph API's first,
+# then the scrapers'
+LIKES_KEYS = ("likes_count", "like_count", "likes")
+COMMENTS_KEYS = ("comments_count", "comment_count", "comments")
+VIEWS_KEYS = ("video_view_count", "view_count", "views")
+POSTED_AT_KEYS = ("taken_at_timestamp", "timestamp", "taken_at", "posted_at")
+# Everything else kept in `Post.metrics`
+_NON_METRIC_KEYS = {"id", "caption", "display_url", "media_url", "video_url", "media_type", "type", "shortcode", "url"}
+
+
+def _first(post: dict, keys: Sequence[str]) -> Any:
+    return next((post[key] for key in keys if post.get(key) is not None), None)
+
+def _count(value: Any) -> Optional[int]:
+    try:
+        return int(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+def _posted_at(value: Any) -> Optional[datetime]:
+    """
+    A post timestamp given as Unix seconds or as an ISO 8601 string, in UTC.
+    """
+    if value is None:
+        return None
+    try:
+        if isinstance(value, (int, float)):
+            return datetime.fromtimestamp(value, tz=timezone.utc)
+        posted_at = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except (TypeError, ValueError, OverflowError, OSError):
+        return None
+    return posted_at if posted_at.tzinfo else posted_at.replace(tzinfo=timezone.utc)
+
+def media_type(post: dict) -> str:
+    declared = str(post.get("media_type") or post.get("type") or "").lower()
+    if declared in ("carousel_album", "carousel", "sidecar", "graphsidecar"):
+        return "carousel"
+    return "video" if is_video_post(post) or declared == "video" else "image"
+
+def post_row(influencer_id: int, post: dict) -> Dict[str, Any]:
+    """
+    Column values of the `Post` row for one fetched post.
+    """
+    typed_keys = {*LIKES_KEYS, *COMMENTS_KEYS, *VIEWS_KEYS, *POSTED_AT_KEYS}
+    return {
+        "external_id": str(post["id"]),
+        "influencer_id": influencer_id,
+        "caption": post.get("caption"),
+        "image_url": post.get("display_url") or post.get("media_url") or "",
+        "likes_count": _count(_first(post, LIKES_KEYS)),
+        "comments_count": _count(_first(post, COMMENTS_KEYS)),
+        "view_count": _count(_first(post, VIEWS_KEYS)),
+        "media_type": media_type(post),
+        "posted_at": _posted_at(_first(post, POSTED_AT_KEYS)),
+        "metrics": {
+            key: value for key, value in post.items()
+            if key not in _NON_METRIC_KEYS and key not in typed_keys and isinstance(value, (int, float, str, bool))
+        },
+    }
+
+def post_rows(influencer_id: int, posts: Sequence[dict]) -> List[Dict[str, Any]]:
+    return [post_row(influencer_id, post) for post in posts if post.get("id") is not None]
+
+def profile_row(username: str, profile: dict) -> Dict[str, Any]:
+    """
+    Column values of the `Influencer` row for a fetched profile.
+    """
+    return {
+        "username": username,
+        "full_name": profile.get("full_name"),
+        "bio": profile.get("biography"),
+        "followers_count": profile.get("followers_count"),
+        "profile_picture_url": profile.get("profile_pic_url"),
+    }
@@ -0,0 +1,223 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.models.influencer import InfluencerCategory
+
+CATEGORY_GROUP = "category"
+STYLE_GROUP = "style"
+
+# Zero-shot prompts, by group. Labels within a group compete with each other
+# (softmax over the group), so every group must list mutually exclusive options.
+DEFAULT_PROMPTS: Dict[str, Dict[str, str]] = {
+    CATEGORY_GROUP: {
+        category.value: f"a photo of a person related to {category.value}" for category in InfluencerCategory
+    },
+    STYLE_GROUP: {
+        "minimalist": "a minimalist photo with a clean, simple composition",
+        "vibrant": "a colorful, vibrant and energetic photo",
+        "luxury": "an elegant photo of a luxurious lifestyle",
+        "casual": "a casual, candid everyday photo",
+        "urban": "an urban street photo in the city",
+        "outdoor": "a photo taken outdoors in nature",
+        "studio": "a professional studio photo",
+        "vintage": "a vintage, retro style photo",
+    },
+    "lighting": {
+        "positive": "a well lit photo with great lighting",
+        "negative": "a dark, poorly lit photo",
+    },
+    "sharpness": {
+        "positive": "a sharp, high resolution photo",
+        "negative": "a blurry, low quality photo",
+    },
+    "composition": {
+        "positive": "a professionally composed photo",
+        "negative": "an amateur snapshot with a cluttered composition",
+    },
+    "color": {
+        "positive": "a photo with rich, harmonious colors",
+        "negative": "a photo with dull, washed out colors",
+    },
+    "face_presence": {
+        "positive": "a photo of a smiling person looking at the camera",
+        "negative": "a photo where no face is visible",
+    },
+}
+
+# Binary groups that feed the influencer's strengths and weaknesses
+QUALITY_ATTRIBUTES: Dict[str, Tuple[str, str]] = {
+    "lighting": ("good lighting", "poor lighting"),
+    "sharpness": ("sharp, high quality images", "blurry or low quality images"),
+    "composition": ("professional composition", "amateur composition"),
+    "color": ("rich color palette", "dull colors"),
+    "face_presence": ("strong personal presence", "little personal presence"),
+}
+
+
+@dataclass
+class PromptBank:
+    """
+    Every zero-shot prompt, flattened in one list so a single matrix multiply
+    scores an image embedding against all of them. `slices` maps each group to
+    its rows in that list.
+
+    `version` identifies the prompts; when not given it is derived from their
+    content, so any edit yields a new version. `digest` always is derived
+    from the content, in row order: it tells apart banks whose declared
+    version stayed the same while their prompts changed.
+    """
+    groups: Dict[str, Dict[str, str]]
+    version: str = ""
+    digest: str = field(init=False)
+    labels: Dict[str, List[str]] = field(init=False)
+    prompts: List[str] = field(init=False)
+    slices: Dict[str, slice] = field(init=False)
+
+    def __post_init__(self):
+        if not self.groups.get(CATEGORY_GROUP):
+            raise ValueError(f"Prompt bank needs a non-empty '{CATEGORY_GROUP}' group")
+        if not self.version:
+            digest = hashlib.sha256(json.dumps(self.groups, sort_keys=True).encode()).hexdigest()
+            self.version = f"sha-{digest[:12]}"
+
+        self.labels, self.prompts, self.slices = {}, [], {}
+        for name, options in self.groups.items():
+            start = len(self.prompts)
+            self.labels[name] = list(options)
+            self.prompts.extend(options.values())
+            self.slices[name] = slice(start, len(self.prompts))
+        rows = [[name, label, prompt] for name, options in self.groups.items() for label, prompt in options.items()]
+        self.digest = hashlib.sha256(json.dumps(rows).encode()).hexdigest()[:16]
+
+    def score(self, embeddings: np.ndarray, text_embeddings: np.ndarray, logit_scale: float = 100.0) -> Dict[str, np.ndarray]:
+        """
+        Per-group probabilities for normalized embeddings, as `(n, options)`
+        arrays, from one `embeddings @ text_embeddings.T`.
+        """
+        logits = logit_scale * embeddings @ text_embeddings.T
+        probabilities = {}
+        for name, rows in self.slices.items():
+            group = logits[:, rows]
+            group = np.exp(group - group.max(axis=-1, keepdims=True))
+            probabilities[name] = group / group.sum(axis=-1, keepdims=True)
+        return probabilities
+
+
+def category_for(label: str) -> InfluencerCategory:
+    """
+    Maps a category label of the prompt bank onto the stored enum. Labels the
+    enum does not know yet are stored as OTHER.
+    """
+    try:
+        return InfluencerCategory(label)
+    except ValueError:
+        return InfluencerCategory.OTHER
+
+def load_prompt_bank(path: Optional[str]) -> PromptBank:
+    """
+    Reads a prompt bank from a JSON file shaped like
+    `{"version": "...", "groups": {"category": {"fashion": "a photo of ..."}, ...}}`.
+    Without a path, returns the built-in prompts.
+    """
+    if not path:
+        return PromptBank(DEFAULT_PROMPTS)
+    with open(path) as registry_file:
+        data = json.load(registry_file)
+    return PromptBank(data["groups"], version=str(data.get("version") or ""))
+
+
+class PromptRegistry:
+    """
+    Serves the current prompt bank, re-reading the registry file when its
+    modification time changes. The file is checked at most once every
+    `check_interval` seconds, so workers pick up a new version without a
+    restart and without a stat per image.
+
+    A registry file that fails to parse keeps the previous version in service.
+    """
+
+    def __init__(self, path: Optional[str], check_interval: float = 30.0):
+        self.path = path
+        self.check_interval = check_interval
+        self._bank: Optional[PromptBank] = None
+        self._mtime: Optional[float] = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def _registry_mtime(self) -> Optional[float]:
+        try:
+            return os.path.getmtime(self.path) if self.path else None
+        except OSError:
+            return None
+
+    def current(self) -> PromptBank:
+        if self._bank is not None and time.monotonic() - self._checked_at < self.check_interval:
+            return self._bank
+
+        with self._lock:
+            if self._bank is not None and time.monotonic() - self._checked_at < self.check_interval:
+                return self._bank
+            self._checked_at = time.monotonic()
+
+            mtime = self._registry_mtime()
+            if self._bank is not None and mtime == self._mtime:
+                return self._bank
+
+            try:
+                bank = load_prompt_bank(self.path if mtime is not None else None)
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                print(f"Error loading prompt registry {self.path}: {e}")
+                if self._bank is not None:
+                    return self._bank
+                bank = PromptBank(DEFAULT_PROMPTS)
+
+            if self._bank is not None and bank.version == self._bank.version and bank.digest != self._bank.digest:
+                print(
+                    f"Prompt registry {self.path} changed without a new version ({bank.version}): "
+                    f"analyses already scored under it will not be re-scored"
+                )
+            if self._bank is None or bank.digest != self._bank.digest:
+                print(f"Using prompt bank version {bank.version} ({len(bank.prompts)} prompts, digest {bank.digest})")
+            self._bank, self._mtime = bank, mtime
+            return bank
+
+
+def aggregate_attributes(
+    attribute_scores: Sequence[Dict[str, Dict[str, float]]],
+    strength_threshold: float = 0.6,
+    weakness_threshold: float = 0.4,
+) -> Tuple[Optional[str], List[str], List[str]]:
+    """
+    Turns per-post attribute scores into the influencer-level predominant
+    style, strengths and weaknesses.
+
+    The style is the one with the highest mean probability across posts. A
+    quality attribute is a strength when its mean positive probability reaches
+    `strength_threshold`, and a weakness at or below `weakness_threshold`.
+    """
+    if not attribute_scores:
+        return None, [], []
+
+    def mean(group: str, label: str) -> float:
+        return float(np.mean([scores[group][label] for scores in attribute_scores]))
+
+    style_labels = list(attribute_scores[0].get(STYLE_GROUP, {}))
+    predominant_style = max(style_labels, key=lambda label: mean(STYLE_GROUP, label)) if style_labels else None
+
+    strengths, weaknesses = [], []
+    for group, (strength, weakness) in QUALITY_ATTRIBUTES.items():
+        if group not in attribute_scores[0]:
+            continue
+        positive = mean(group, "positive")
+        if positive >= strength_threshold:
+            strengths.append(strength)
+        elif positive <= weakness_threshold:
+            weaknesses.append(weakness)
+    return predominant_style, strengths, weaknesses
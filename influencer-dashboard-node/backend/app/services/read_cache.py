@@ -0,0 +1,189 @@
+import threading
+import time
+from collections import Counter, OrderedDict
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from sqlmodel import SQLModel
+
+from app.core.config import settings
+from app.services.redis_fallback import RedisWithFallback, default_redis_url
+
+# Session.info key of the influencers to invalidate once the session commits
+_PENDING_INVALIDATIONS = "read_cache_invalidations"
+
+
+class MemoryBackend:
+    """
+    In-process store with the same interface as `RedisBackend`: an LRU of
+    `max_entries` keys, each a dict of fields, expiring `ttl` seconds after
+    its last write, or `max_ttl` seconds if shorter. Only serves and
+    invalidates within its own process.
+    """
+
+    def __init__(self, max_entries: int = 10000, max_ttl: Optional[int] = None):
+        self.max_entries = max_entries
+        self.max_ttl = max_ttl
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, bytes]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str, field: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1].get(field)
+
+    def set(self, key: str, field: str, value: bytes, ttl: int):
+        with self._lock:
+            _, fields = self._entries.pop(key, (0.0, {}))
+            fields[field] = value
+            if self.max_ttl is not None:
+                ttl = min(ttl, self.max_ttl)
+            self._entries[key] = (time.monotonic() + ttl, fields)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, *keys: str):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+
+class RedisBackend:
+    """
+    Stores each key as a Redis hash of fields, so all the cached read models
+    of an influencer go away with one DEL.
+    """
+
+    def __init__(self, url: str):
+        import redis
+
+        self.client = redis.Redis.from_url(url, socket_timeout=2, socket_connect_timeout=2)
+
+    def get(self, key: str, field: str) -> Optional[bytes]:
+        return self.client.hget(key, field)
+
+    def set(self, key: str, field: str, value: bytes, ttl: int):
+        pipeline = self.client.pipeline()
+        pipeline.hset(key, field, value)
+        pipeline.expire(key, ttl)
+        pipeline.execute()
+
+    def delete(self, *keys: str):
+        if keys:
+            self.client.delete(*keys)
+
+
+class ReadCache:
+    """
+    Read-through cache of serialized read models, grouped by influencer.
+
+    Entries live in Redis when `redis_url` is set and reachable, and in the
+    `fallback` backend (in-process by default) otherwise. They are dropped
+    explicitly with `invalidate` when an influencer's data changes, see
+    `invalidate_on_commit`; with Redis, the TTL only bounds how long a read
+    that raced with a write can serve stale data.
+
+    The fallback only sees invalidations made by its own process: writes
+    committed by the Celery workers do not reach the API's entries. Without
+    Redis, a read can therefore be stale for as long as the fallback keeps
+    entries, which is why it should be given a short `max_ttl`. Likewise,
+    invalidations made while Redis is unreachable never reach it: the
+    entries it already holds can be stale for up to `ttl`.
+    """
+
+    def __init__(
+        self,
+        redis_url: Optional[str] = None,
+        ttl: int = 300,
+        fallback=None,
+        enabled: bool = True,
+    ):
+        self.redis_url = redis_url
+        self.ttl = ttl
+        self.enabled = enabled
+        self.fallback = fallback if fallback is not None else MemoryBackend()
+        self._store = RedisWithFallback(redis_url, RedisBackend, self.fallback, "Read cache store")
+        self._counters: Counter = Counter()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def influencer_key(influencer_id: int) -> str:
+        return f"read-cache:influencer:{influencer_id}"
+
+    def _count(self, counter: str):
+        with self._lock:
+            self._counters[counter] += 1
+
+    def read_through(self, influencer_id: int, field: str, load: Callable[[], SQLModel]) -> bytes:
+        """
+        The JSON of the read model cached for `influencer_id` under `field`,
+        or of `load()` on a miss, which is then cached. Exceptions raised by
+        `load` (a 404 for instance) are not cached.
+        """
+        key = self.influencer_key(influencer_id)
+        if self.enabled:
+            cached = self._store.call("get", key, field)
+            if cached is not None:
+                self._count("hits")
+                return cached
+            self._count("misses")
+
+        value = load().model_dump_json().encode()
+        if self.enabled:
+            self._store.call("set", key, field, value, self.ttl)
+        return value
+
+    def invalidate(self, influencer_ids: Iterable[int]):
+        """
+        Drops every cached read model of `influencer_ids`, in Redis and in the
+        fallback, which may hold entries written while Redis was down.
+        """
+        keys = [self.influencer_key(influencer_id) for influencer_id in set(influencer_ids)]
+        if not keys or not self.enabled:
+            return
+        self._store.call("delete", *keys)
+        if self._store.connected:
+            self.fallback.delete(*keys)
+        with self._lock:
+            self._counters["invalidations"] += len(keys)
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Hit, miss and invalidation counts of this process.
+        """
+        with self._lock:
+            return {name: self._counters[name] for name in ("hits", "misses", "invalidations")}
+
+
+def invalidate_on_commit(session: Session, influencer_ids: Iterable[int]):
+    """
+    Invalidates the cached read models of `influencer_ids` once `session`
+    commits, so a read can never re-cache data from before the commit. A
+    rollback discards the invalidation.
+    """
+    session.info.setdefault(_PENDING_INVALIDATIONS, set()).update(influencer_ids)
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed(session: Session):
+    influencer_ids = session.info.pop(_PENDING_INVALIDATIONS, None)
+    if influencer_ids:
+        read_cache.invalidate(influencer_ids)
+
+@event.listens_for(Session, "after_rollback")
+def _discard_invalidations(session: Session):
+    session.info.pop(_PENDING_INVALIDATIONS, None)
+
+
+read_cache = ReadCache(
+    redis_url=default_redis_url(settings.READ_CACHE_REDIS_URL),
+    ttl=settings.READ_CACHE_TTL_SECONDS,
+    fallback=MemoryBackend(settings.READ_CACHE_MEMORY_ENTRIES, max_ttl=settings.READ_CACHE_MEMORY_TTL_SECONDS),
+    enabled=settings.READ_CACHE_ENABLED,
+)
@@ -0,0 +1,56 @@
+import threading
+import time
+from typing import Any, Callable, Optional
+
+from app.core.config import settings
+
+REDIS_RETRY_SECONDS = 30
+
+
+def default_redis_url(url: Optional[str] = None) -> Optional[str]:
+    """
+    `url` when set, else the Celery broker when it is Redis.
+    """
+    if url:
+        return url
+    broker = settings.CELERY_BROKER_URL
+    return broker if broker.startswith(("redis://", "rediss://")) else None
+
+
+class RedisWithFallback:
+    """
+    Runs store operations on a Redis-backed store, or on an in-process store
+    with the same interface when Redis is not configured or fails.
+
+    `connect(url)` builds the Redis-backed store, on first use. After a
+    failure, Redis is left alone for REDIS_RETRY_SECONDS instead of timing
+    out on every call. The in-process store is only seen by this process.
+    """
+
+    def __init__(self, redis_url: Optional[str], connect: Callable[[str], Any], fallback: Any, description: str):
+        self.redis_url = redis_url
+        self.fallback = fallback
+        self.description = description
+        self._connect = connect
+        self._redis = None
+        self._retry_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def connected(self) -> bool:
+        """
+        Whether Redis has been reached at least once.
+        """
+        return self._redis is not None
+
+    def call(self, operation: str, *args):
+        if self.redis_url and time.monotonic() >= self._retry_at:
+            try:
+                with self._lock:
+                    if self._redis is None:
+                        self._redis = self._connect(self.redis_url)
+                return getattr(self._redis, operation)(*args)
+            except Exception as e:
+                print(f"{self.description} unavailable ({e}), using the in-process store")
+                self._retry_at = time.monotonic() + REDIS_RETRY_SECONDS
+        return getattr(self.fallback, operation)(*args)
@@ -0,0 +1,154 @@
+import threading
+import time
+from collections import Counter
+from typing import Dict, Optional, Tuple
+
+from app.core.config import settings
+from app.services.redis_fallback import RedisWithFallback, default_redis_url
+
+# Deletes a key only while it still holds the caller's value
+_RELEASE_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+# Resets the TTL of a key only while it still holds the caller's value
+_EXTEND_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("expire", KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+
+class _LocalStore:
+    """
+    In-process stand-in for Redis: only coalesces work within one process.
+    """
+
+    def __init__(self):
+        self._values: Dict[str, Tuple[str, float]] = {}
+        self._counters: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def _live(self, key: str) -> Optional[str]:
+        value = self._values.get(key)
+        if value is None or value[1] <= time.monotonic():
+            self._values.pop(key, None)
+            return None
+        return value[0]
+
+    def set_if_absent(self, key: str, value: str, ttl: int) -> bool:
+        with self._lock:
+            if self._live(key) is not None:
+                return False
+            self._values[key] = (value, time.monotonic() + ttl)
+            return True
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            return self._live(key)
+
+    def extend_if_equals(self, key: str, value: str, ttl: int) -> bool:
+        with self._lock:
+            if self._live(key) != value:
+                return False
+            self._values[key] = (value, time.monotonic() + ttl)
+            return True
+
+    def delete_if_equals(self, key: str, value: str):
+        with self._lock:
+            if self._live(key) == value:
+                del self._values[key]
+
+    def incr(self, key: str):
+        with self._lock:
+            self._counters[key] += 1
+
+    def counter(self, key: str) -> int:
+        with self._lock:
+            return self._counters[key]
+
+
+class _RedisStore:
+    def __init__(self, url: str):
+        import redis
+
+        self.client = redis.Redis.from_url(url, socket_timeout=2, socket_connect_timeout=2, decode_responses=True)
+        self._release = self.client.register_script(_RELEASE_SCRIPT)
+        self._extend = self.client.register_script(_EXTEND_SCRIPT)
+
+    def set_if_absent(self, key: str, value: str, ttl: int) -> bool:
+        return bool(self.client.set(key, value, nx=True, ex=ttl))
+
+    def get(self, key: str) -> Optional[str]:
+        return self.client.get(key)
+
+    def extend_if_equals(self, key: str, value: str, ttl: int) -> bool:
+        return bool(self._extend(keys=[key], args=[value, ttl]))
+
+    def delete_if_equals(self, key: str, value: str):
+        self._release(keys=[key], args=[value])
+
+    def incr(self, key: str):
+        self.client.incr(key)
+
+    def counter(self, key: str) -> int:
+        return int(self.client.get(key) or 0)
+
+
+class SingleFlight:
+    """
+    Makes sure only one unit of work runs per key at a time, across every
+    worker sharing the Redis instance.
+
+    A key is claimed with `SET NX EX` by an owner id (a Celery task id) and
+    released only by that owner; the TTL frees it if the owner dies, and
+    claiming it again as its owner starts the TTL over. When
+    Redis cannot be reached, an in-process store takes over, which still
+    coalesces work within the process.
+    """
+
+    def __init__(self, namespace: str, ttl: int, redis_url: Optional[str] = None):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.redis_url = redis_url
+        self._store = RedisWithFallback(redis_url, _RedisStore, _LocalStore(), "Single-flight store")
+
+    def _key(self, name: str) -> str:
+        return f"single-flight:{self.namespace}:{name}"
+
+    def claim(self, name: str, owner: str) -> Optional[str]:
+        """
+        Claims `name` for `owner`. Returns None when the caller holds it (it
+        was free, or already theirs: then its TTL starts over), or the id of
+        the owner holding it.
+        """
+        key = self._key(name)
+        if self._store.call("set_if_absent", key, owner, self.ttl):
+            return None
+        if self._store.call("extend_if_equals", key, owner, self.ttl):
+            return None
+        holder = self._store.call("get", key)
+        if holder is None:
+            # Released in between: try once more
+            return None if self._store.call("set_if_absent", key, owner, self.ttl) else self._store.call("get", key)
+        return None if holder == owner else holder
+
+    def release(self, name: str, owner: str):
+        self._store.call("delete_if_equals", self._key(name), owner)
+
+    def holder(self, name: str) -> Optional[str]:
+        return self._store.call("get", self._key(name))
+
+    def incr(self, counter: str):
+        self._store.call("incr", self._key(f"counter:{counter}"))
+
+    def counters(self, *names: str) -> Dict[str, int]:
+        return {name: self._store.call("counter", self._key(f"counter:{name}")) for name in names}
+
+
+# One in-flight analysis per influencer
+analysis_flight = SingleFlight("analysis", ttl=settings.SINGLE_FLIGHT_TTL_SECONDS, redis_url=default_redis_url(settings.SINGLE_FLIGHT_REDIS_URL))
@@ -0,0 +1,122 @@
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+VECTOR_DTYPE = np.float32
+
+
+def normalized_mean(vectors: Sequence[np.ndarray]) -> np.ndarray:
+    """
+    L2-normalized mean of a set of vectors (e.g. an influencer's post embeddings).
+    """
+    mean = np.mean(np.stack(vectors).astype(VECTOR_DTYPE), axis=0)
+    norm = np.linalg.norm(mean)
+    return mean / norm if norm > 0 else mean
+
+def vector_to_bytes(vector: np.ndarray) -> bytes:
+    """
+    Serializes a vector for a binary database column.
+    """
+    return np.asarray(vector, dtype=VECTOR_DTYPE).tobytes()
+
+def vector_from_bytes(data: bytes) -> np.ndarray:
+    """
+    Inverse of `vector_to_bytes`.
+    """
+    return np.frombuffer(data, dtype=VECTOR_DTYPE)
+
+
+class VectorIndex:
+    """
+    Nearest-neighbour index over L2-normalized vectors, ranked by cosine
+    similarity.
+
+    Two modes are available:
+
+    - "exact": brute force, one matrix-vector product over every vector.
+    - "ivf": an inverted file. Vectors are clustered with k-means into
+      `n_lists` lists, and a query only scores the vectors of the `n_probe`
+      lists whose centroids are closest to it. Approximate, but the cost per
+      query is roughly `n_probe / n_lists` of the exact search.
+    """
+
+    def __init__(
+        self,
+        ids: Sequence[int],
+        vectors: np.ndarray,
+        mode: str = "exact",
+        n_lists: Optional[int] = None,
+        n_probe: int = 8,
+        train_iterations: int = 10,
+        seed: int = 0,
+    ):
+        if mode not in ("exact", "ivf"):
+            raise ValueError(f"Unknown index mode '{mode}', expected 'exact' or 'ivf'")
+
+        self.mode = mode
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.vectors = np.ascontiguousarray(vectors, dtype=VECTOR_DTYPE)
+        self.n_probe = n_probe
+        self.centroids: Optional[np.ndarray] = None
+        self.list_offsets: Optional[np.ndarray] = None
+
+        if mode == "ivf" and len(self.ids):
+            n_lists = n_lists or max(1, int(np.sqrt(len(self.ids))))
+            self._train(min(n_lists, len(self.ids)), train_iterations, seed)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def _train(self, n_lists: int, iterations: int, seed: int):
+        """
+        Spherical k-means on (a sample of) the vectors, then groups the
+        vectors by list so each list is a contiguous slice.
+        """
+        rng = np.random.default_rng(seed)
+        sample_size = min(len(self.vectors), n_lists * 256)
+        sample = self.vectors[rng.choice(len(self.vectors), sample_size, replace=False)]
+        centroids = sample[rng.choice(sample_size, n_lists, replace=False)].copy()
+
+        for _ in range(iterations):
+            assignment = np.argmax(sample @ centroids.T, axis=1)
+            for list_id in range(n_lists):
+                members = sample[assignment == list_id]
+                if len(members):
+                    centroids[list_id] = members.sum(axis=0)
+            centroids /= np.maximum(np.linalg.norm(centroids, axis=1, keepdims=True), 1e-12)
+
+        assignment = np.argmax(self.vectors @ centroids.T, axis=1)
+        order = np.argsort(assignment, kind="stable")
+        self.ids = self.ids[order]
+        self.vectors = np.ascontiguousarray(self.vectors[order])
+        self.centroids = centroids
+        self.list_offsets = np.searchsorted(assignment[order], np.arange(n_lists + 1))
+
+    def _candidates(self, query: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        if self.mode == "exact":
+            return self.ids, self.vectors
+
+        probe = min(self.n_probe, len(self.centroids))
+        lists = np.argpartition(-(self.centroids @ query), probe - 1)[:probe]
+        rows = np.concatenate([np.arange(self.list_offsets[i], self.list_offsets[i + 1]) for i in lists])
+        return self.ids[rows], self.vectors[rows]
+
+    def search(self, query: np.ndarray, k: int = 10, exclude: Iterable[int] = ()) -> List[Tuple[int, float]]:
+        """
+        Returns up to `k` `(id, similarity)` pairs, most similar first.
+        """
+        if not len(self.ids) or k <= 0:
+            return []
+
+        query = np.asarray(query, dtype=VECTOR_DTYPE)
+        ids, vectors = self._candidates(query)
+        scores = vectors @ query
+
+        excluded = np.isin(ids, list(exclude))
+        if excluded.any():
+            scores = np.where(excluded, -np.inf, scores)
+
+        top = min(k, len(scores))
+        best = np.argpartition(-scores, top - 1)[:top]
+        best = best[np.argsort(-scores[best])]
+        return [(int(ids[i]), float(scores[i])) for i in best if np.isfinite(scores[i])]
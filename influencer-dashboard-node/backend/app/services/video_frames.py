@@ -0,0 +1,71 @@
+from io import BytesIO
+from typing import BinaryIO, List, Optional, Union
+
+from PIL import Image
+
+
+def is_video_post(post: dict) -> bool:
+    """
+    Whether a post is a video, for both the Graph API (`media_type`) and the
+    scrapers (`type`) shapes of post data.
+    """
+    media_type = str(post.get("media_type") or post.get("type") or "").lower()
+    return media_type == "video" and bool(video_url(post))
+
+def video_url(post: dict) -> Optional[str]:
+    return post.get("video_url") or (post.get("media_url") if str(post.get("type", "")).lower() == "video" else None)
+
+
+def sample_keyframes(
+    source: Union[bytes, BinaryIO],
+    count: int = 4,
+    target_size: Optional[int] = None,
+    reducing_gap: float = 2.0,
+) -> List[Image.Image]:
+    """
+    Decodes `count` evenly spaced keyframes of an encoded video, given as
+    bytes or as a seekable binary file (read in place, not loaded whole).
+
+    Rather than decoding the whole stream, it seeks to each sample point and
+    decodes only the keyframe found there (non-key frames are skipped by the
+    decoder), so the work depends on `count`, not on the clip length. With a
+    `target_size`, frames are scaled in the decoder's pixel format conversion
+    so their shorter side is `reducing_gap` times that size.
+
+    Needs PyAV (`av`), imported on first use. Returns an empty list when the
+    video cannot be decoded.
+    """
+    import av
+
+    frames: List[Image.Image] = []
+    try:
+        with av.open(BytesIO(source) if isinstance(source, bytes) else source) as container:
+            if not container.streams.video:
+                return frames
+            stream = container.streams.video[0]
+            stream.codec_context.skip_frame = "NONKEY"
+
+            if stream.duration is not None and stream.time_base is not None:
+                duration = float(stream.duration * stream.time_base)
+            else:
+                duration = (container.duration or 0) / av.time_base
+
+            width, height = stream.codec_context.width, stream.codec_context.height
+            if target_size and width and height:
+                scale = min(1.0, target_size * reducing_gap / min(width, height))
+                width, height = max(1, int(width * scale)), max(1, int(height * scale))
+
+            last_pts = None
+            # Midpoints of `count` equal segments: avoids black first/last frames
+            for position in ((i + 0.5) * duration / count for i in range(count)):
+                if stream.time_base is not None and duration > 0:
+                    container.seek(int(position / stream.time_base), stream=stream, backward=True, any_frame=False)
+                frame = next(container.decode(stream), None)
+                if frame is None or frame.pts == last_pts:
+                    # Short clips can have fewer keyframes than samples
+                    continue
+                last_pts = frame.pts
+                frames.append(frame.to_image(width=width, height=height))
+    except (av.FFmpegError, OSError, ValueError) as e:
+        print(f"Error decoding video: {e}")
+    return frames
@@ -1,62 +1,433 @@
-import time
 from collections import Counter
+from typing import Dict, List, Optional
+from uuid import uuid4
 
+from celery import chain, chord
 from sqlmodel import Session, select
 from app.core.celery_app import celery_app
+from app.core.config import settings
 from app.db.session import engine
-from app.models.influencer import Influencer
-from app.services.ai_service import categorize_image
+from app.db.upsert import upsert_influencers, upsert_posts
+from app.models.influencer import Influencer, PostAnalysis
+from app.services.image_pipeline import PipelineStats, prefetch_media
+from app.services.post_analysis_service import (
+    aggregate_influencer,
+    categorize_posts,
+    current_versions,
+    expected_versions,
+    is_stale,
+    media_to_fetch,
+    post_input_hash,
+    prediction_from_dict,
+    prediction_to_dict,
+    rescore_stale_analyses,
+    save_analyses,
+)
 from app.services.instagram_service import get_mock_instagram_data
+from app.services.metrics_history import record_post_snapshots, record_snapshots
+from app.services.post_service import post_rows, profile_row
+from app.services.single_flight import analysis_flight
 
-@celery_app.task
-def analyze_influencer_profile(influencer_id: int):
+@celery_app.task(bind=True)
+def analyze_influencer_profile(self, influencer_id: int):
     """
     Celery task to analyze an influencer's profile.
     This simulates fetching data from Instagram and running AI analysis.
+
+    The work runs as the chain of stage tasks built by `analysis_pipeline`,
+    each stage on its own queue; this task is replaced by the chain, so its
+    result is the chain's. Called directly, the stages run inline.
+
+    Only one analysis per influencer runs at a time: a copy that finds
+    another one in flight returns right away with a `duplicate` status.
+    The claim is released by the persist stage.
+    """
+    owner = self.request.id or str(uuid4())
+    holder = analysis_flight.claim(str(influencer_id), owner)
+    if holder is not None:
+        analysis_flight.incr("duplicates")
+        print(f"Analysis for influencer_id {influencer_id} already in flight as task {holder}, skipping")
+        return {"status": "duplicate", "influencer_id": influencer_id, "in_flight_task_id": holder}
+    if self.request.called_directly:
+        return run_profile_analysis(influencer_id, owner)
+    return self.replace(analysis_pipeline([influencer_id], owner, unwrap=True))
+
+class InfluencerAnalysis:
     """
-    print(f"Starting analysis for influencer_id: {influencer_id}")
+    Result of `submit_influencer_analysis`: the AsyncResult of the task
+    analyzing the influencer, whose `get` returns the influencer's own result
+    even when that task is a bulk analysis chunk, whose result lists every
+    influencer of the chunk. Anything else is the AsyncResult's.
+    """
+
+    def __init__(self, influencer_id: int, result):
+        self.influencer_id = influencer_id
+        self.result = result
+
+    def __getattr__(self, name):
+        return getattr(self.result, name)
+
+    def get(self, *args, **kwargs) -> Optional[dict]:
+        result = self.result.get(*args, **kwargs)
+        if isinstance(result, list):
+            return next((entry for entry in result if entry["influencer_id"] == self.influencer_id), None)
+        return result
+
+def submit_influencer_analysis(influencer_id: int) -> InfluencerAnalysis:
+    """
+    Enqueues an analysis of the influencer, unless one is already queued or
+    running: then the in-flight task's result is returned instead, so callers
+    share it. Either way it resolves to the influencer's result.
+    """
+    task_id = str(uuid4())
+    holder = analysis_flight.claim(str(influencer_id), task_id)
+    if holder is not None:
+        analysis_flight.incr("coalesced")
+        return InfluencerAnalysis(influencer_id, analyze_influencer_profile.AsyncResult(holder))
+    try:
+        return InfluencerAnalysis(influencer_id, analyze_influencer_profile.apply_async((influencer_id,), task_id=task_id))
+    except Exception:
+        analysis_flight.release(str(influencer_id), task_id)
+        raise
+
+def analysis_pipeline(influencer_ids: List[int], owner: str, unwrap: bool = False):
+    """
+    Chain of stage tasks analyzing `influencer_ids`, each routed to its own
+    queue (see `celery_app`):
+
+    1. `fetch_profiles` (fetch): profile and posts from Instagram
+    2. `fetch_post_media` (media): downloads the media of stale posts into
+       the shared media cache
+    3. `categorize_influencer_posts` (inference): runs the model, reading
+       the media from the cache
+    4. `persist_post_analyses` (persist): stores the analyses, aggregates
+       the profiles and releases the single-flight claims of `owner`
+
+    Stages pass a list of per-influencer payloads along; a payload that got a
+    final `status` (not found, no posts, failed...) goes through untouched.
+    Every stage claims its influencers again, which starts their TTL over,
+    so SINGLE_FLIGHT_TTL_SECONDS only has to cover one stage's time in its
+    queue and running, not the whole chain's.
+    The chain returns one result per influencer, or the only one with `unwrap`.
+
+    The last task runs under the id `owner`, so the claims it holds point at
+    a result callers can wait on (`submit_influencer_analysis`).
+    """
+    return chain(
+        fetch_profiles.si(influencer_ids, owner),
+        fetch_post_media.s(),
+        categorize_influencer_posts.s(),
+        persist_post_analyses.s(unwrap=unwrap).set(task_id=owner),
+    ).on_error(release_analysis_claims.si(influencer_ids, owner))
+
+def run_profile_analysis(influencer_id: int, owner: Optional[str] = None):
+    """
+    Runs every stage of the analysis of one influencer in this process.
+    """
+    owner = owner or str(uuid4())
+    try:
+        payloads = fetch_profiles([influencer_id], owner)
+        payloads = categorize_influencer_posts(fetch_post_media(payloads))
+        return persist_post_analyses(payloads, unwrap=True)
+    finally:
+        analysis_flight.release(str(influencer_id), owner)
+
+def _existing_analyses(session: Session, influencer_id: int) -> Dict[str, PostAnalysis]:
+    return {
+        analysis.external_id: analysis
+        for analysis in session.exec(select(PostAnalysis).where(PostAnalysis.influencer_id == influencer_id)).all()
+    }
+
+def _stale_posts(session: Session, payload: dict, model_key: Optional[str], prompt_version: str) -> List[dict]:
+    # Only new posts, changed posts and posts analyzed with an older model
+    # or prompt version are categorized again
+    existing = _existing_analyses(session, payload["influencer_id"])
+    return [
+        post for post in payload["posts"]
+        if is_stale(existing.get(post["id"]), post_input_hash(post), model_key, prompt_version)
+    ]
+
+def _renew_claims(payloads: List[dict]):
+    # A claim that expired while the chunk sat in a queue may have been
+    # taken by another analysis, which then does the rest of the work
+    for payload in payloads:
+        if "status" in payload:
+            continue
+        holder = analysis_flight.claim(str(payload["influencer_id"]), payload["owner"])
+        if holder is not None:
+            analysis_flight.incr("duplicates")
+            print(f"Analysis for influencer_id {payload['influencer_id']} taken over by task {holder}, skipping")
+            payload.update(status="duplicate", in_flight_task_id=holder)
+
+def _fail(payload: dict, stage: str, error: Exception):
+    print(f"Analysis failed at the {stage} stage for influencer_id {payload['influencer_id']}: {error}")
+    payload.update(status="failed", error=str(error))
+
+@celery_app.task
+def fetch_profiles(influencer_ids: List[int], owner: str):
+    """
+    Fetch stage: claims each influencer for `owner`, fetches its profile and
+    posts, upserts both and appends metric snapshots of the profile and of
+    the fetched posts.
+    """
+    payloads = []
+    for influencer_id in influencer_ids:
+        holder = analysis_flight.claim(str(influencer_id), owner)
+        if holder is not None:
+            analysis_flight.incr("duplicates")
+            print(f"Analysis for influencer_id {influencer_id} already in flight as task {holder}, skipping")
+            payloads.append({"status": "duplicate", "influencer_id": influencer_id, "in_flight_task_id": holder})
+            continue
+
+        payload = {"influencer_id": influencer_id, "owner": owner}
+        payloads.append(payload)
+        print(f"Starting analysis for influencer_id: {influencer_id}")
+        try:
+            with Session(engine) as session:
+                # 1. Get influencer from DB
+                influencer = session.get(Influencer, influencer_id)
+                if not influencer:
+                    print(f"Influencer with id {influencer_id} not found.")
+                    payload["status"] = "not_found"
+                    continue
+
+                # 2. Fetch data from Instagram (mocked)
+                # In a real scenario, this would call the Instagram Graph API
+                profile_data, posts_data = get_mock_instagram_data(influencer.username)
+
+                # 3. Update influencer profile with fetched data and store the posts
+                upsert_influencers(session, [profile_row(influencer.username, profile_data)])
+                posts = post_rows(influencer_id, posts_data)
+                stored_posts = upsert_posts(session, posts)
+                record_snapshots(session, [influencer_id])
+                record_post_snapshots(session, [post["external_id"] for post in posts])
+                session.commit()
+
+                print(f"Updated base profile and {stored_posts} posts for {influencer.username}")
+                payload.update(username=influencer.username, posts=posts_data, post_count=len(posts_data))
+                if not posts_data:
+                    print(f"No posts found for {influencer.username} to analyze.")
+                    payload["status"] = "no_posts"
+        except Exception as e:
+            _fail(payload, "fetch", e)
+    return payloads
+
+@celery_app.task
+def fetch_post_media(payloads: List[dict]):
+    """
+    Media stage: downloads the images and videos the inference stage will
+    need into the media cache, for all influencers of the batch at once.
+
+    Posts are picked without the model (see `expected_versions`); a post
+    missed here is downloaded by the inference stage itself. For the same
+    reason, a failure of the stage as a whole is only logged: raising would
+    fail the chunk, and with it a bulk analysis's summary.
+    """
+    _renew_claims(payloads)
+    try:
+        model_key, prompt_version = expected_versions()
+        images, videos = [], []
+        with Session(engine) as session:
+            for payload in payloads:
+                if "status" in payload:
+                    continue
+                try:
+                    post_images, post_videos = media_to_fetch(_stale_posts(session, payload, model_key, prompt_version))
+                except Exception as e:
+                    _fail(payload, "media", e)
+                    continue
+                images.extend(post_images)
+                videos.extend(post_videos)
+
+        counts = Counter(prefetch_media(images))
+        counts.update(prefetch_media(videos, max_bytes=settings.VIDEO_MAX_BYTES))
+        print(
+            f"Prefetched media of {len(payloads)} influencers: {counts['downloaded']} downloaded, "
+            f"{counts['cached']} already cached, {counts['failed']} failed"
+        )
+    except Exception as e:
+        print(f"Prefetching media of {len(payloads)} influencers failed, leaving it to the inference stage: {e}")
+    return payloads
+
+@celery_app.task
+def categorize_influencer_posts(payloads: List[dict]):
+    """
+    Inference stage: categorizes the new and stale posts of each influencer.
+    Only the stale posts and their predictions are passed on.
+    """
+    _renew_claims(payloads)
+    for payload in payloads:
+        if "status" in payload:
+            continue
+        try:
+            model_key, prompt_version = current_versions()
+            with Session(engine) as session:
+                stale_posts = _stale_posts(session, payload, model_key, prompt_version)
+
+            stats = PipelineStats()
+            predictions, sources = categorize_posts(stale_posts, stats=stats)
+            caption_classified = sources.count("caption")
+            print(
+                f"Categorized {len(stale_posts)} of {payload['post_count']} posts for {payload['username']} "
+                f"({payload['post_count'] - len(stale_posts)} up to date): {caption_classified} from captions, "
+                f"{stats.images} images with {stats.inferences} inferences, "
+                f"{stats.skipped_inferences} skipped ({stats.cache_hits} cached, {stats.duplicates} near-duplicates)"
+            )
+        except Exception as e:
+            _fail(payload, "inference", e)
+            continue
+
+        for prediction in predictions:
+            # Fallback predictions carry no versions: the persist stage has no model to ask
+            prediction.model_key = prediction.model_key or model_key
+            prediction.prompt_version = prediction.prompt_version or prompt_version
+        payload.update(
+            posts=stale_posts,
+            predictions=[prediction_to_dict(prediction) for prediction in predictions],
+            sources=sources,
+            model_key=model_key,
+            prompt_version=prompt_version,
+            caption_classified=caption_classified,
+            inference=stats.as_dict(),
+        )
+    return payloads
+
+@celery_app.task
+def persist_post_analyses(payloads: List[dict], unwrap: bool = False):
+    """
+    Persist stage: stores the per-post analyses, aggregates them into each
+    profile and releases the influencers' single-flight claims.
+    """
+    _renew_claims(payloads)
+    results = []
+    for payload in payloads:
+        try:
+            if "status" not in payload:
+                _persist_payload(payload)
+        except Exception as e:
+            _fail(payload, "persist", e)
+        finally:
+            if payload.get("owner"):
+                analysis_flight.release(str(payload["influencer_id"]), payload["owner"])
+        results.append(_result(payload))
+    return results[0] if unwrap else results
+
+def _persist_payload(payload: dict):
+    influencer_id = payload["influencer_id"]
     with Session(engine) as session:
-        # 1. Get influencer from DB
         influencer = session.get(Influencer, influencer_id)
         if not influencer:
-            print(f"Influencer with id {influencer_id} not found.")
+            payload["status"] = "not_found"
             return
 
-        # 2. Fetch data from Instagram (mocked)
-        # In a real scenario, this would call the Instagram Graph API
-        profile_data, posts_data = get_mock_instagram_data(influencer.username)
-
-        # 3. Update influencer profile with fetched data
-        influencer.full_name = profile_data.get("full_name")
-        influencer.bio = profile_data.get("biography")
-        influencer.followers_count = profile_data.get("followers_count")
-        influencer.profile_picture_url = profile_data.get("profile_pic_url")
-        
-        session.add(influencer)
+        # 5. Store the per-post analyses and aggregate them into the profile
+        predictions = [prediction_from_dict(prediction) for prediction in payload["predictions"]]
+        existing = _existing_analyses(session, influencer_id)
+        save_analyses(session, influencer_id, payload["posts"], predictions, payload["sources"], existing)
+        aggregate_influencer(session, influencer, payload["model_key"])
         session.commit()
         session.refresh(influencer)
+        if influencer.main_category:
+            print(f"Main category for {influencer.username}: {influencer.main_category.value}")
+        print(
+            f"Style for {influencer.username}: {influencer.predominant_style} "
+            f"(strengths: {influencer.strengths}, weaknesses: {influencer.weaknesses})"
+        )
 
-        print(f"Updated base profile for {influencer.username}")
+    print(f"Analysis complete for influencer_id: {influencer_id}")
+    payload["status"] = "complete"
 
-        # 4. Analyze images and categorize
-        if not posts_data:
-            print(f"No posts found for {influencer.username} to analyze.")
-            return
+def _result(payload: dict) -> dict:
+    if payload["status"] != "complete":
+        return {key: value for key, value in payload.items() if key in ("status", "influencer_id", "error", "in_flight_task_id")}
+    return {
+        "status": "complete",
+        "influencer_id": payload["influencer_id"],
+        "posts": payload["post_count"],
+        "reanalyzed": len(payload["posts"]),
+        "caption_classified": payload["caption_classified"],
+        "prompt_version": payload["prompt_version"],
+        "inference": payload["inference"],
+    }
+
+@celery_app.task
+def release_analysis_claims(influencer_ids: List[int], owner: str):
+    """
+    Error callback of `analysis_pipeline`: frees the influencers when a stage
+    task fails outright, instead of waiting for the claims' TTL.
+    """
+    for influencer_id in influencer_ids:
+        analysis_flight.release(str(influencer_id), owner)
 
-        categories = []
-        for post in posts_data:
-            category = categorize_image(post["display_url"])
-            categories.append(category)
-            time.sleep(1) # Avoid overwhelming the service
+@celery_app.task
+def rescore_stale_posts(batch_size: int = 1000):
+    """
+    Celery task to bring stored post analyses up to the current prompt version.
 
-        # 5. Determine main category based on most frequent one
-        if categories:
-            most_common_category = Counter(categories).most_common(1)[0][0]
-            influencer.main_category = most_common_category
-            print(f"Main category for {influencer.username}: {most_common_category.value}")
+    Analyses with a stored embedding are re-scored in place without touching
+    any image. Influencers whose analyses need more than that (new model,
+    new caption lexicon) are queued for a regular, incremental re-analysis.
+    """
+    rescored = 0
+    needs_reanalysis = set()
+    with Session(engine) as session:
+        while True:
+            count, influencer_ids = rescore_stale_analyses(session, limit=batch_size)
+            rescored += count
+            needs_reanalysis = influencer_ids
+            if count < batch_size:
+                break
 
-        session.add(influencer)
-        session.commit()
+    for influencer_id in needs_reanalysis:
+        submit_influencer_analysis(influencer_id)
 
-    print(f"Analysis complete for influencer_id: {influencer_id}")
-    return {"status": "complete", "influencer_id": influencer_id} 
\ No newline at end of file
+    print(f"Re-scored {rescored} post analyses, queued {len(needs_reanalysis)} influencers for re-analysis")
+    return {"status": "complete", "rescored": rescored, "reanalysis_queued": sorted(needs_reanalysis)}
+
+@celery_app.task
+def summarize_bulk_analysis(chunk_results: List[List[dict]], cohort_size: int):
+    """
+    Celery task that closes a bulk analysis: totals for the whole cohort and
+    the list of influencers that failed.
+    """
+    results = [result for chunk in chunk_results for result in chunk]
+    inference = Counter()
+    for result in results:
+        inference.update(result.get("inference", {}))
+
+    summary = {
+        "status": "complete",
+        "influencers": cohort_size,
+        "statuses": dict(Counter(result["status"] for result in results)),
+        "reanalyzed_posts": sum(result.get("reanalyzed", 0) for result in results),
+        "caption_classified": sum(result.get("caption_classified", 0) for result in results),
+        "inference": dict(inference),
+        "failures": [
+            {"influencer_id": result["influencer_id"], "error": result["error"]}
+            for result in results if result["status"] == "failed"
+        ],
+    }
+    print(f"Bulk analysis complete for {cohort_size} influencers: {summary['statuses']}")
+    return summary
+
+@celery_app.task
+def analyze_influencers_bulk(influencer_ids: List[int], chunk_size: Optional[int] = None):
+    """
+    Celery task to analyze a cohort of influencers.
+
+    The cohort is split into chunks of BULK_ANALYSIS_CHUNK_SIZE influencers,
+    one `analysis_pipeline` per chunk, so broker traffic grows with the number
+    of chunks rather than influencers. The chunks run in parallel as a chord
+    whose callback, `summarize_bulk_analysis`, returns the cohort stats.
+    """
+    chunk_size = chunk_size or settings.BULK_ANALYSIS_CHUNK_SIZE
+    influencer_ids = list(dict.fromkeys(influencer_ids))
+    chunks = [influencer_ids[start:start + chunk_size] for start in range(0, len(influencer_ids), chunk_size)]
+    if not chunks:
+        return {"status": "complete", "influencers": 0, "chunks": 0}
+
+    summary = chord(analysis_pipeline(chunk, owner=str(uuid4())) for chunk in chunks)(
+        summarize_bulk_analysis.s(cohort_size=len(influencer_ids))
+    )
+    print(f"Queued bulk analysis of {len(influencer_ids)} influencers in {len(chunks)} chunks")
+    return {"status": "queued", "influencers": len(influencer_ids), "chunks": len(chunks), "summary_task_id": summary.id}
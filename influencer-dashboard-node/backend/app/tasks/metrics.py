@@ -0,0 +1,44 @@
+from datetime import datetime, timedelta, timezone
+
+from sqlmodel import Session
+from app.core.celery_app import celery_app
+from app.db.session import engine
+from app.services.metrics_history import prune_metrics, rollup_days, rollup_weeks
+
+
+@celery_app.task
+def rollup_daily_metrics():
+    """
+    Celery beat task: refreshes the daily points of yesterday and today from
+    the raw snapshots.
+    """
+    now = datetime.now(timezone.utc)
+    with Session(engine) as session:
+        rows = rollup_days(session, now - timedelta(days=1), now)
+        session.commit()
+    print(f"Rolled up {rows} daily metric points")
+    return {"status": "complete", "rows": rows}
+
+@celery_app.task
+def rollup_weekly_metrics():
+    """
+    Celery beat task: refreshes the weekly points of last week and this week
+    from the daily points.
+    """
+    now = datetime.now(timezone.utc)
+    with Session(engine) as session:
+        rows = rollup_weeks(session, now - timedelta(weeks=1), now)
+        session.commit()
+    print(f"Rolled up {rows} weekly metric points")
+    return {"status": "complete", "rows": rows}
+
+@celery_app.task
+def prune_metric_history():
+    """
+    Celery beat task: deletes the metric points past their tier's retention.
+    """
+    with Session(engine) as session:
+        deleted = prune_metrics(session)
+        session.commit()
+    print(f"Pruned metric history: {deleted}")
+    return {"status": "complete", "deleted": deleted}
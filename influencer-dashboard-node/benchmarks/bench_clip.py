@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Benchmark de rendimiento de ai_service (CLIP) con imágenes sintéticas.
+
+Mide, para cada combinación de tamaño de batch y número de threads de torch:
+
+- preprocess: transformación PIL -> tensor, por imagen
+- encode_image: forward pass del encoder de imagen, por batch
+- similarity: similitud contra las categorías + argmax, por batch
+- categorize: categorize_images de extremo a extremo (sin caché ni dedup)
+
+y reporta latencias p50/p95 e imágenes por segundo. El resultado se escribe en
+JSON para poder comparar entre commits:
+
+    python benchmarks/bench_clip.py --batch-sizes 1,8,32 --threads 1,4 --output bench.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+# Añadir el directorio backend al path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("CELERY_BROKER_URL", "memory://")
+os.environ.setdefault("CELERY_RESULT_BACKEND", "cache+memory://")
+# Medir siempre el coste real de inferencia
+os.environ["EMBEDDING_CACHE_ENABLED"] = "false"
+os.environ["DEDUP_ENABLED"] = "false"
+
+import torch
+
+from app.services import ai_service
+
+
+def synthetic_images(count: int, size=(640, 640), seed: int = 0):
+    """Genera imágenes de colores, degradados y formas, todas distintas."""
+    rng = np.random.default_rng(seed)
+    images = []
+    for _ in range(count):
+        base = rng.integers(0, 256, (8, 8, 3), dtype=np.uint8)
+        image = Image.fromarray(base).resize(size, Image.BILINEAR)
+        draw = ImageDraw.Draw(image)
+        for _ in range(5):
+            x0, y0 = (int(v) for v in rng.integers(0, size[0] - 100, 2))
+            draw.ellipse([x0, y0, x0 + 100, y0 + 100], fill=tuple(int(c) for c in rng.integers(0, 256, 3)))
+        images.append(image)
+    return images
+
+
+def summarize(latencies, items_per_call: int):
+    """p50/p95 en milisegundos e items por segundo."""
+    latencies = np.asarray(latencies)
+    return {
+        "calls": len(latencies),
+        "p50_ms": float(np.percentile(latencies, 50) * 1000),
+        "p95_ms": float(np.percentile(latencies, 95) * 1000),
+        "mean_ms": float(latencies.mean() * 1000),
+        "images_per_second": float(items_per_call * len(latencies) / latencies.sum()),
+    }
+
+
+def timed(function, repeats: int, warmup: int = 1):
+    for _ in range(warmup):
+        function()
+    latencies = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        function()
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], text=True, stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(batch_sizes, thread_counts, image_count: int, repeats: int):
+    model = ai_service.clip_model.load()
+    images = synthetic_images(image_count)
+    results = []
+
+    for threads in thread_counts:
+        torch.set_num_threads(threads)
+
+        preprocess_latencies = []
+        for image in images:
+            started = time.perf_counter()
+            model.preprocess(image)
+            preprocess_latencies.append(time.perf_counter() - started)
+        results.append({"stage": "preprocess", "threads": threads, "batch_size": 1, **summarize(preprocess_latencies, 1)})
+        print(f"threads={threads} preprocess: {results[-1]['p50_ms']:.2f} ms p50")
+
+        tensors = [model.preprocess(image) for image in images]
+        for batch_size in batch_sizes:
+            batch = (tensors * (batch_size // len(tensors) + 1))[:batch_size]
+            stacked = torch.stack(batch)
+
+            encode = timed(lambda: model.backend.encode_image(stacked), repeats)
+            results.append({"stage": "encode_image", "threads": threads, "batch_size": batch_size, **summarize(encode, batch_size)})
+
+            embeddings = ai_service._encode_batch(batch)
+            similarity = timed(lambda: ai_service._score_embeddings(embeddings), repeats)
+            results.append({"stage": "similarity", "threads": threads, "batch_size": batch_size, **summarize(similarity, batch_size)})
+
+            end_to_end = timed(lambda: ai_service.categorize_images(images, batch_size=batch_size), repeats)
+            results.append({"stage": "categorize", "threads": threads, "batch_size": batch_size, **summarize(end_to_end, len(images))})
+
+            print(
+                f"threads={threads} batch={batch_size}: "
+                f"encode {results[-3]['images_per_second']:.1f} img/s, "
+                f"categorize {results[-1]['images_per_second']:.1f} img/s "
+                f"(p50 {results[-1]['p50_ms']:.1f} ms, p95 {results[-1]['p95_ms']:.1f} ms)"
+            )
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de CLIP en ai_service")
+    parser.add_argument("--batch-sizes", default="1,8,32", help="Tamaños de batch separados por comas")
+    parser.add_argument("--threads", default=str(torch.get_num_threads()), help="Threads de torch separados por comas")
+    parser.add_argument("--images", type=int, default=64, help="Imágenes sintéticas por corrida de categorize")
+    parser.add_argument("--repeats", type=int, default=5, help="Repeticiones por medición")
+    parser.add_argument("--output", default="bench_clip.json", help="Fichero JSON de salida")
+    args = parser.parse_args()
+
+    batch_sizes = [int(value) for value in args.batch_sizes.split(",")]
+    thread_counts = [int(value) for value in args.threads.split(",")]
+
+    print("🔥 BENCHMARK DE CLIP")
+    print("=" * 60)
+    results = run(batch_sizes, thread_counts, args.images, args.repeats)
+
+    report = {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "git_commit": git_commit(),
+        "environment": {
+            "python": platform.python_version(),
+            "torch": torch.__version__,
+            "cpu_count": os.cpu_count(),
+            "platform": platform.platform(),
+        },
+        "model": ai_service.clip_model.health(),
+        "config": {
+            "batch_sizes": batch_sizes,
+            "threads": thread_counts,
+            "images": args.images,
+            "repeats": args.repeats,
+        },
+        "results": results,
+    }
+    with open(args.output, "w") as output:
+        json.dump(report, output, indent=2)
+    print(f"📄 Resultados guardados en {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,13 @@
+"""
+Configuración común de los tests: hace importable el backend y define las
+variables de entorno mínimas que necesita `app.core.config.Settings`.
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("CELERY_BROKER_URL", "memory://")
+os.environ.setdefault("CELERY_RESULT_BACKEND", "cache+memory://")
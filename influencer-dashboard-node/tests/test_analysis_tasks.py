@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Comprueba las tareas de análisis: quien se suma a un análisis en curso
+recibe el resultado de su influencer aunque lo esté analizando un chunk de
+un análisis masivo, cada etapa renueva los claims de sus influencers, y el
+resumen de un análisis masivo (en modo eager) cuenta los chunks que fallan.
+"""
+
+import importlib
+import sys
+import types
+
+import pytest
+from sqlmodel import Session, SQLModel, select
+
+from app.core.celery_app import celery_app
+from app.db.session import engine
+from app.models.influencer import Influencer, InfluencerCategory, MetricSnapshot, Post, PostAnalysis, PostMetricSnapshot
+from app.services.ai_service import CategoryPrediction
+from app.services.single_flight import analysis_flight
+
+
+@pytest.fixture
+def analysis(monkeypatch):
+    """Importa las tareas con un servicio de Instagram falso."""
+    instagram = types.ModuleType("app.services.instagram_service")
+    instagram.get_mock_instagram_data = lambda username: ({"username": username}, [])
+    monkeypatch.setitem(sys.modules, "app.services.instagram_service", instagram)
+    return importlib.import_module("app.tasks.analysis")
+
+
+@pytest.fixture
+def claims():
+    """Claims que se liberan al terminar: (influencer, dueño)."""
+    held = []
+    yield held
+    for influencer_id, owner in held:
+        analysis_flight.release(str(influencer_id), owner)
+
+
+class StoredResult:
+    """AsyncResult ya resuelto."""
+
+    def __init__(self, task_id, value):
+        self.id = task_id
+        self.value = value
+
+    def get(self, timeout=None):
+        return self.value
+
+
+def test_el_resultado_de_un_chunk_se_reparte(analysis):
+    chunk = StoredResult("chunk", [
+        {"status": "complete", "influencer_id": 7, "posts": 3},
+        {"status": "failed", "influencer_id": 8, "error": "timeout"},
+    ])
+
+    assert analysis.InfluencerAnalysis(8, chunk).get(timeout=1) == {"status": "failed", "influencer_id": 8, "error": "timeout"}
+    assert analysis.InfluencerAnalysis(7, chunk).get()["posts"] == 3
+    # El resto es el del AsyncResult
+    assert analysis.InfluencerAnalysis(7, chunk).id == "chunk"
+
+    single = StoredResult("single", {"status": "complete", "influencer_id": 7})
+    assert analysis.InfluencerAnalysis(7, single).get() == {"status": "complete", "influencer_id": 7}
+
+
+def test_se_suma_al_chunk_en_curso(analysis, claims):
+    analysis_flight.claim("900001", "chunk-owner")
+    claims.append((900001, "chunk-owner"))
+
+    result = analysis.submit_influencer_analysis(900001)
+
+    assert isinstance(result, analysis.InfluencerAnalysis)
+    assert result.id == "chunk-owner"
+    assert result.influencer_id == 900001
+
+
+def test_las_etapas_renuevan_los_claims(analysis, claims):
+    analysis_flight.claim("900002", "chunk-owner")
+    analysis_flight.claim("900003", "otro-analisis")
+    claims.extend([(900002, "chunk-owner"), (900003, "otro-analisis")])
+    payloads = [
+        {"influencer_id": 900002, "owner": "chunk-owner"},
+        # Su claim caducó en la cola y lo tomó otro análisis
+        {"influencer_id": 900003, "owner": "chunk-owner"},
+        {"status": "not_found", "influencer_id": 900004, "owner": "chunk-owner"},
+    ]
+
+    analysis._renew_claims(payloads)
+
+    assert "status" not in payloads[0]
+    assert payloads[1]["status"] == "duplicate"
+    assert payloads[1]["in_flight_task_id"] == "otro-analisis"
+    assert analysis_flight.holder("900004") is None
+
+
+@pytest.fixture
+def bulk(analysis, monkeypatch):
+    """
+    Análisis masivo en modo eager, con Instagram, la descarga de media y el
+    modelo falsos. Devuelve los ids de cuatro influencers `bulk_`.
+    """
+    monkeypatch.setattr(celery_app.conf, "task_always_eager", True)
+    monkeypatch.setattr(celery_app.conf, "task_store_eager_result", True)
+    monkeypatch.setattr(analysis, "get_mock_instagram_data", lambda username: (
+        {"username": username, "followers_count": 1000},
+        [{"id": f"{username}_{index}", "display_url": f"https://cdn/{username}/{index}.jpg"} for index in range(2)],
+    ))
+    monkeypatch.setattr(analysis, "prefetch_media", lambda urls, **kwargs: [])
+    monkeypatch.setattr(analysis, "expected_versions", lambda: ("fake", "v1"))
+    monkeypatch.setattr(analysis, "current_versions", lambda: ("fake", "v1"))
+
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        influencers = [Influencer(username=f"bulk_{name}") for name in "abcd"]
+        session.add_all(influencers)
+        session.commit()
+        ids = [influencer.id for influencer in influencers]
+    yield ids
+
+    with Session(engine) as session:
+        for model in (PostAnalysis, PostMetricSnapshot, MetricSnapshot, Post):
+            for row in session.exec(select(model).where(model.influencer_id.in_(ids))).all():
+                session.delete(row)
+        for influencer_id in ids:
+            session.delete(session.get(Influencer, influencer_id))
+        session.commit()
+
+
+def categorize_except(*usernames):
+    """`categorize_posts` falso que falla con los posts de `usernames`."""
+
+    def categorize(posts, stats=None):
+        if any(post["id"].rsplit("_", 1)[0] in usernames for post in posts):
+            raise RuntimeError("inferencia caída")
+        return [CategoryPrediction(category=InfluencerCategory.FASHION, score=0.9, label="fashion") for _ in posts], ["image"] * len(posts)
+
+    return categorize
+
+
+def run_bulk(analysis, ids):
+    queued = analysis.analyze_influencers_bulk.apply(args=(ids,), kwargs={"chunk_size": 2}).get()
+    assert (queued["status"], queued["chunks"]) == ("queued", 2)
+    return analysis.summarize_bulk_analysis.AsyncResult(queued["summary_task_id"]).get(timeout=5)
+
+
+def test_bulk_con_un_chunk_fallido(analysis, bulk, monkeypatch):
+    # El segundo chunk (bulk_c, bulk_d) falla entero en la inferencia
+    monkeypatch.setattr(analysis, "categorize_posts", categorize_except("bulk_c", "bulk_d"))
+
+    summary = run_bulk(analysis, bulk)
+
+    assert summary["influencers"] == 4
+    assert summary["statuses"] == {"complete": 2, "failed": 2}
+    assert summary["reanalyzed_posts"] == 4
+    assert summary["failures"] == [
+        {"influencer_id": bulk[2], "error": "inferencia caída"},
+        {"influencer_id": bulk[3], "error": "inferencia caída"},
+    ]
+    # Los claims se liberan también en el chunk fallido
+    assert all(analysis_flight.holder(str(influencer_id)) is None for influencer_id in bulk)
+
+
+def test_bulk_sin_prefetch(analysis, bulk, monkeypatch):
+    """Si la descarga previa de un chunk falla, la inferencia descarga lo que falte."""
+    monkeypatch.setattr(analysis, "categorize_posts", categorize_except())
+    versions = iter([("fake", "v1")])
+
+    def expected_versions():
+        # El segundo chunk no puede ni elegir los posts
+        version = next(versions, None)
+        if version is None:
+            raise RuntimeError("registro de prompts caído")
+        return version
+
+    monkeypatch.setattr(analysis, "expected_versions", expected_versions)
+
+    summary = run_bulk(analysis, bulk)
+
+    assert summary["statuses"] == {"complete": 4}
+    assert summary["failures"] == []
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Comprueba la clasificación rápida por caption: los hashtags pesan más que
+las palabras, la poca evidencia no llega al umbral de confianza, y el texto
+de CLIP solo se consulta para las captions dudosas.
+"""
+
+import pytest
+
+from app.core.config import settings
+from app.models.influencer import InfluencerCategory
+from app.services import ai_service
+from app.services.ai_service import CategoryPrediction
+from app.services.caption_classifier import LEXICON_MODEL_KEY, LEXICON_VERSION, classify_captions, score_caption
+
+
+def test_hashtags_claros_superan_el_umbral():
+    prediction = score_caption("Leg day 💪 #gym #workout #fitfam #training")
+    assert prediction.category == InfluencerCategory.FITNESS
+    assert prediction.score >= settings.CAPTION_CONFIDENCE_THRESHOLD
+    assert (prediction.model_key, prediction.prompt_version) == (LEXICON_MODEL_KEY, LEXICON_VERSION)
+    assert sum(prediction.scores.values()) == pytest.approx(1.0)
+
+
+def test_una_sola_palabra_no_basta():
+    prediction = score_caption("Nice dinner tonight")
+    assert prediction.category == InfluencerCategory.FOOD
+    assert prediction.score < settings.CAPTION_CONFIDENCE_THRESHOLD
+
+
+def test_hashtag_pesa_mas_que_palabra():
+    """Un hashtag de viajes gana a una palabra suelta de comida."""
+    assert score_caption("Brunch before the flight #travel").category == InfluencerCategory.TRAVEL
+
+
+@pytest.mark.parametrize("caption", [None, "", "Hola a todos", "#sinrelacion #nada"])
+def test_sin_senal(caption):
+    assert score_caption(caption) is None
+
+
+def test_clip_solo_para_las_dudosas(monkeypatch):
+    consulted = []
+
+    def categorize_texts(texts):
+        consulted.extend(texts)
+        return [
+            CategoryPrediction(category=InfluencerCategory.BEAUTY, score=0.9, scores={}, label="beauty")
+            for _ in texts
+        ]
+
+    monkeypatch.setattr(ai_service, "categorize_texts", categorize_texts)
+    captions = ["#gym #workout #fitfam #training", "Nice dinner tonight", "Hola a todos", None]
+    predictions = classify_captions(captions, use_clip_text=True)
+
+    # Las seguras y las vacías no se consultan
+    assert consulted == ["Nice dinner tonight", "Hola a todos"]
+    assert predictions[0].category == InfluencerCategory.FITNESS
+    assert predictions[1].category == InfluencerCategory.BEAUTY
+    assert predictions[2].category == InfluencerCategory.BEAUTY
+    assert predictions[3] is None
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Parity check de los backends de inferencia de CLIP (int8 y ONNX Runtime)
+contra el modelo PyTorch eager, sobre un conjunto fijo de imágenes sintéticas.
+"""
+
+import numpy as np
+import pytest
+from PIL import Image, ImageDraw
+
+clip = pytest.importorskip("clip")
+torch = pytest.importorskip("torch")
+
+from app.services.clip_backends import TorchBackend, create_backend
+from app.services.prompt_bank import CATEGORY_GROUP, DEFAULT_PROMPTS
+
+categories = list(DEFAULT_PROMPTS[CATEGORY_GROUP].values())
+
+# Imágenes cuyo margen top-1/top-2 en el modelo eager es menor que esto se
+# consideran empates y no cuentan para la comparación de categorías.
+TIE_MARGIN = 0.05
+
+
+def fixture_images():
+    """Conjunto determinista de imágenes sintéticas (colores, degradados y formas)."""
+    rng = np.random.default_rng(1234)
+    images = []
+    for color in ["red", "green", "blue", "yellow", "white", "black", "orange", "purple"]:
+        images.append(Image.new("RGB", (320, 240), color))
+    for _ in range(8):
+        gradient = np.linspace(0, 255, 256, dtype=np.uint8)
+        channels = [np.tile(np.roll(gradient, int(shift)), (256, 1)) for shift in rng.integers(0, 256, 3)]
+        images.append(Image.fromarray(np.stack(channels, axis=-1)))
+    for _ in range(8):
+        image = Image.new("RGB", (300, 300), tuple(int(c) for c in rng.integers(0, 256, 3)))
+        draw = ImageDraw.Draw(image)
+        for _ in range(6):
+            x0, y0 = (int(v) for v in rng.integers(0, 200, 2))
+            draw.ellipse([x0, y0, x0 + 90, y0 + 90], fill=tuple(int(c) for c in rng.integers(0, 256, 3)))
+        images.append(image)
+    return images
+
+
+def scores_for(backend, image_input, tokens):
+    image_features = backend.encode_image(image_input)
+    text_features = backend.encode_text(tokens)
+    image_features /= np.linalg.norm(image_features, axis=-1, keepdims=True)
+    text_features /= np.linalg.norm(text_features, axis=-1, keepdims=True)
+    logits = 100.0 * image_features @ text_features.T
+    similarity = np.exp(logits - logits.max(axis=-1, keepdims=True))
+    return image_features, similarity / similarity.sum(axis=-1, keepdims=True)
+
+
+@pytest.fixture(scope="module")
+def eager():
+    model, preprocess = clip.load("ViT-B/32", device="cpu")
+    image_input = torch.stack([preprocess(image) for image in fixture_images()])
+    tokens = clip.tokenize(categories)
+    features, scores = scores_for(TorchBackend(model, "cpu", "ViT-B/32"), image_input, tokens)
+    return model, image_input, tokens, features, scores
+
+
+@pytest.mark.parametrize("backend_name", ["int8", "onnx"])
+def test_backend_matches_eager_categories(backend_name, eager, tmp_path, monkeypatch):
+    if backend_name == "onnx":
+        pytest.importorskip("onnxruntime")
+        from app.core.config import settings
+        monkeypatch.setattr(settings, "ONNX_MODEL_DIR", str(tmp_path))
+
+    model, image_input, tokens, eager_features, eager_scores = eager
+    # Cada backend recibe su propia copia: int8 cuantiza el modelo in-place
+    fresh_model, _ = clip.load("ViT-B/32", device="cpu")
+    backend = create_backend(backend_name, fresh_model, "cpu", "ViT-B/32")
+    features, scores = scores_for(backend, image_input, tokens)
+
+    top2 = np.sort(eager_scores, axis=-1)[:, -2:]
+    decisive = (top2[:, 1] - top2[:, 0]) > TIE_MARGIN
+    assert decisive.any()
+    np.testing.assert_array_equal(scores.argmax(axis=-1)[decisive], eager_scores.argmax(axis=-1)[decisive])
+
+    cosine = (features * eager_features).sum(axis=-1)
+    assert cosine.min() > 0.97
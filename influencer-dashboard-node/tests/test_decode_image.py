@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Comprueba la decodificación reducida de imágenes: un JPEG grande se decodifica
+directamente a escala reducida (modo draft), otros formatos se reducen justo
+después de decodificarse, y las imágenes demasiado grandes se rechazan sin
+decodificarlas.
+"""
+
+from io import BytesIO
+
+import numpy as np
+from PIL import Image
+
+from app.services.image_pipeline import decode_image
+
+TARGET = 224
+# Lado corto mínimo tras reducir: reducing_gap (2) veces TARGET
+WANTED = 2 * TARGET
+
+
+def encoded(image, format):
+    buffer = BytesIO()
+    image.save(buffer, format=format)
+    return buffer.getvalue()
+
+
+def noise(size, mode="RGB"):
+    channels = 3 if mode == "RGB" else 1
+    pixels = np.random.default_rng(0).integers(0, 256, (size[1], size[0], channels), dtype=np.uint8)
+    return Image.fromarray(pixels.squeeze(), mode)
+
+
+def test_jpeg_grande_en_modo_draft():
+    data = encoded(noise((4000, 3000)), "JPEG")
+
+    # Decodificado entero serían 12 Mpx, por encima del límite
+    image = decode_image(data, target_size=TARGET, max_pixels=1_000_000)
+
+    assert image is not None
+    assert image.mode == "RGB"
+    # Escala DCT de 1/4: la mayor reducción que deja el lado corto por encima de WANTED
+    assert image.size == (1000, 750)
+    assert image.size[0] * image.size[1] <= 1_000_000
+
+
+def test_png_se_reduce_tras_decodificar():
+    data = encoded(noise((2000, 1600), "L"), "PNG")
+
+    image = decode_image(data, target_size=TARGET, max_pixels=4_000_000)
+
+    # Sin modo draft: reduce(1600 // WANTED = 3), redondeando hacia arriba
+    assert image.size == (667, 534)
+    assert min(image.size) >= WANTED
+    assert image.mode == "RGB"
+
+
+def test_sin_tamano_objetivo_se_decodifica_entera():
+    data = encoded(noise((640, 480)), "JPEG")
+    assert decode_image(data).size == (640, 480)
+
+
+def test_por_encima_del_limite_de_pixeles():
+    data = encoded(Image.new("L", (3000, 3000)), "PNG")
+    assert decode_image(data, target_size=TARGET, max_pixels=4_000_000) is None
+
+
+def test_bomba_de_descompresion():
+    """Unos pocos KB que declaran cientos de megapíxeles no llegan a decodificarse."""
+    data = encoded(Image.new("1", (15000, 13000)), "PNG")
+    assert len(data) < 1_000_000
+
+    assert decode_image(data, target_size=TARGET) is None
+    assert decode_image(data) is None
+
+
+def test_datos_que_no_son_una_imagen():
+    assert decode_image(b"no es una imagen", target_size=TARGET) is None
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Comprueba el almacén de embeddings direccionado por contenido: lo guardado
+se recupera (en float16), no se duplica, sobrevive a un proceso nuevo y
+tolera las escrituras interrumpidas a medias.
+"""
+
+import numpy as np
+
+from app.services.embedding_cache import EmbeddingStore, content_hash
+
+DIM = 8
+
+
+def embedding(seed):
+    return np.random.default_rng(seed).standard_normal(DIM).astype(np.float32)
+
+
+def test_guarda_y_recupera(tmp_path):
+    store = EmbeddingStore(str(tmp_path), "ViT-B/32", DIM)
+    digest = content_hash(b"imagen")
+    assert store.get(digest) is None
+
+    store.add(digest, embedding(1))
+
+    assert digest in store
+    assert len(store) == 1
+    found = store.get(digest)
+    assert found.dtype == np.float32
+    assert np.allclose(found, embedding(1), atol=1e-2)
+
+
+def test_no_duplica_hashes(tmp_path):
+    store = EmbeddingStore(str(tmp_path), "ViT-B/32", DIM)
+    store.add_many([("a", embedding(1)), ("a", embedding(2)), ("b", embedding(3))])
+    store.add("a", embedding(4))
+
+    assert len(store) == 2
+    # Gana el primero que se guardó
+    assert np.allclose(store.get("a"), embedding(1), atol=1e-2)
+    assert set(store.get_many(["a", "b", "c"])) == {"a", "b"}
+
+
+def test_otra_instancia_ve_las_filas_nuevas(tmp_path):
+    """Dos procesos que comparten el directorio se leen mutuamente."""
+    writer = EmbeddingStore(str(tmp_path), "ViT-B/32", DIM)
+    reader = EmbeddingStore(str(tmp_path), "ViT-B/32", DIM)
+
+    writer.add("a", embedding(1))
+    assert np.allclose(reader.get("a"), embedding(1), atol=1e-2)
+    writer.add("b", embedding(2))
+    assert len(reader) == 2
+    # El lector amplía su mapa con las filas nuevas
+    writer.add_many([("c", embedding(3)), ("d", embedding(4))])
+    assert np.allclose(reader.get("d"), embedding(4), atol=1e-2)
+    assert reader._matrix.shape[0] == 4
+
+
+def test_modelos_separados(tmp_path):
+    EmbeddingStore(str(tmp_path), "ViT-B/32", DIM).add("a", embedding(1))
+    assert EmbeddingStore(str(tmp_path), "ViT-L/14", DIM).get("a") is None
+
+
+def test_escritura_interrumpida(tmp_path):
+    """Una fila o línea de índice a medias no rompe ni desplaza lo siguiente."""
+    store = EmbeddingStore(str(tmp_path), "ViT-B/32", DIM)
+    store.add("a", embedding(1))
+    with open(store.matrix_path, "ab") as matrix_file:
+        matrix_file.write(b"\x00\x01\x02")
+    with open(store.index_path, "ab") as index_file:
+        index_file.write(b"b\t")
+
+    fresh = EmbeddingStore(str(tmp_path), "ViT-B/32", DIM)
+    assert len(fresh) == 1
+    fresh.add("c", embedding(3))
+
+    assert np.allclose(fresh.get("a"), embedding(1), atol=1e-2)
+    assert np.allclose(fresh.get("c"), embedding(3), atol=1e-2)
+    assert fresh.get("b") is None
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Comprueba la detección de casi-duplicados: una imagen recomprimida o
+redimensionada se reconoce, pero no las imágenes planas, las de otro color
+ni las distintas; y en el pipeline, los duplicados de una imagen que falla
+se procesan por su cuenta.
+"""
+
+from io import BytesIO
+
+import numpy as np
+from PIL import Image
+
+from app.services.image_dedup import NearDuplicateIndex, is_near_duplicate, perceptual_hash
+from app.services.image_pipeline import PipelineStats, stream_embeddings
+
+THRESHOLD = 6
+
+
+def pattern(seed, size=(256, 256)):
+    """Imagen con textura: bloques aleatorios en escala de grises."""
+    blocks = np.random.default_rng(seed).integers(0, 256, (8, 8), dtype=np.uint8)
+    return Image.fromarray(blocks).resize(size, Image.NEAREST).convert("RGB")
+
+def tinted(image, channel):
+    """La misma imagen, solo en uno de los canales RGB."""
+    bands = [band if index == channel else band.point(lambda _: 0) for index, band in enumerate(image.split())]
+    return Image.merge("RGB", bands)
+
+def jpeg(image, quality=90):
+    buffer = BytesIO()
+    image.save(buffer, format="JPEG", quality=quality)
+    return buffer.getvalue()
+
+
+def test_recomprimida_y_redimensionada_es_duplicado():
+    original = perceptual_hash(pattern(1))
+    assert is_near_duplicate(original, perceptual_hash(jpeg(pattern(1), quality=60)), THRESHOLD)
+    assert is_near_duplicate(original, perceptual_hash(pattern(1, size=(128, 128))), THRESHOLD)
+
+
+def test_imagenes_distintas_no_son_duplicado():
+    assert not is_near_duplicate(perceptual_hash(pattern(1)), perceptual_hash(pattern(2)), THRESHOLD)
+
+
+def test_mismo_patron_en_otro_color_no_es_duplicado():
+    """dHash solo ve la luminancia: el color medio lo desempata."""
+    red, blue = tinted(pattern(1), 0), tinted(pattern(1), 2)
+    assert not is_near_duplicate(perceptual_hash(red), perceptual_hash(blue), THRESHOLD)
+
+
+def test_imagen_plana_no_tiene_hash():
+    assert perceptual_hash(Image.new("RGB", (200, 200), "white")) is None
+    assert perceptual_hash(jpeg(Image.new("RGB", (200, 200), "black"))) is None
+    assert perceptual_hash(b"no es una imagen") is None
+
+
+def test_indice_representantes():
+    index = NearDuplicateIndex(THRESHOLD)
+    assert index.find_or_add(perceptual_hash(pattern(1)), 0) is None
+    assert index.find_or_add(perceptual_hash(pattern(2)), 1) is None
+    assert index.find_or_add(perceptual_hash(jpeg(pattern(1))), 2) == 0
+
+    index.remove(0)
+    assert index.find_or_add(perceptual_hash(jpeg(pattern(1))), 3) is None
+    assert index.find_or_add(perceptual_hash(pattern(1)), 4) == 3
+
+
+def test_duplicados_de_una_imagen_que_falla():
+    """Si el representante falla, sus casi-duplicados se procesan por su cuenta."""
+    broken = pattern(1)
+    sources = [broken, pattern(1, size=(200, 200)), pattern(1, size=(160, 160)), pattern(2)]
+
+    def preprocess(image):
+        if image is broken:
+            raise ValueError("imagen corrupta")
+        return image.size
+
+    stats = PipelineStats()
+    results = dict(stream_embeddings(
+        sources,
+        preprocess,
+        lambda batch: np.ones((len(batch), 4), dtype=np.float32),
+        # Un solo fetcher: la imagen rota es la primera registrada, el representante
+        fetch_workers=1,
+        dedup_threshold=THRESHOLD,
+        stats=stats,
+    ))
+
+    assert results[0] is None
+    assert all(results[index] is not None for index in (1, 2, 3))
+    assert stats.failures == 1
+    assert stats.inferences + stats.duplicates == 3
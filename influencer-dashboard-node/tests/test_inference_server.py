@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Comprueba el servidor de inferencia compartido: el batcher junta peticiones
+concurrentes y devuelve a cada una sus filas, el cliente habla con un
+servidor real por HTTP, y el backend remoto pasa al modelo en proceso
+cuando el servidor no responde.
+"""
+
+import threading
+
+import numpy as np
+import pytest
+
+torch = pytest.importorskip("torch")
+
+from app.core.config import settings
+from app.services import inference_server
+from app.services.clip_backends import ClipBackend
+from app.services.inference_server import DynamicBatcher, InferenceClient, RemoteBackend
+
+
+class RowBackend(ClipBackend):
+    """Devuelve como features el primer valor de cada imagen, para saber de quién es cada fila."""
+    name = "fake"
+
+    def __init__(self, offset=0.0):
+        super().__init__(model=None, device="cpu", model_name="fake")
+        self.offset = offset
+        self.batch_sizes = []
+
+    def encode_image(self, image_input):
+        self.batch_sizes.append(len(image_input))
+        return image_input.reshape(len(image_input), -1)[:, :1].float().numpy() + self.offset
+
+    def encode_text(self, tokens):
+        return tokens[:, :1].float().numpy() + self.offset
+
+
+def images(first, count):
+    """`count` imágenes de 3x2x2 cuyo primer valor es `first`, `first + 1`, ..."""
+    batch = np.zeros((count, 3, 2, 2), dtype=np.float16)
+    batch[:, 0, 0, 0] = np.arange(first, first + count)
+    return batch
+
+
+def encode_concurrently(batcher, requests):
+    results = [None] * len(requests)
+    barrier = threading.Barrier(len(requests))
+
+    def call(index, batch):
+        barrier.wait()
+        results[index] = batcher.encode_image(batch)
+
+    threads = [threading.Thread(target=call, args=item) for item in enumerate(requests)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=10)
+    return results
+
+
+def test_batcher_junta_y_reparte():
+    backend = RowBackend()
+    batcher = DynamicBatcher(backend, max_batch=64, max_wait=0.5)
+    requests = [images(10 * index, index + 1) for index in range(5)]
+
+    results = encode_concurrently(batcher, requests)
+
+    for request, result in zip(requests, results):
+        assert result[:, 0].tolist() == request[:, 0, 0, 0].tolist()
+    assert batcher.requests == 5
+    assert batcher.images == 15
+    assert batcher.batches < 5
+
+
+def test_batcher_respeta_el_tamano_maximo():
+    backend = RowBackend()
+    batcher = DynamicBatcher(backend, max_batch=4, max_wait=0.5)
+    requests = [images(10 * index, 2) for index in range(6)]
+
+    results = encode_concurrently(batcher, requests)
+
+    for request, result in zip(requests, results):
+        assert result[:, 0].tolist() == request[:, 0, 0, 0].tolist()
+    # Un lote se cierra al llegar a max_batch imágenes
+    assert all(size <= 4 for size in backend.batch_sizes)
+    assert sum(backend.batch_sizes) == 12
+
+
+def test_batcher_propaga_errores():
+    class Broken(RowBackend):
+        def encode_image(self, image_input):
+            raise RuntimeError("sin memoria")
+
+    batcher = DynamicBatcher(Broken(), max_batch=8, max_wait=0.01)
+    with pytest.raises(RuntimeError):
+        batcher.encode_image(images(0, 2))
+    assert batcher.batches == 0
+
+
+@pytest.fixture
+def server():
+    """Servidor HTTP real en un puerto libre, con un backend falso."""
+
+    class FakeModel:
+        backend = RowBackend()
+        input_resolution = 224
+
+        def health(self):
+            return {"loaded": True, "backend": "fake", "model_key": "fake"}
+
+    server = inference_server._TCPServer(("127.0.0.1", 0), inference_server._Handler)
+    server.clip_model = FakeModel()
+    server.batcher = DynamicBatcher(server.clip_model.backend, max_batch=8, max_wait=0.01)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def test_cliente_contra_el_servidor(server):
+    client = InferenceClient(server, timeout=5)
+    assert client.health()["input_resolution"] == 224
+    assert client.encode_image(images(3, 2))[:, 0].tolist() == [3.0, 4.0]
+    assert client.encode_text(np.array([[7, 0], [8, 0]]))[:, 0].tolist() == [7.0, 8.0]
+
+
+def test_servidor_inalcanzable():
+    assert InferenceClient("unix:///tmp/no-existe.sock", timeout=1).health() is None
+
+
+def test_remoto_cae_al_modelo_local_y_vuelve(server, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(inference_server.time, "monotonic", lambda: now[0])
+    local = RowBackend(offset=100.0)
+    loads = []
+
+    def fallback():
+        loads.append(1)
+        return local
+
+    backend = RemoteBackend(InferenceClient("unix:///tmp/no-existe.sock", timeout=1), fallback, retry_seconds=30)
+    batch = torch.from_numpy(images(1, 2))
+
+    # Servidor caído: responde el modelo local, cargado una sola vez
+    assert backend.encode_image(batch)[:, 0].tolist() == [101.0, 102.0]
+    assert backend.encode_text(torch.tensor([[5, 0]]))[:, 0].tolist() == [105.0]
+    assert len(loads) == 1
+
+    # Pasado el plazo se vuelve a probar el servidor, y al responder se suelta el local
+    backend.client = InferenceClient(server, timeout=5)
+    now[0] += 10
+    assert backend.encode_image(batch)[:, 0].tolist() == [101.0, 102.0]
+    now[0] += 25
+    assert backend.encode_image(batch)[:, 0].tolist() == [1.0, 2.0]
+    assert backend._local is None
+
+
+def test_conexion_remota_prepara_el_preprocesado(server, monkeypatch):
+    """Con INFERENCE_SERVER_URL el worker construye su preprocesado sin cargar CLIP."""
+    pytest.importorskip("clip")
+    from app.services.ai_service import ClipModel
+
+    monkeypatch.setattr(settings, "INFERENCE_SERVER_CONNECT_ATTEMPTS", 1)
+    model = ClipModel("ViT-B/32", server_url=server)
+    preprocess, backend, model_key = model._connect_remote()
+
+    assert callable(preprocess)
+    assert isinstance(backend, RemoteBackend)
+    assert model_key == "fake"
+    assert model.input_resolution == 224
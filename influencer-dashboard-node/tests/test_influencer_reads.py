@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Comprueba que las lecturas de influencers con sus posts no caen en N+1:
+una página de influencers con sus últimos posts cuesta dos consultas SQL,
+sea cual sea el tamaño de la página.
+"""
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import event
+from sqlmodel import Session, SQLModel, select
+
+from app.db.session import engine
+from app.models.influencer import Influencer, Post
+from app.services.listing_service import list_influencers, with_latest_posts
+
+INFLUENCERS = 60
+POSTS_PER_INFLUENCER = 8
+
+
+@pytest.fixture(scope="module")
+def database():
+    """Base de datos con INFLUENCERS influencers de POSTS_PER_INFLUENCER posts cada uno."""
+    SQLModel.metadata.create_all(engine)
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    with Session(engine) as session:
+        influencers = [
+            Influencer(username=f"reads_{index}", followers_count=1000 + index)
+            for index in range(INFLUENCERS)
+        ]
+        session.add_all(influencers)
+        session.flush()
+        for influencer in influencers:
+            for index in range(POSTS_PER_INFLUENCER):
+                session.add(Post(
+                    external_id=f"reads_{influencer.id}_{index}",
+                    influencer_id=influencer.id,
+                    image_url=f"https://example.com/{influencer.id}/{index}.jpg",
+                    posted_at=start + timedelta(days=index),
+                ))
+        session.commit()
+    yield
+    with Session(engine) as session:
+        for post in session.exec(select(Post).where(Post.external_id.startswith("reads_"))).all():
+            session.delete(post)
+        for influencer in session.exec(select(Influencer).where(Influencer.username.startswith("reads_"))).all():
+            session.delete(influencer)
+        session.commit()
+
+
+@pytest.fixture
+def statements():
+    """Lista de las sentencias SQL ejecutadas mientras dura el test."""
+    executed = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        executed.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    yield executed
+    event.remove(engine, "before_cursor_execute", record)
+
+
+def test_pagina_de_50_influencers_con_posts_en_dos_consultas(database, statements):
+    with Session(engine) as session:
+        influencers, next_cursor = list_influencers(session, sort="followers", limit=50)
+        page = with_latest_posts(session, influencers, 5)
+        # Serializar la página no debe disparar cargas perezosas
+        payload = [item.model_dump() for item in page]
+
+    assert len(statements) == 2
+    assert len(payload) == 50
+    assert next_cursor is not None
+    assert all(len(item["posts"]) == 5 for item in payload)
+
+
+def test_ultimos_posts_primero(database):
+    with Session(engine) as session:
+        influencers, _ = list_influencers(session, sort="followers", limit=3)
+        page = with_latest_posts(session, influencers, 3)
+
+    for item in page:
+        posted = [post.posted_at for post in item.posts]
+        assert posted == sorted(posted, reverse=True)
+        assert all(post.influencer_id == item.id for post in item.posts)
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Comprueba la paginación por cursor: recorrer todas las páginas devuelve cada
+fila una sola vez y en orden, con empates y valores NULL al final, y un
+cursor manipulado o de otra ordenación se rechaza.
+"""
+
+import base64
+import json
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlmodel import Session, SQLModel, select
+
+from app.db.session import engine
+from app.models.influencer import Influencer, Post
+from app.services.listing_service import InvalidCursor, decode_cursor, encode_cursor, keyset_page, list_posts
+
+# Seguidores con empates y perfiles sin dato
+FOLLOWERS = [500, 300, 300, 300, None, 100, None, 300, 50, None]
+
+
+@pytest.fixture(scope="module")
+def database():
+    SQLModel.metadata.create_all(engine)
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    with Session(engine) as session:
+        influencers = [
+            Influencer(username=f"pages_{index}", followers_count=followers)
+            for index, followers in enumerate(FOLLOWERS)
+        ]
+        session.add_all(influencers)
+        session.flush()
+        owner = influencers[0]
+        for index in range(9):
+            session.add(Post(
+                external_id=f"pages_{index}",
+                influencer_id=owner.id,
+                image_url=f"https://example.com/{index}.jpg",
+                # Dos posts por fecha, y uno sin fecha
+                posted_at=start + timedelta(days=index // 2) if index < 8 else None,
+            ))
+        session.commit()
+        owner_id = owner.id
+    yield owner_id
+    with Session(engine) as session:
+        for post in session.exec(select(Post).where(Post.external_id.startswith("pages_"))).all():
+            session.delete(post)
+        for influencer in session.exec(select(Influencer).where(Influencer.username.startswith("pages_"))).all():
+            session.delete(influencer)
+        session.commit()
+
+
+def walk(session, limit):
+    """Todas las páginas de influencers `pages_*` por seguidores, de `limit` en `limit`."""
+    statement = select(Influencer).where(Influencer.username.startswith("pages_"))
+    seen, after = [], None
+    while True:
+        rows, has_more = keyset_page(session, statement, Influencer.followers_count, Influencer.id, limit, after)
+        seen += rows
+        if not has_more:
+            return seen
+        cursor = encode_cursor("followers", rows[-1].followers_count, rows[-1].id)
+        after = decode_cursor(cursor, "followers")
+
+
+@pytest.mark.parametrize("limit", [1, 3, 4, 20])
+def test_recorrido_completo_en_orden(database, limit):
+    with Session(engine) as session:
+        rows = walk(session, limit)
+
+    assert len(rows) == len(FOLLOWERS)
+    assert len({row.id for row in rows}) == len(FOLLOWERS)
+    with_value = [row for row in rows if row.followers_count is not None]
+    without_value = rows[len(with_value):]
+    # Los NULL van al final, por id descendente
+    assert all(row.followers_count is None for row in without_value)
+    assert [(row.followers_count, row.id) for row in with_value] == sorted(
+        [(row.followers_count, row.id) for row in with_value], reverse=True
+    )
+    assert [row.id for row in without_value] == sorted([row.id for row in without_value], reverse=True)
+
+
+def test_posts_por_fecha(database):
+    with Session(engine) as session:
+        seen, cursor = [], None
+        while True:
+            posts, cursor = list_posts(session, database, sort="posted_at", limit=3, cursor=cursor)
+            seen += posts
+            if cursor is None:
+                break
+
+    assert len({post.id for post in seen}) == 9
+    assert seen[-1].posted_at is None
+    dated = [post.posted_at for post in seen[:-1]]
+    assert dated == sorted(dated, reverse=True)
+
+
+def test_cursor_ida_y_vuelta():
+    moment = datetime(2024, 1, 1, 12, tzinfo=timezone.utc)
+    assert decode_cursor(encode_cursor("posted_at", moment, 7), "posted_at") == (moment, 7)
+    assert decode_cursor(encode_cursor("followers", 300, 7), "followers") == (300, 7)
+    assert decode_cursor(encode_cursor("followers", None, 7), "followers") == (None, 7)
+
+
+def forged(payload):
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip("=")
+
+
+@pytest.mark.parametrize("sort, cursor", [
+    ("followers", "no-es-un-cursor"),
+    ("followers", forged(["followers", 300])),
+    ("followers", forged(["followers", "300; DROP TABLE influencer", 7])),
+    ("followers", forged(["followers", True, 7])),
+    ("followers", forged(["followers", 300, "siete"])),
+    ("followers", forged({"sort": "followers"})),
+    ("posted_at", forged(["posted_at", "ayer", 7])),
+])
+def test_cursor_manipulado(sort, cursor):
+    with pytest.raises(InvalidCursor):
+        decode_cursor(cursor, sort)
+
+
+def test_cursor_de_otra_ordenacion():
+    with pytest.raises(InvalidCursor):
+        decode_cursor(encode_cursor("followers", 300, 7), "engagement")
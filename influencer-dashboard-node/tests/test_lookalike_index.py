@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Comprueba la renovación del índice de lookalikes: cuando el catálogo cambia,
+el índice se reconstruye en segundo plano y las búsquedas siguen usando el
+anterior hasta que el nuevo lo sustituye, sin esperar a la reconstrucción.
+"""
+
+import threading
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pytest
+from sqlmodel import Session, SQLModel, create_engine
+
+from app.core.config import settings
+from app.models.influencer import Influencer
+from app.services import lookalike_service
+from app.services.lookalike_service import find_similar_influencers, get_index
+from app.services.vector_index import normalized_mean, vector_to_bytes
+
+MODEL = "ViT-B/32"
+START = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def engine(tmp_path, monkeypatch):
+    """Base de datos en fichero, visible desde el hilo de reconstrucción, y caché de índices vacía."""
+    engine = create_engine(f"sqlite:///{tmp_path / 'lookalike.db'}")
+    SQLModel.metadata.create_all(engine)
+    monkeypatch.setattr(lookalike_service, "_indexes", {})
+    monkeypatch.setattr(lookalike_service, "_rebuilds", {})
+    monkeypatch.setattr(lookalike_service, "_first_builds", {})
+    # El catálogo se comprueba en cada búsqueda
+    monkeypatch.setattr(settings, "SIMILARITY_INDEX_REFRESH_SECONDS", 0)
+    return engine
+
+
+def add_influencers(engine, first, count):
+    rng = np.random.default_rng(first)
+    with Session(engine) as session:
+        for index in range(first, first + count):
+            session.add(Influencer(
+                username=f"lookalike_{index}",
+                embedding=vector_to_bytes(normalized_mean([rng.standard_normal(8)])),
+                embedding_model=MODEL,
+                embedding_updated_at=START + timedelta(minutes=index),
+            ))
+        session.commit()
+
+
+def wait_for_rebuild():
+    thread = lookalike_service._rebuilds.get(MODEL)
+    if thread is not None:
+        thread.join(timeout=10)
+
+
+def test_reconstruye_en_segundo_plano(engine, monkeypatch):
+    add_influencers(engine, 0, 5)
+    with Session(engine) as session:
+        first = get_index(session, MODEL)
+    assert len(first) == 5
+
+    # La reconstrucción queda bloqueada hasta que el test la suelte
+    release = threading.Event()
+    build = lookalike_service._build
+
+    def slow_build(bind, model_key):
+        release.wait(timeout=10)
+        return build(bind, model_key)
+
+    monkeypatch.setattr(lookalike_service, "_build", slow_build)
+    add_influencers(engine, 5, 3)
+
+    with Session(engine) as session:
+        # Se sigue sirviendo el índice anterior mientras tanto
+        assert get_index(session, MODEL) is first
+        assert get_index(session, MODEL) is first
+        assert len(lookalike_service._rebuilds) == 1
+
+        release.set()
+        wait_for_rebuild()
+        assert len(get_index(session, MODEL)) == 8
+
+
+def test_sin_cambios_no_reconstruye(engine):
+    add_influencers(engine, 0, 5)
+    with Session(engine) as session:
+        first = get_index(session, MODEL)
+        assert get_index(session, MODEL) is first
+        assert not lookalike_service._rebuilds
+
+
+def test_un_fallo_conserva_el_indice_anterior(engine, monkeypatch):
+    add_influencers(engine, 0, 5)
+    with Session(engine) as session:
+        first = get_index(session, MODEL)
+
+    def broken_build(bind, model_key):
+        raise MemoryError("sin memoria")
+
+    monkeypatch.setattr(lookalike_service, "_build", broken_build)
+    add_influencers(engine, 5, 1)
+    with Session(engine) as session:
+        get_index(session, MODEL)
+        wait_for_rebuild()
+        assert get_index(session, MODEL) is first
+
+
+def test_busqueda_de_similares(engine):
+    add_influencers(engine, 0, 6)
+    with Session(engine) as session:
+        influencer = session.get(Influencer, 1)
+        similar = find_similar_influencers(session, influencer, k=3)
+
+    assert len(similar) == 3
+    assert influencer.id not in [match.id for match, _ in similar]
+    similarities = [similarity for _, similarity in similar]
+    assert similarities == sorted(similarities, reverse=True)
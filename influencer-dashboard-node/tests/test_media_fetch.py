@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Comprueba la caché HTTP de `media_fetch`: qué respuestas se guardan y
+durante cuánto tiempo se sirven sin revalidar, la revalidación con
+ETag/Last-Modified, el límite de tamaño de descarga, el recorte de la caché
+sin recorrer el directorio en cada escritura, y que influencer-scrapper usa
+este mismo módulo.
+"""
+
+import io
+import os
+import time
+
+import pytest
+from requests import Response
+
+from app.services import media_fetch
+from app.services.media_fetch import MediaFetcher, MediaTooLarge
+
+ROOT = os.path.join(os.path.dirname(__file__), "..", "..")
+SCRAPPER = os.path.join(ROOT, "influencer-scrapper")
+
+
+def response(cache_control=None):
+    """Respuesta 200 con la cabecera Cache-Control indicada."""
+    result = Response()
+    result.status_code = 200
+    if cache_control is not None:
+        result.headers["Cache-Control"] = cache_control
+    return result
+
+
+@pytest.fixture
+def fetcher(tmp_path):
+    return MediaFetcher(cache_dir=str(tmp_path), default_ttl=3600)
+
+
+def test_el_scrapper_usa_el_modulo_del_backend():
+    """influencer-scrapper carga este módulo por ruta en lugar de mantener una copia."""
+    assert not os.path.exists(os.path.join(SCRAPPER, "media_fetch.py"))
+    with open(os.path.join(SCRAPPER, "instagram_scraper.py")) as scraper:
+        source = scraper.read()
+    assert '"backend", "app", "services", "media_fetch.py"' in source
+
+
+def test_max_age(fetcher):
+    expires_at = fetcher._expires_at(response("public, max-age=60"))
+    assert time.time() + 55 < expires_at <= time.time() + 60
+
+
+def test_sin_cabecera_usa_ttl_por_defecto(fetcher):
+    expires_at = fetcher._expires_at(response())
+    assert time.time() + 3590 < expires_at <= time.time() + 3600
+
+
+@pytest.mark.parametrize("cache_control", ["no-cache", "no-cache, max-age=600", "max-age=600, no-cache"])
+def test_no_cache_se_revalida_siempre(fetcher, cache_control):
+    """`no-cache` se guarda ya caducado: cada uso hace una petición condicional."""
+    assert fetcher._expires_at(response(cache_control)) <= time.time()
+
+
+@pytest.mark.parametrize("cache_control", ["no-store", "private, no-store, max-age=600"])
+def test_no_store_no_se_guarda(fetcher, cache_control, tmp_path):
+    assert fetcher._expires_at(response(cache_control)) is None
+    fetcher._store("https://example.com/a.jpg", response(cache_control), b"data")
+    assert not any(files for _, _, files in os.walk(tmp_path))
+
+
+class Server:
+    """`session.get` falso: sirve cuerpos por URL y anota las cabeceras de cada petición."""
+
+    def __init__(self):
+        self.bodies = {}
+        self.headers = {}
+        self.requests = []
+
+    def __call__(self, url, headers=None, timeout=None, stream=False):
+        headers = headers or {}
+        self.requests.append(headers)
+        result = Response()
+        result.headers.update(self.headers)
+        etag = self.headers.get("ETag")
+        if etag and headers.get("If-None-Match") == etag:
+            result.status_code = 304
+            result.raw = io.BytesIO(b"")
+            return result
+        result.status_code = 200
+        result.raw = io.BytesIO(self.bodies[url])
+        return result
+
+
+@pytest.fixture
+def server(fetcher, monkeypatch):
+    server = Server()
+    monkeypatch.setattr(fetcher.session, "get", server)
+    return server
+
+
+def test_revalidacion_304(fetcher, server):
+    url = "https://cdn/a.jpg"
+    server.bodies[url] = b"imagen"
+    server.headers.update({"ETag": '"v1"', "Last-Modified": "Mon, 04 Mar 2024 10:00:00 GMT", "Cache-Control": "no-cache"})
+
+    assert fetcher.fetch(url).content == b"imagen"
+    # Ya no se sirve el cuerpo: solo un 304
+    server.bodies[url] = None
+    again = fetcher.fetch(url)
+
+    assert (again.content, again.from_cache) == (b"imagen", True)
+    assert server.requests[1] == {"If-None-Match": '"v1"', "If-Modified-Since": "Mon, 04 Mar 2024 10:00:00 GMT"}
+    assert fetcher.stats() == {"hits": 0, "revalidated": 1, "misses": 1}
+
+
+def test_revalidacion_304_en_streaming(fetcher, server):
+    url = "https://cdn/v.mp4"
+    server.bodies[url] = b"video"
+    server.headers.update({"ETag": '"v1"', "Cache-Control": "no-cache"})
+
+    with fetcher.open(url) as media:
+        first_sha = media.sha256
+    server.bodies[url] = None
+    with fetcher.open(url) as media:
+        assert media.file.read() == b"video"
+        assert media.sha256 == first_sha
+    assert server.requests[1]["If-None-Match"] == '"v1"'
+    assert fetcher.revalidated == 1
+
+
+def test_limite_por_content_length(fetcher, server):
+    url = "https://cdn/grande.jpg"
+    server.bodies[url] = b"x" * 100
+    server.headers["Content-Length"] = "100"
+
+    with pytest.raises(MediaTooLarge):
+        fetcher.fetch(url, max_bytes=50)
+
+
+@pytest.mark.parametrize("streamed", [False, True])
+def test_limite_sin_content_length(fetcher, server, tmp_path, streamed):
+    """Sin Content-Length se corta al pasar del límite, y no queda nada en la caché."""
+    url = "https://cdn/grande.mp4"
+    server.bodies[url] = b"x" * (200 * 1024)
+
+    with pytest.raises(MediaTooLarge):
+        if streamed:
+            with fetcher.open(url, max_bytes=100 * 1024):
+                pass
+        else:
+            fetcher.fetch(url, max_bytes=100 * 1024)
+    assert not [name for _, _, files in os.walk(tmp_path) for name in files]
+
+
+def test_recorte_sin_recorrer_en_cada_escritura(tmp_path, monkeypatch):
+    fetcher = MediaFetcher(cache_dir=str(tmp_path), default_ttl=3600, max_cache_bytes=250)
+    server = Server()
+    monkeypatch.setattr(fetcher.session, "get", server)
+    walks = []
+    walk = os.walk
+    monkeypatch.setattr(media_fetch.os, "walk", lambda path: walks.append(path) or walk(path))
+
+    for index, name in enumerate("ab"):
+        server.bodies[f"https://cdn/{name}"] = b"x" * 100
+        fetcher.fetch(f"https://cdn/{name}")
+        # Más antiguas que la siguiente
+        os.utime(fetcher._paths(f"https://cdn/{name}")[0], (1000 + index, 1000 + index))
+    assert walks == []
+    assert fetcher._cache_bytes == 200
+
+    server.bodies["https://cdn/c"] = b"x" * 100
+    fetcher.fetch("https://cdn/c")
+
+    # Pasó de 250: un recorrido para borrar la más antigua
+    assert len(walks) == 1
+    assert fetcher._cache_bytes == 200
+    assert not os.path.exists(fetcher._paths("https://cdn/a")[0])
+    assert os.path.exists(fetcher._paths("https://cdn/b")[0])
+
+
+def test_tamano_inicial_desde_disco(tmp_path):
+    MediaFetcher(cache_dir=str(tmp_path), max_cache_bytes=1000)._store("https://cdn/a", response(), b"x" * 100)
+    assert MediaFetcher(cache_dir=str(tmp_path), max_cache_bytes=1000)._cache_bytes == 100
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+Comprueba el histórico de métricas: los snapshots del perfil y de los posts
+recién obtenidos, los rollups diarios y semanales (último valor para los
+contadores, medias ponderadas por muestras), la retención por nivel y el
+nivel desde el que se sirve cada rango.
+"""
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlmodel import Session, SQLModel, select
+
+from app.core.config import settings
+from app.db.session import engine
+from app.models.influencer import Influencer, MetricRollup, MetricSnapshot, Post, PostMetricRollup, PostMetricSnapshot
+from app.services.metrics_history import (
+    DAY,
+    RAW,
+    WEEK,
+    history_resolution,
+    metric_history,
+    prune_metrics,
+    record_post_snapshots,
+    record_snapshots,
+    rollup_days,
+    rollup_weeks,
+)
+
+# Lunes
+MONDAY = datetime(2024, 3, 4, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def session():
+    """Sesión que descarta todo lo escrito al terminar."""
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        yield session
+        session.rollback()
+
+
+@pytest.fixture
+def influencer(session):
+    row = Influencer(username="metrics_a", followers_count=1000)
+    session.add(row)
+    session.flush()
+    return row
+
+
+def snapshot(session, influencer, captured_at, followers, mean_likes):
+    session.add(MetricSnapshot(
+        influencer_id=influencer.id,
+        captured_at=captured_at,
+        followers_count=followers,
+        post_count=10,
+        mean_likes=mean_likes,
+    ))
+    session.flush()
+
+def rollups(session, influencer, period):
+    return session.exec(
+        select(MetricRollup)
+        .where(MetricRollup.influencer_id == influencer.id, MetricRollup.period == period)
+        .order_by(MetricRollup.period_start)
+    ).all()
+
+
+def test_snapshot_del_perfil(session, influencer):
+    influencer.post_count, influencer.mean_likes = 2, 15.0
+    session.flush()
+
+    record_snapshots(session, [influencer.id], MONDAY)
+
+    profile = session.exec(select(MetricSnapshot).where(MetricSnapshot.influencer_id == influencer.id)).one()
+    assert (profile.followers_count, profile.post_count, profile.mean_likes) == (1000, 2, 15.0)
+
+
+def test_snapshot_solo_de_los_posts_obtenidos(session, influencer):
+    """Los posts antiguos que la ejecución no refrescó no se vuelven a copiar."""
+    session.add_all([
+        Post(external_id="metrics_p1", influencer_id=influencer.id, image_url="x", likes_count=10, comments_count=1),
+        Post(external_id="metrics_p2", influencer_id=influencer.id, image_url="y", likes_count=20, view_count=300),
+        Post(external_id="metrics_old", influencer_id=influencer.id, image_url="z", likes_count=5),
+    ])
+    session.flush()
+
+    record_post_snapshots(session, ["metrics_p1", "metrics_p2"], MONDAY)
+
+    posts = session.exec(
+        select(PostMetricSnapshot).where(PostMetricSnapshot.influencer_id == influencer.id).order_by(PostMetricSnapshot.likes_count)
+    ).all()
+    assert [(post.likes_count, post.comments_count, post.view_count) for post in posts] == [(10, 1, None), (20, None, 300)]
+    assert {post.captured_at.replace(tzinfo=timezone.utc) for post in posts} == {MONDAY}
+
+
+def test_rollup_diario(session, influencer):
+    snapshot(session, influencer, MONDAY + timedelta(hours=1), 1000, 10.0)
+    snapshot(session, influencer, MONDAY + timedelta(hours=12), 900, 20.0)
+    snapshot(session, influencer, MONDAY + timedelta(hours=23), 950, None)
+    snapshot(session, influencer, MONDAY + timedelta(days=1, hours=1), 1100, 30.0)
+
+    rollup_days(session, MONDAY, MONDAY + timedelta(days=1))
+    # Repetirlo recalcula los mismos días sin duplicarlos
+    rollup_days(session, MONDAY + timedelta(hours=5), MONDAY + timedelta(days=1))
+
+    monday, tuesday = rollups(session, influencer, DAY)
+    assert monday.period_start.replace(tzinfo=timezone.utc) == MONDAY
+    assert monday.samples == 3
+    assert (monday.followers_count, monday.followers_min, monday.followers_max) == (950, 900, 1000)
+    # Los valores nulos no cuentan para la media
+    assert monday.mean_likes == pytest.approx(15.0)
+    assert (tuesday.samples, tuesday.followers_count, tuesday.mean_likes) == (1, 1100, 30.0)
+
+
+def test_rollup_semanal_pondera_por_muestras(session, influencer):
+    for hours in (1, 2, 3):
+        snapshot(session, influencer, MONDAY + timedelta(hours=hours), 1000 + hours, 10.0)
+    snapshot(session, influencer, MONDAY + timedelta(days=6), 800, 50.0)
+    snapshot(session, influencer, MONDAY + timedelta(days=7), 2000, 99.0)
+
+    rollup_days(session, MONDAY, MONDAY + timedelta(days=7))
+    rollup_weeks(session, MONDAY + timedelta(days=2), MONDAY + timedelta(days=2))
+
+    week, = rollups(session, influencer, WEEK)
+    assert week.period_start.replace(tzinfo=timezone.utc) == MONDAY
+    assert week.samples == 4
+    assert (week.followers_count, week.followers_min, week.followers_max) == (800, 800, 1003)
+    assert week.mean_likes == pytest.approx((3 * 10.0 + 50.0) / 4)
+
+
+def test_rollup_de_posts(session, influencer):
+    post = Post(external_id="metrics_p1", influencer_id=influencer.id, image_url="x")
+    session.add(post)
+    session.flush()
+    for hours, likes, views in ((1, 10, 100), (12, 15, None), (24 + 1, 30, 400), (24 * 7, 99, 999)):
+        post.likes_count, post.view_count = likes, views
+        session.flush()
+        record_post_snapshots(session, ["metrics_p1"], MONDAY + timedelta(hours=hours))
+
+    rollup_days(session, MONDAY, MONDAY + timedelta(days=7))
+    rollup_weeks(session, MONDAY, MONDAY)
+
+    def points(period):
+        return session.exec(
+            select(PostMetricRollup)
+            .where(PostMetricRollup.post_id == post.id, PostMetricRollup.period == period)
+            .order_by(PostMetricRollup.period_start)
+        ).all()
+
+    monday, tuesday = points(DAY)[:2]
+    # Último valor del periodo; un valor nulo no borra el anterior
+    assert (monday.samples, monday.likes_count, monday.view_count) == (2, 15, 100)
+    assert (tuesday.samples, tuesday.likes_count, tuesday.view_count) == (1, 30, 400)
+    week, = points(WEEK)
+    assert week.period_start.replace(tzinfo=timezone.utc) == MONDAY
+    assert (week.samples, week.likes_count, week.view_count) == (3, 30, 400)
+
+
+def test_retencion_por_nivel(session, influencer):
+    now = MONDAY + timedelta(days=settings.METRICS_WEEKLY_RETENTION_DAYS + 30)
+    old_raw = now - timedelta(days=settings.METRICS_RAW_RETENTION_DAYS + 1)
+    snapshot(session, influencer, old_raw, 1000, 10.0)
+    snapshot(session, influencer, now - timedelta(hours=1), 1000, 10.0)
+    post = Post(external_id="metrics_p1", influencer_id=influencer.id, image_url="x", likes_count=10)
+    session.add(post)
+    session.flush()
+    record_post_snapshots(session, ["metrics_p1"], old_raw)
+    record_post_snapshots(session, ["metrics_p1"], now - timedelta(hours=1))
+    for period, age in ((DAY, settings.METRICS_DAILY_RETENTION_DAYS), (WEEK, settings.METRICS_WEEKLY_RETENTION_DAYS)):
+        for days in (age + 14, 1):
+            start = now - timedelta(days=days)
+            session.add(MetricRollup(influencer_id=influencer.id, period=period, period_start=start))
+            session.add(PostMetricRollup(post_id=post.id, influencer_id=influencer.id, period=period, period_start=start))
+    session.flush()
+
+    deleted = prune_metrics(session, now)
+
+    # Un punto de perfil y uno de post por nivel
+    assert deleted == {RAW: 2, DAY: 2, WEEK: 2}
+    assert len(session.exec(select(MetricSnapshot).where(MetricSnapshot.influencer_id == influencer.id)).all()) == 1
+    assert len(session.exec(select(PostMetricSnapshot).where(PostMetricSnapshot.post_id == post.id)).all()) == 1
+    assert len(rollups(session, influencer, DAY)) == 1
+    assert len(rollups(session, influencer, WEEK)) == 1
+    assert len(session.exec(select(PostMetricRollup).where(PostMetricRollup.post_id == post.id)).all()) == 2
+
+
+def test_rangos_largos_desde_los_rollups(session, influencer):
+    assert history_resolution(MONDAY, MONDAY + timedelta(days=30)) == DAY
+    assert history_resolution(MONDAY, MONDAY + timedelta(days=settings.METRICS_DAILY_RESOLUTION_MAX_DAYS + 1)) == WEEK
+    assert history_resolution(MONDAY, MONDAY + timedelta(days=1000), RAW) == RAW
+    with pytest.raises(ValueError):
+        history_resolution(MONDAY, MONDAY, "hour")
+
+    snapshot(session, influencer, MONDAY + timedelta(hours=1), 1000, 10.0)
+    snapshot(session, influencer, MONDAY + timedelta(days=1), 1100, 20.0)
+    rollup_days(session, MONDAY, MONDAY + timedelta(days=1))
+
+    resolution, points = metric_history(session, influencer.id, MONDAY, MONDAY + timedelta(days=7))
+    assert resolution == DAY
+    assert [point.start for point in points] == [MONDAY, MONDAY + timedelta(days=1)]
+    assert [point.followers_count for point in points] == [1000, 1100]
+
+    resolution, points = metric_history(session, influencer.id, MONDAY, MONDAY + timedelta(days=7), RAW)
+    assert resolution == RAW
+    assert len(points) == 2
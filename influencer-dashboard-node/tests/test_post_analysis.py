@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Comprueba cuándo un análisis de post está obsoleto y el re-scoring de los
+análisis cuyo único cambio es la versión de los prompts: se recalculan desde
+el embedding guardado, y el resto se marca para un re-análisis completo.
+"""
+
+import numpy as np
+import pytest
+from sqlmodel import Session, SQLModel, select
+
+from app.db.session import engine
+from app.models.influencer import Influencer, InfluencerCategory, PostAnalysis
+from app.services import post_analysis_service
+from app.services.ai_service import CategoryPrediction
+from app.services.caption_classifier import LEXICON_MODEL_KEY, LEXICON_VERSION
+from app.services.post_analysis_service import is_stale, rescore_stale_analyses
+from app.services.vector_index import vector_to_bytes
+
+MODEL = "ViT-B/32"
+OLD_PROMPTS, NEW_PROMPTS = "v1", "v2"
+
+
+def analysis(external_id="stale_post", influencer_id=1, **fields):
+    values = dict(
+        external_id=external_id,
+        influencer_id=influencer_id,
+        input_hash="hash",
+        source="image",
+        model_key=MODEL,
+        prompt_version=NEW_PROMPTS,
+        category=InfluencerCategory.FASHION,
+        embedding=vector_to_bytes(np.ones(4)),
+    )
+    values.update(fields)
+    return PostAnalysis(**values)
+
+
+def test_post_nuevo_o_contenido_cambiado():
+    assert is_stale(None, "hash", MODEL, NEW_PROMPTS)
+    assert is_stale(analysis(), "otro-hash", MODEL, NEW_PROMPTS)
+    assert not is_stale(analysis(), "hash", MODEL, NEW_PROMPTS)
+
+
+def test_modelo_o_prompts_cambiados():
+    assert is_stale(analysis(), "hash", "ViT-L/14", NEW_PROMPTS)
+    assert is_stale(analysis(prompt_version=OLD_PROMPTS), "hash", MODEL, NEW_PROMPTS)
+    # Sin modelo cargado no se compara el modelo
+    assert not is_stale(analysis(), "hash", None, NEW_PROMPTS)
+
+
+@pytest.mark.parametrize("source", ["image", "video"])
+def test_media_sin_embedding(source):
+    """La imagen o el vídeo no se pudieron cargar: se reintenta."""
+    assert is_stale(analysis(source=source, embedding=None), "hash", MODEL, NEW_PROMPTS)
+
+
+def test_caption_depende_solo_del_lexico():
+    caption = analysis(source="caption", model_key=LEXICON_MODEL_KEY, prompt_version=LEXICON_VERSION, embedding=None)
+    assert not is_stale(caption, "hash", "ViT-L/14", NEW_PROMPTS)
+    caption.prompt_version = "sha-anterior"
+    assert is_stale(caption, "hash", MODEL, NEW_PROMPTS)
+
+
+@pytest.fixture
+def influencers(monkeypatch):
+    """Tres influencers con análisis obsoletos de distinto tipo."""
+    SQLModel.metadata.create_all(engine)
+    monkeypatch.setattr(post_analysis_service, "current_versions", lambda: (MODEL, NEW_PROMPTS))
+    monkeypatch.setattr(post_analysis_service, "categorize_embeddings", lambda embeddings: [
+        CategoryPrediction(category=InfluencerCategory.TRAVEL, score=0.8, label="travel", prompt_version=NEW_PROMPTS)
+        for _ in embeddings
+    ])
+    with Session(engine) as session:
+        rescorable, other_model, no_embedding = [Influencer(username=f"stale_{index}") for index in range(3)]
+        session.add_all([rescorable, other_model, no_embedding])
+        session.flush()
+        session.add_all([
+            analysis("stale_a", rescorable.id, prompt_version=OLD_PROMPTS),
+            analysis("stale_b", rescorable.id, prompt_version=OLD_PROMPTS),
+            analysis("stale_c", other_model.id, model_key="ViT-L/14", prompt_version=OLD_PROMPTS),
+            analysis("stale_d", no_embedding.id, prompt_version=OLD_PROMPTS, embedding=None),
+        ])
+        session.commit()
+        ids = rescorable.id, other_model.id, no_embedding.id
+    yield ids
+    with Session(engine) as session:
+        for row in session.exec(select(PostAnalysis).where(PostAnalysis.external_id.startswith("stale_"))).all():
+            session.delete(row)
+        for row in session.exec(select(Influencer).where(Influencer.username.startswith("stale_"))).all():
+            session.delete(row)
+        session.commit()
+
+
+def test_rescore_desde_embeddings(influencers):
+    rescorable, other_model, no_embedding = influencers
+    with Session(engine) as session:
+        count, needs_reanalysis = rescore_stale_analyses(session)
+
+        assert count == 2
+        assert needs_reanalysis == {other_model, no_embedding}
+        rescored = session.exec(select(PostAnalysis).where(PostAnalysis.influencer_id == rescorable)).all()
+        assert {row.prompt_version for row in rescored} == {NEW_PROMPTS}
+        assert {row.category for row in rescored} == {InfluencerCategory.TRAVEL}
+        assert session.get(Influencer, rescorable).main_category == InfluencerCategory.TRAVEL
+
+        # Lo ya re-puntuado no se vuelve a tocar
+        assert rescore_stale_analyses(session)[0] == 0
+
+
+def test_rescore_respeta_el_limite(influencers):
+    with Session(engine) as session:
+        assert rescore_stale_analyses(session, limit=1)[0] == 1
+        assert rescore_stale_analyses(session, limit=1)[0] == 1
+        assert rescore_stale_analyses(session, limit=1)[0] == 0
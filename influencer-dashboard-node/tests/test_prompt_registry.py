@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Comprueba la recarga en caliente del registro de prompts: al cambiar el
+fichero se sirve la nueva versión (como mucho una comprobación por
+intervalo), un fichero roto mantiene la anterior, y el modelo vuelve a
+codificar los prompts cuando cambian.
+"""
+
+import json
+import os
+
+import numpy as np
+import pytest
+
+from app.services import ai_service, prompt_bank
+from app.services.ai_service import ClipModel
+from app.services.prompt_bank import PromptRegistry
+
+
+def write_registry(path, version, travel_prompt, mtime):
+    with open(path, "w") as registry_file:
+        json.dump({"version": version, "groups": {"category": {
+            "fashion": "a photo of a fashion outfit",
+            "travel": travel_prompt,
+        }}}, registry_file)
+    # Sin esperar a que avance el reloj del sistema de ficheros
+    os.utime(path, (mtime, mtime))
+
+
+@pytest.fixture
+def path(tmp_path):
+    path = str(tmp_path / "prompts.json")
+    write_registry(path, "v1", "a photo of a beach", 1000)
+    return path
+
+
+@pytest.fixture
+def now(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(prompt_bank.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_recarga_al_cambiar_el_fichero(path, now):
+    registry = PromptRegistry(path, check_interval=30)
+    first = registry.current()
+    assert first.version == "v1"
+
+    write_registry(path, "v2", "a photo of a mountain", 2000)
+    # Dentro del intervalo ni se mira el fichero
+    assert registry.current() is first
+
+    now[0] += 31
+    second = registry.current()
+    assert second.version == "v2"
+    assert second.digest != first.digest
+    assert "a photo of a mountain" in second.prompts
+
+
+def test_fichero_roto_mantiene_la_version_anterior(path, now):
+    registry = PromptRegistry(path, check_interval=0)
+    first = registry.current()
+
+    with open(path, "w") as registry_file:
+        registry_file.write("{roto")
+    os.utime(path, (2000, 2000))
+
+    assert registry.current() is first
+
+
+def test_sin_fichero_usa_los_prompts_por_defecto():
+    bank = PromptRegistry(None).current()
+    assert bank.prompts == prompt_bank.PromptBank(prompt_bank.DEFAULT_PROMPTS).prompts
+
+
+def test_el_modelo_recodifica_los_prompts(path, now, monkeypatch):
+    registry = PromptRegistry(path, check_interval=0)
+    monkeypatch.setattr(ai_service, "prompt_registry", registry)
+    encoded = []
+
+    def encode_prompts(backend, model_key, bank):
+        encoded.append(bank.version)
+        return np.full((len(bank.prompts), 2), len(encoded), dtype=np.float32)
+
+    # Modelo ya cargado con la versión actual del registro
+    model = ClipModel("fake")
+    monkeypatch.setattr(model, "_encode_prompts", encode_prompts)
+    model.backend, model.model_key = object(), "fake"
+    model.prompts = (registry.current(), encode_prompts(None, "fake", registry.current()))
+
+    bank, text_embeddings = model.current_prompts()
+    assert (bank.version, encoded) == ("v1", ["v1"])
+
+    write_registry(path, "v2", "a photo of a mountain", 2000)
+    bank, text_embeddings = model.current_prompts()
+
+    assert bank.version == "v2"
+    assert encoded == ["v1", "v2"]
+    assert text_embeddings[0, 0] == 2
+    assert model.prompt_version == "v2"
+    # Sin cambios no se vuelve a codificar
+    model.current_prompts()
+    assert encoded == ["v1", "v2"]
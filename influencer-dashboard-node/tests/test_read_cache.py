@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Comprueba la caché de lecturas: sirve lo cacheado sin volver a cargarlo, se
+invalida cuando la sesión que modificó al influencer hace commit (y no si
+hace rollback), y el almacén en proceso respeta su tamaño y su TTL.
+"""
+
+from datetime import datetime, timezone
+
+import pytest
+from sqlmodel import Session, SQLModel, select
+
+from app.db.session import engine
+from app.db.upsert import upsert_influencers
+from app.models.influencer import Influencer, MetricPoint
+from app.services import read_cache as read_cache_module
+from app.services.read_cache import MemoryBackend, ReadCache, invalidate_on_commit
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    """Caché en proceso, en lugar de la global que usan los listeners de la sesión."""
+    cache = ReadCache(ttl=300)
+    monkeypatch.setattr(read_cache_module, "read_cache", cache)
+    return cache
+
+
+class Loader:
+    """Cuenta cuántas veces se carga el modelo de lectura."""
+
+    def __init__(self, followers=1000):
+        self.calls = 0
+        self.followers = followers
+
+    def __call__(self):
+        self.calls += 1
+        return MetricPoint(start=datetime(2024, 1, 1, tzinfo=timezone.utc), followers_count=self.followers)
+
+
+def test_lectura_a_traves_de_la_cache(cache):
+    load = Loader()
+    first = cache.read_through(1, "detail", load)
+    assert cache.read_through(1, "detail", load) == first
+    assert load.calls == 1
+    # Cada campo se cachea aparte
+    cache.read_through(1, "posts", load)
+    assert load.calls == 2
+    assert cache.stats() == {"hits": 1, "misses": 2, "invalidations": 0}
+
+
+def test_los_errores_no_se_cachean(cache):
+    def missing():
+        raise LookupError("no existe")
+
+    with pytest.raises(LookupError):
+        cache.read_through(1, "detail", missing)
+    load = Loader()
+    cache.read_through(1, "detail", load)
+    assert load.calls == 1
+
+
+def test_desactivada_siempre_carga():
+    cache, load = ReadCache(enabled=False), Loader()
+    cache.read_through(1, "detail", load)
+    cache.read_through(1, "detail", load)
+    assert load.calls == 2
+
+
+@pytest.fixture
+def session():
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        yield session
+        session.rollback()
+        for influencer in session.exec(select(Influencer).where(Influencer.username.startswith("cached_"))).all():
+            session.delete(influencer)
+        session.commit()
+
+
+def test_se_invalida_al_hacer_commit(cache, session):
+    load = Loader()
+    cache.read_through(7, "detail", load)
+
+    invalidate_on_commit(session, [7])
+    # Hasta el commit se sigue sirviendo lo cacheado
+    cache.read_through(7, "detail", load)
+    assert load.calls == 1
+
+    session.commit()
+    cache.read_through(7, "detail", load)
+    assert load.calls == 2
+
+
+def test_un_rollback_descarta_la_invalidacion(cache, session):
+    load = Loader()
+    cache.read_through(7, "detail", load)
+
+    session.add(Influencer(username="cached_b"))
+    session.flush()
+    invalidate_on_commit(session, [7])
+    session.rollback()
+    session.commit()
+
+    cache.read_through(7, "detail", load)
+    assert load.calls == 1
+    assert cache.stats()["invalidations"] == 0
+
+
+def test_un_upsert_invalida_al_influencer(cache, session):
+    upsert_influencers(session, [{"username": "cached_a", "followers_count": 100}])
+    session.commit()
+    influencer_id = session.exec(select(Influencer.id).where(Influencer.username == "cached_a")).one()
+    load = Loader()
+    cache.read_through(influencer_id, "detail", load)
+
+    upsert_influencers(session, [{"username": "cached_a", "followers_count": 200}])
+    session.commit()
+
+    cache.read_through(influencer_id, "detail", load)
+    assert load.calls == 2
+
+
+def test_memoria_lru_y_ttl_maximo(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(read_cache_module.time, "monotonic", lambda: now[0])
+    backend = MemoryBackend(max_entries=2, max_ttl=30)
+
+    backend.set("a", "detail", b"1", 300)
+    backend.set("b", "detail", b"2", 300)
+    backend.get("a", "detail")
+    backend.set("c", "detail", b"3", 300)
+    # "b" era la menos usada
+    assert backend.get("b", "detail") is None
+    assert backend.get("a", "detail") == b"1"
+
+    now[0] += 31
+    assert backend.get("a", "detail") is None
+
+
+def test_sin_redis_usa_la_memoria():
+    cache, load = ReadCache(redis_url="redis://127.0.0.1:1/0"), Loader()
+    cache.read_through(1, "detail", load)
+    cache.read_through(1, "detail", load)
+    assert load.calls == 1
+    cache.invalidate([1])
+    cache.read_through(1, "detail", load)
+    assert load.calls == 2
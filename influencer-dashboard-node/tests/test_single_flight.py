@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Comprueba el single-flight de los análisis: una clave la reclama un solo
+dueño a la vez, solo él la libera, el TTL la libera si muere (y vuelve a
+empezar cuando el dueño la reclama de nuevo), y sin Redis el almacén en
+proceso toma el relevo.
+"""
+
+import pytest
+
+from app.services import single_flight
+from app.services.single_flight import SingleFlight
+
+
+@pytest.fixture
+def flight():
+    return SingleFlight("tests", ttl=60)
+
+
+def test_reclamar_y_liberar(flight):
+    assert flight.claim("42", "task-a") is None
+    assert flight.holder("42") == "task-a"
+    # El dueño puede volver a reclamarla; otro ve quién la tiene
+    assert flight.claim("42", "task-a") is None
+    assert flight.claim("42", "task-b") == "task-a"
+
+    flight.release("42", "task-a")
+    assert flight.holder("42") is None
+    assert flight.claim("42", "task-b") is None
+
+
+def test_solo_el_dueno_libera(flight):
+    flight.claim("42", "task-a")
+    flight.release("42", "task-b")
+    assert flight.holder("42") == "task-a"
+
+
+def test_claves_y_espacios_independientes(flight):
+    assert flight.claim("1", "task-a") is None
+    assert flight.claim("2", "task-b") is None
+    assert SingleFlight("otros", ttl=60).claim("1", "task-c") is None
+
+
+def test_el_ttl_libera_la_clave(flight, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(single_flight.time, "monotonic", lambda: now[0])
+    flight.claim("42", "task-a")
+
+    now[0] += 59
+    assert flight.claim("42", "task-b") == "task-a"
+    now[0] += 2
+    assert flight.claim("42", "task-b") is None
+
+
+def test_reclamar_como_dueno_renueva_el_ttl(flight, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(single_flight.time, "monotonic", lambda: now[0])
+    flight.claim("42", "task-a")
+
+    now[0] += 50
+    assert flight.claim("42", "task-a") is None
+    now[0] += 50
+    assert flight.claim("42", "task-b") == "task-a"
+
+
+def test_contadores(flight):
+    flight.incr("coalesced")
+    flight.incr("coalesced")
+    assert flight.counters("coalesced", "started") == {"coalesced": 2, "started": 0}
+
+
+def test_sin_redis_usa_el_almacen_en_proceso():
+    flight = SingleFlight("tests", ttl=60, redis_url="redis://127.0.0.1:1/0")
+    assert flight.claim("42", "task-a") is None
+    assert flight.claim("42", "task-b") == "task-a"
+    flight.release("42", "task-a")
+    assert flight.holder("42") is None
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Comprueba los upserts en bloque y el recálculo de los agregados de
+engagement: inserta o actualiza por clave única, la última fila repetida
+gana, y la media, la mediana y el engagement salen de los posts guardados.
+"""
+
+import pytest
+from sqlmodel import Session, SQLModel, select
+
+from app.db.session import engine
+from app.db.upsert import bulk_upsert, refresh_engagement, upsert_influencers, upsert_posts
+from app.models.influencer import Influencer, Post
+
+
+@pytest.fixture
+def session():
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        yield session
+        session.rollback()
+        for post in session.exec(select(Post).where(Post.external_id.startswith("upsert_"))).all():
+            session.delete(post)
+        for influencer in session.exec(select(Influencer).where(Influencer.username.startswith("upsert_"))).all():
+            session.delete(influencer)
+        session.commit()
+
+
+def influencer(session, username):
+    return session.exec(select(Influencer).where(Influencer.username == username)).one()
+
+def post_rows(influencer_id, likes, comments=None):
+    comments = comments or [None] * len(likes)
+    return [
+        {
+            "external_id": f"upsert_{influencer_id}_{index}",
+            "influencer_id": influencer_id,
+            "image_url": f"https://example.com/{index}.jpg",
+            "likes_count": like,
+            "comments_count": comment,
+        }
+        for index, (like, comment) in enumerate(zip(likes, comments))
+    ]
+
+
+def test_inserta_y_actualiza(session):
+    rows = [{"username": f"upsert_{index}", "followers_count": index} for index in range(7)]
+    # Lotes pequeños: varias sentencias
+    assert bulk_upsert(session, Influencer, rows, ["username"], batch_size=3) == 7
+    bulk_upsert(session, Influencer, [{"username": "upsert_0", "followers_count": 500}], ["username"])
+    session.expire_all()
+
+    assert influencer(session, "upsert_0").followers_count == 500
+    assert influencer(session, "upsert_6").followers_count == 6
+    assert len(session.exec(select(Influencer).where(Influencer.username.startswith("upsert_"))).all()) == 7
+
+
+def test_la_ultima_fila_repetida_gana(session):
+    rows = [{"username": "upsert_a", "followers_count": 1}, {"username": "upsert_a", "followers_count": 2}]
+    assert bulk_upsert(session, Influencer, rows, ["username"]) == 1
+    assert influencer(session, "upsert_a").followers_count == 2
+
+
+def test_solo_las_columnas_indicadas(session):
+    bulk_upsert(session, Influencer, [{"username": "upsert_a", "full_name": "A", "followers_count": 1}], ["username"])
+    bulk_upsert(
+        session, Influencer, [{"username": "upsert_a", "full_name": "B", "followers_count": 2}], ["username"],
+        update_columns=["followers_count"],
+    )
+    session.expire_all()
+    row = influencer(session, "upsert_a")
+    assert (row.full_name, row.followers_count) == ("A", 2)
+
+
+def test_agregados_de_engagement(session):
+    upsert_influencers(session, [{"username": "upsert_a", "followers_count": 1000}])
+    influencer_id = influencer(session, "upsert_a").id
+    upsert_posts(session, post_rows(influencer_id, [10, 40, 20, None], [1, 3, 2, None]))
+    session.expire_all()
+
+    row = influencer(session, "upsert_a")
+    assert row.post_count == 4
+    # Los posts sin likes no cuentan para la media ni la mediana
+    assert row.mean_likes == pytest.approx(70 / 3)
+    assert row.median_likes == 20
+    assert row.mean_comments == 2
+    assert row.engagement_rate == pytest.approx((70 / 3 + 2) / 1000)
+
+    # Con un número par de posts, la mediana es la media de los dos centrales
+    upsert_posts(session, post_rows(influencer_id, [10, 40, 20, 30]))
+    session.expire_all()
+    assert influencer(session, "upsert_a").median_likes == 25
+
+
+def test_nuevos_seguidores_recalculan_el_engagement(session):
+    upsert_influencers(session, [{"username": "upsert_a", "followers_count": 100}])
+    influencer_id = influencer(session, "upsert_a").id
+    upsert_posts(session, post_rows(influencer_id, [10], [0]))
+    upsert_influencers(session, [{"username": "upsert_a", "followers_count": 200}])
+    session.expire_all()
+    assert influencer(session, "upsert_a").engagement_rate == pytest.approx(10 / 200)
+
+
+def test_influencer_sin_posts(session):
+    upsert_influencers(session, [{"username": "upsert_a", "followers_count": 100}])
+    row = influencer(session, "upsert_a")
+    refresh_engagement(session, [row.id])
+    session.expire_all()
+
+    row = influencer(session, "upsert_a")
+    assert row.post_count == 0
+    assert row.mean_likes is None and row.median_likes is None and row.engagement_rate is None
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Comprueba el muestreo de vídeos: los keyframes salen repartidos a lo largo
+del clip, un vídeo demasiado grande o que no se puede decodificar se queda
+sin embedding sin romper el resto, y del almacén de embeddings solo se usa
+la clave del vídeo, no la de cada fotograma.
+"""
+
+import io
+
+import numpy as np
+import pytest
+from requests import Response
+
+av = pytest.importorskip("av")
+torch = pytest.importorskip("torch")
+
+from app.core.config import settings
+from app.services import ai_service, image_pipeline
+from app.services.embedding_cache import EmbeddingStore, content_hash
+from app.services.image_pipeline import PipelineStats
+from app.services.media_fetch import MediaFetcher
+from app.services.video_frames import sample_keyframes
+
+# Un keyframe por segundo, cada segundo de un gris distinto (cuatro grises en ciclo)
+SECONDS, FPS, LEVEL = 4, 10, 60
+
+
+def make_clip(seconds=SECONDS):
+    buffer = io.BytesIO()
+    with av.open(buffer, "w", format="mp4") as container:
+        stream = container.add_stream("mpeg4", rate=FPS)
+        stream.width, stream.height, stream.pix_fmt = 64, 48, "yuv420p"
+        stream.codec_context.gop_size = FPS
+        for index in range(seconds * FPS):
+            frame = av.VideoFrame.from_ndarray(np.full((48, 64, 3), (index // FPS % 4) * LEVEL, np.uint8), format="rgb24")
+            for packet in stream.encode(frame):
+                container.mux(packet)
+        for packet in stream.encode():
+            container.mux(packet)
+    return buffer.getvalue()
+
+
+def gray(image):
+    return round(float(np.asarray(image.convert("L")).mean()) / LEVEL)
+
+
+def test_keyframes_repartidos():
+    frames = sample_keyframes(make_clip(), count=4)
+    # Uno por segundo, en orden
+    assert [gray(frame) for frame in frames] == [0, 1, 2, 3]
+
+
+def test_desde_un_fichero_y_reducidos():
+    frames = sample_keyframes(io.BytesIO(make_clip()), count=2, target_size=8)
+    # Los puntos medios de cada mitad: segundos 1 y 3
+    assert [gray(frame) for frame in frames] == [1, 3]
+    # El lado corto queda en reducing_gap veces target_size
+    assert {frame.size for frame in frames} == {(21, 16)}
+
+
+def test_menos_keyframes_que_muestras():
+    frames = sample_keyframes(make_clip(), count=8)
+    assert [gray(frame) for frame in frames] == [0, 1, 2, 3]
+
+
+def test_video_corrupto():
+    assert sample_keyframes(b"no es un video") == []
+    assert sample_keyframes(make_clip()[:200]) == []
+
+
+class FakeBackend:
+    """Como features, el gris medio de cada fotograma."""
+    device = "cpu"
+
+    def encode_image(self, batch):
+        return np.stack([batch[:, 0].numpy(), np.ones(len(batch))], axis=1)
+
+
+class FakeClipModel:
+    input_resolution = 8
+
+    def __init__(self, store):
+        self.embedding_store = store
+        self.backend = FakeBackend()
+
+    def load(self):
+        return self
+
+    def preprocess(self, image):
+        return torch.tensor([float(np.asarray(image.convert("L")).mean())])
+
+
+def served(bodies):
+    """`session.get` falso que sirve `bodies` por URL, por trozos."""
+
+    def get(url, headers=None, timeout=None, stream=False):
+        result = Response()
+        result.status_code = 200
+        result.headers["Content-Type"] = "video/mp4"
+        result.raw = io.BytesIO(bodies[url])
+        return result
+
+    return get
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = EmbeddingStore(str(tmp_path / "embeddings"), "fake", 2)
+    monkeypatch.setattr(ai_service, "clip_model", FakeClipModel(store))
+    # Los fotogramas lisos son casi duplicados entre sí
+    monkeypatch.setattr(settings, "DEDUP_ENABLED", False)
+    return store
+
+
+@pytest.fixture
+def bodies(monkeypatch):
+    bodies = {}
+    fetcher = MediaFetcher()
+    monkeypatch.setattr(fetcher.session, "get", served(bodies))
+    monkeypatch.setattr(image_pipeline, "_media_fetcher", fetcher)
+    return bodies
+
+
+def test_embed_videos(store, bodies, monkeypatch):
+    clip = make_clip()
+    bodies.update({"https://cdn/ok.mp4": clip, "https://cdn/grande.mp4": make_clip(8), "https://cdn/roto.mp4": b"no es un video"})
+    monkeypatch.setattr(settings, "VIDEO_MAX_BYTES", len(clip) + 100)
+    stats = PipelineStats()
+
+    embeddings = ai_service.embed_videos(["https://cdn/ok.mp4", "https://cdn/grande.mp4", "https://cdn/roto.mp4"], stats=stats)
+
+    assert embeddings[0] is not None
+    assert embeddings[1] is None and embeddings[2] is None
+    assert (stats.videos, stats.keyframes, stats.failures) == (3, settings.VIDEO_KEYFRAMES, 2)
+    # Solo se guarda el embedding del vídeo
+    assert len(store) == 1
+    assert np.allclose(store.get(content_hash(clip)), embeddings[0], atol=1e-2)
+
+
+def test_un_video_repetido_no_se_decodifica(store, bodies):
+    bodies["https://cdn/ok.mp4"] = bodies["https://cdn/copia.mp4"] = make_clip()
+    first, = ai_service.embed_videos(["https://cdn/ok.mp4"])
+
+    stats = PipelineStats()
+    again, = ai_service.embed_videos(["https://cdn/copia.mp4"], stats=stats)
+
+    assert np.allclose(again, first, atol=1e-2)
+    assert (stats.cache_hits, stats.keyframes, stats.inferences) == (1, 0, 0)
@@ -5,10 +5,12 @@ Implementación robusta para scraping de perfiles de Instagram
 """
 
 import os
+import sys
 import json
 import time
 import random
 import logging
+import importlib.util
 from datetime import datetime
 from typing import Dict, List, Optional, Any
 
@@ -19,6 +21,18 @@ from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.chrome.service import Service
 from selenium.common.exceptions import TimeoutException, NoSuchElementException, WebDriverException
+
+# La capa de descarga es la del backend del dashboard (solo depende de requests):
+# se carga por ruta, sin añadir el paquete `app` del backend al path
+MEDIA_FETCH_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    "..", "influencer-dashboard-node", "backend", "app", "services", "media_fetch.py",
+)
+_spec = importlib.util.spec_from_file_location("media_fetch", MEDIA_FETCH_PATH)
+media_fetch = importlib.util.module_from_spec(_spec)
+sys.modules["media_fetch"] = media_fetch
+_spec.loader.exec_module(media_fetch)
+MediaFetcher = media_fetch.MediaFetcher
 # ChromeDriverManager removido - usando chromedriver del sistema
 
 # Configurar logging
@@ -113,6 +127,15 @@ class InstagramScraper:
         os.makedirs(self.download_dir, exist_ok=True)
         os.makedirs(self.logs_dir, exist_ok=True)
         
+        # Descargas de media: sesión HTTP con keep-alive, timeouts, límite de
+        # tamaño y caché en disco (URLs repetidas no se vuelven a descargar)
+        self.media_fetcher = MediaFetcher(
+            cache_dir=os.path.join(self.download_dir, ".cache"),
+            read_timeout=30.0,
+            max_bytes=200 * 1024 * 1024,  # los vídeos pueden ser grandes
+            max_cache_bytes=5 * 1024 * 1024 * 1024,
+        )
+        
         self.log("🚀 Scraper inicializado con perfil CONSISTENTE (más realista)")
         
         # Auto-configurar cookies predefinidas
@@ -1048,18 +1071,17 @@ class InstagramScraper:
                                 'Accept': 'image/webp,image/apng,image/*,*/*;q=0.8',
                             }
                             
-                            response = requests.get(media_url, headers=headers, timeout=30)
-                            response.raise_for_status()
+                            media = self.media_fetcher.fetch(media_url, headers=headers)
                             
                             # Verificar que es realmente una imagen/video
-                            content_type = response.headers.get('content-type', '')
+                            content_type = media.content_type
                             if not any(t in content_type for t in ['image', 'video']):
                                 self.log(f"⚠️ Contenido no es imagen/video: {content_type}", "WARNING")
                                 continue
                             
                             # Guardar archivo real
                             with open(filepath, 'wb') as f:
-                                f.write(response.content)
+                                f.write(media.content)
                             
                             # Verificar que el archivo se guardó correctamente
                             file_size = os.path.getsize(filepath)
@@ -1076,8 +1098,8 @@ class InstagramScraper:
                             
                             self.log(f"✅ Descargado: {filename} ({file_size} bytes)")
                             
-                            # Delay entre imágenes del mismo post
-                            if img_index < len(media_urls) - 1:
+                            # Delay entre imágenes del mismo post (no hace falta si vino de caché)
+                            if img_index < len(media_urls) - 1 and not media.from_cache:
                                 time.sleep(random.uniform(1, 3))
                                 
                         except Exception as img_error: